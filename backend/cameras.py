@@ -0,0 +1,188 @@
+"""
+Camera telemetry ingestion and health endpoints
+"""
+from fastapi import APIRouter, HTTPException, Depends
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime, timezone
+import os
+import threading
+import sys
+sys.path.insert(0, '../postgre')
+from database import insert_camera_telemetry, get_camera_telemetry, get_latest_camera_telemetry
+from auth import get_current_user
+
+router = APIRouter(prefix="/api/camera", tags=["camera"])
+
+# A camera is stale after CAMERA_STALE_SECONDS without a report and offline after CAMERA_OFFLINE_SECONDS
+CAMERA_STALE_SECONDS = float(os.getenv("CAMERA_STALE_SECONDS", "60"))
+CAMERA_OFFLINE_SECONDS = float(os.getenv("CAMERA_OFFLINE_SECONDS", "300"))
+CAMERA_HOT_CELSIUS = float(os.getenv("CAMERA_HOT_CELSIUS", "80"))
+# Current-state bits of the Pi firmware throttling flags: under-voltage, frequency capped, throttled, soft temp limit
+THROTTLED_NOW_MASK = 0xF
+
+# ============ HEALTH REGISTRY ============
+
+class CameraRegistry:
+    """Last-seen time and latest telemetry per camera, kept in memory"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cameras = {}
+
+    def seen(self, camera_id, telemetry=None, at=None):
+        """Record that a camera reported (any upload counts; telemetry also updates its state)"""
+        at = at or datetime.now(timezone.utc)
+        with self.lock:
+            entry = self.cameras.setdefault(camera_id, {"last_seen": at, "telemetry": None})
+            entry["last_seen"] = max(entry["last_seen"], at)
+            if telemetry:
+                entry["telemetry"] = telemetry
+
+    def load(self, samples):
+        """Seed from the newest stored sample of each camera (after a backend restart)"""
+        for sample in samples:
+            self.seen(sample["camera_id"], sample, sample["timestamp"])
+
+    def health(self, camera_id):
+        with self.lock:
+            entry = self.cameras.get(camera_id)
+            entry = dict(entry) if entry else None
+        if entry is None:
+            return {"camera_id": camera_id, "status": "unknown", "last_seen": None, "seconds_since_seen": None}
+
+        age = (datetime.now(timezone.utc) - entry["last_seen"]).total_seconds()
+        telemetry = entry["telemetry"] or {}
+        throttled = telemetry.get("throttled")
+        temperature = telemetry.get("temperature")
+        if age > CAMERA_OFFLINE_SECONDS:
+            status = "offline"
+        elif age > CAMERA_STALE_SECONDS:
+            status = "stale"
+        elif (throttled or 0) & THROTTLED_NOW_MASK or (temperature or 0) >= CAMERA_HOT_CELSIUS:
+            status = "throttling"
+        else:
+            status = "healthy"
+        return {
+            "camera_id": camera_id,
+            "status": status,
+            "last_seen": entry["last_seen"].isoformat(),
+            "seconds_since_seen": round(age, 1),
+            "fps": telemetry.get("fps"),
+            "temperature": temperature,
+            "throttled": throttled,
+            "dropped_frames": telemetry.get("dropped_frames"),
+        }
+
+    def fleet(self):
+        with self.lock:
+            camera_ids = sorted(self.cameras)
+        return [self.health(camera_id) for camera_id in camera_ids]
+
+# Shared by the telemetry, detection and health endpoints of this process
+camera_registry = CameraRegistry()
+
+# ============ MODELS ============
+
+class CameraTelemetry(BaseModel):
+    camera_id: str
+    timestamp: datetime
+    fps: Optional[float] = None
+    temperature: Optional[float] = None
+    throttled: Optional[int] = None
+    accelerator_busy: Optional[float] = None
+    frames: Optional[int] = None
+    dropped_frames: Optional[int] = None
+    latency_ms: Optional[dict] = None  # {stage: p95 ms}
+    queue_depths: Optional[dict] = None
+
+class CameraTelemetryBatch(BaseModel):
+    samples: List[CameraTelemetry]
+
+class CameraDetectionsRequest(BaseModel):
+    camera_id: Optional[str] = None
+
+# ============ ENDPOINTS ============
+
+def load_camera_registry():
+    """Start from each camera's last stored report instead of an empty registry (call after create_tables)"""
+    camera_registry.load(get_latest_camera_telemetry())
+
+@router.post("/telemetry")
+def record_camera_telemetry(batch: CameraTelemetryBatch):
+    """
+    Record a batch of telemetry samples from RPi cameras (no auth required)
+    """
+    now = datetime.now(timezone.utc)
+    samples = [s.model_dump() for s in batch.samples]
+    for sample in samples:
+        if sample["timestamp"].tzinfo is None:
+            sample["timestamp"] = sample["timestamp"].replace(tzinfo=timezone.utc)
+        # A camera clock running ahead must not keep it "healthy" after it stops reporting
+        camera_registry.seen(sample["camera_id"], sample, min(sample["timestamp"], now))
+    count = insert_camera_telemetry(samples)
+    if count is None:
+        raise HTTPException(status_code=500, detail="Failed to record telemetry")
+    return {"success": True, "count": count}
+
+@router.get("/telemetry")
+def get_camera_telemetry_endpoint(camera_id: Optional[str] = None, hours: int = 24, limit: int = 500,
+                                  current_user = Depends(get_current_user)):
+    """
+    Get recent telemetry samples, newest first
+    """
+    try:
+        samples = get_camera_telemetry(camera_id=camera_id, hours=hours, limit=limit)
+        return {
+            "success": True,
+            "data": samples,
+            "count": len(samples)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/health")
+def camera_health(camera_id: Optional[str] = None):
+    """
+    Camera health from its last report (no auth required); without camera_id, the worst status of the fleet
+    with per-status counts, so one healthy camera cannot hide the others
+    """
+    if camera_id:
+        health = camera_registry.health(camera_id)
+    else:
+        fleet = camera_registry.fleet()
+        order = ["healthy", "throttling", "stale", "offline"]
+        health = {
+            "status": max((h["status"] for h in fleet), key=order.index) if fleet else "unknown",
+            "counts": {status: sum(h["status"] == status for h in fleet) for status in order},
+            "cameras": [h["camera_id"] for h in fleet],
+        }
+    return {
+        **health,
+        "stream_url": "/api/stream/playlist.m3u8",
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@router.get("/fleet")
+def camera_fleet(current_user = Depends(get_current_user)):
+    """
+    Health of every camera that has reported
+    """
+    fleet = camera_registry.fleet()
+    return {
+        "success": True,
+        "data": fleet,
+        "count": len(fleet)
+    }
+
+@router.get("/stream")
+def camera_stream():
+    """Redirect to HLS stream (no auth required)"""
+    return {"stream_url": "/api/stream/playlist.m3u8"}
+
+@router.post("/detections")
+def camera_detections_post(request: Optional[CameraDetectionsRequest] = None):
+    """Receive detections from RPi (no auth required); counts as a camera report"""
+    if request and request.camera_id:
+        camera_registry.seen(request.camera_id)
+    return {"success": True}
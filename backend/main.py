@@ -15,6 +15,7 @@ from auth import (
 from vehicles import router as vehicles_router
 from stream import router as stream_router
 from webrtc_proxy import router as webrtc_router
+from cameras import router as cameras_router, camera_registry, load_camera_registry
 
 app = FastAPI()
 
@@ -44,12 +45,14 @@ async def add_stream_headers(request, call_next):
 app.include_router(vehicles_router)
 app.include_router(stream_router)
 app.include_router(webrtc_router)
+app.include_router(cameras_router)
 
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     init_db_pool()
     create_default_users()
+    load_camera_registry()
 
 # Close database on shutdown
 @app.on_event("shutdown")
@@ -113,25 +116,6 @@ def health_check():
     except Exception as e:
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
-@app.get("/api/camera/health")
-def camera_health():
-    """Check camera health (no auth required)"""
-    return {
-        "status": "healthy",
-        "stream_url": "/api/stream/playlist.m3u8",
-        "timestamp": datetime.now(timezone.utc).isoformat()
-    }
-
-@app.get("/api/camera/stream")
-def camera_stream():
-    """Redirect to HLS stream (no auth required)"""
-    return {"stream_url": "/api/stream/playlist.m3u8"}
-
-@app.post("/api/camera/detections")
-def camera_detections_post():
-    """Receive detections from RPi (no auth required)"""
-    return {"success": True}
-
 class Detection(BaseModel):
     """Generic detection from any model"""
     model_name: str  # 'vehicle_detection', 'smoke_detection', etc.
@@ -155,6 +139,7 @@ class SmokeDetection(BaseModel):
 @app.post("/api/detections/smoke")
 def record_smoke_detection(detection: SmokeDetection):
     """Record smoke detection from RPi camera (no auth required)"""
+    camera_registry.seen(detection.camera_id)
     try:
         from postgre.database import insert_smoke_detection
         result = insert_smoke_detection(
@@ -176,6 +161,60 @@ def record_smoke_detection(detection: SmokeDetection):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class SmokeDetectionBatch(BaseModel):
+    detections: list[SmokeDetection]
+
+@app.post("/api/detections/smoke/batch")
+def record_smoke_detection_batch(batch: SmokeDetectionBatch):
+    """Record a batch of smoke detections from the RPi uploader (no auth required)"""
+    for camera_id in {d.camera_id for d in batch.detections}:
+        camera_registry.seen(camera_id)
+    try:
+        from postgre.database import insert_smoke_detections
+        results = insert_smoke_detections([d.model_dump() for d in batch.detections])
+        if results is not None:
+            return {"success": True, "data": results, "count": len(results)}
+        else:
+            raise HTTPException(status_code=500, detail="Failed to record detections")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class SmokeBox(BaseModel):
+    """One smoke box of a frame event"""
+    confidence: float
+    smoke_type: str  # 'smoke_black' or 'smoke_white'
+    bounding_box: dict | None = None  # {"x1": int, "y1": int, "x2": int, "y2": int}
+    metadata: dict | None = None  # per-box data, e.g. smoke_analysis
+
+class DetectionEvent(BaseModel):
+    """One frame with N smoke boxes; the context is shared by all boxes"""
+    timestamp: str
+    camera_id: str = "rpi_camera"
+    location: str = "unknown"
+    boxes: list[SmokeBox]
+    metadata: dict | None = None
+    detections: list[Detection] | None = None  # All detections from all models
+    screenshots: dict | None = None
+    license_plate: str | None = None
+
+class DetectionEventBatch(BaseModel):
+    events: list[DetectionEvent]
+
+@app.post("/api/detections/events")
+def record_detection_events(batch: DetectionEventBatch):
+    """Record a batch of frame events, each stored once with its smoke boxes (no auth required)"""
+    for camera_id in {e.camera_id for e in batch.events}:
+        camera_registry.seen(camera_id)
+    try:
+        from postgre.database import insert_detection_events
+        results = insert_detection_events([e.model_dump() for e in batch.events])
+        if results is not None:
+            return {"success": True, "data": results, "count": len(results)}
+        else:
+            raise HTTPException(status_code=500, detail="Failed to record events")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/detections/smoke")
 def get_smoke_detections(limit: int = 50, hours: int = 24, current_user: User = Depends(get_current_user)):
     """Get recent smoke detections (requires authentication)"""
@@ -190,12 +229,39 @@ def get_smoke_detections(limit: int = 50, hours: int = 24, current_user: User =
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/detections")
+def list_detections(camera_id: str | None = None, class_name: str | None = None, model: str | None = None,
+                    min_confidence: float | None = None, max_confidence: float | None = None,
+                    start: datetime | None = None, end: datetime | None = None,
+                    limit: int = 100, cursor: str | None = None,
+                    current_user: User = Depends(get_current_user)):
+    """Get detections from all models with filters, newest first; pass `next_cursor` as `cursor` for the next page"""
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    try:
+        from postgre.database import get_detection_objects
+        detections, next_cursor = get_detection_objects(
+            camera_id=camera_id, class_name=class_name, model=model,
+            min_confidence=min_confidence, max_confidence=max_confidence,
+            start=start, end=end, limit=limit, after=cursor
+        )
+        return {
+            "success": True,
+            "data": detections,
+            "count": len(detections),
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/vehicles/detections")
 def get_vehicle_detections(limit: int = 10, current_user: User = Depends(get_current_user)):
     """Get recent vehicle detections"""
     try:
         from vehicles import get_recent_violations
-        violations = get_recent_violations(limit)
+        violations, _ = get_recent_violations(limit)
         return {
             "success": True,
             "data": violations
@@ -234,11 +300,13 @@ def add_sensor_data(data: SensorData):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sensors/data")
-def get_sensor_data(limit: int = 10):
-    """Get latest sensor readings (Public access for debugging)"""
+def get_sensor_data(limit: int = 10, cursor: str | None = None):
+    """Get latest sensor readings (Public access for debugging); pass `next_cursor` as `cursor` for the next page"""
     try:
-        data = get_latest_sensor_data(limit=limit)
-        return {"success": True, "data": data}
+        data, next_cursor = get_latest_sensor_data(limit=limit, after=cursor)
+        return {"success": True, "data": data, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -246,7 +314,7 @@ def get_sensor_data(limit: int = 10):
 def get_latest_reading():
     """Get the most recent sensor reading (Public access)"""
     try:
-        data = get_latest_sensor_data(limit=1)
+        data, _ = get_latest_sensor_data(limit=1)
         if data:
             return {"success": True, "data": data[0]}
         else:
@@ -258,7 +326,7 @@ def get_latest_reading():
 def get_sensor_status():
     """Get sensor connection status and last update time"""
     try:
-        data = get_latest_sensor_data(limit=1)
+        data, _ = get_latest_sensor_data(limit=1)
         if data:
             last_update = data[0].get('timestamp')
             if last_update:
@@ -153,32 +153,40 @@ async def get_vehicle_ranking_endpoint(current_user = Depends(get_current_user))
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/violations/recent")
-async def get_recent_violations_endpoint(limit: int = 10, current_user = Depends(get_current_user)):
+async def get_recent_violations_endpoint(limit: int = 10, cursor: Optional[str] = None,
+                                        current_user = Depends(get_current_user)):
     """
-    Get recent violations
+    Get recent violations; pass `next_cursor` as `cursor` for the next page
     """
     try:
-        violations = get_recent_violations(limit)
+        violations, next_cursor = get_recent_violations(limit, after=cursor)
         return {
             "success": True,
             "data": violations,
-            "count": len(violations)
+            "count": len(violations),
+            "next_cursor": next_cursor
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/notifications/unread")
-async def get_unread_notifications_endpoint(limit: int = 10, current_user = Depends(get_current_user)):
+async def get_unread_notifications_endpoint(limit: int = 10, cursor: Optional[str] = None,
+                                           current_user = Depends(get_current_user)):
     """
-    Get unread notifications
+    Get unread notifications; pass `next_cursor` as `cursor` for the next page
     """
     try:
-        notifications = get_unread_notifications(limit)
+        notifications, next_cursor = get_unread_notifications(limit, after=cursor)
         return {
             "success": True,
             "data": notifications,
-            "count": len(notifications)
+            "count": len(notifications),
+            "next_cursor": next_cursor
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-stage latency and FPS of the detection pipeline
+
+Runs DetectionPipeline on any frame source and inference backend, so the
+decode/NMS/cascade path can be profiled off the Pi:
+
+  # record on the Pi (camera + Hailo), then replay anywhere
+  python3 bench_pipeline.py --source camera --backend hailo --frames 300 --record /tmp/rec
+  python3 bench_pipeline.py --source replay:/tmp/rec --backend replay:/tmp/rec
+
+  # CPU inference with ONNX exports of the models (DIR/<model_name>.onnx)
+  python3 bench_pipeline.py --source video:road.mp4 --backend onnx:models/
+"""
+import argparse
+import time
+
+import numpy as np
+
+from frame_sources import open_source
+from inference_backends import RecordingBackend, open_backend
+from motion import MotionGate
+from pipeline import MODELS, DetectionPipeline
+from privacy import PrivacyMasker, PRIVACY_MASKING
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', required=True, help="camera[:N] | dual[:N] | live:TARGET | video:PATH | images:DIR | replay:DIR")
+    parser.add_argument('--backend', required=True, help="hailo | replay:DIR | onnx:DIR")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--loop', action='store_true', help="loop file/replay sources")
+    parser.add_argument('--record', metavar='DIR', help="record frames and raw outputs for later replay")
+    parser.add_argument('--motion-gate', action='store_true', help="skip inference on static frames")
+    parser.add_argument('--smoke-cascade', action='store_true', help="run smoke on exhaust/vehicle ROIs")
+    args = parser.parse_args()
+
+    backend = open_backend(args.backend, MODELS)
+    if args.record:
+        backend = RecordingBackend(backend, args.record)
+    motion_gate = MotionGate() if args.motion_gate else None
+    pipeline = DetectionPipeline(backend, MODELS, args.conf, args.iou, motion_gate=motion_gate,
+                                  smoke_cascade=args.smoke_cascade,
+                                  privacy_masker=PrivacyMasker() if PRIVACY_MASKING else None)
+
+    stage_ms, frame_ms = {}, []
+    detections = 0
+    with open_source(args.source, loop=args.loop) as source, backend:
+        for i, frame in enumerate(source):
+            if i >= args.warmup + args.frames:
+                break
+            start = time.perf_counter()
+            result = pipeline.process(frame)
+            # Masking runs when a frame is emitted; every benchmark frame counts as emitted
+            mask_start = time.perf_counter()
+            result.mask()
+            result.timings['privacy_mask'] = time.perf_counter() - mask_start
+            elapsed = time.perf_counter() - start
+            if i < args.warmup:
+                continue
+            frame_ms.append(elapsed * 1000)
+            detections += len(result.all_detections)
+            for name, seconds in result.timings.items():
+                stage_ms.setdefault(name, []).append(seconds * 1000)
+
+    if not frame_ms:
+        print("✗ No frames measured (source exhausted during warmup)")
+        return
+
+    n = len(frame_ms)
+    print(f"Frames: {n} | Models: {', '.join(backend.model_names)} | Detections: {detections}")
+    print(f"{'stage':<34}{'mean':>9}{'p50':>9}{'p95':>9}  (ms/frame)")
+    for name, values in sorted(stage_ms.items()):
+        # Stages that didn't run on a frame count as 0 ms for that frame
+        values = np.array(values + [0.0] * (n - len(values)))
+        print(f"{name:<34}{values.mean():9.2f}{np.percentile(values, 50):9.2f}{np.percentile(values, 95):9.2f}")
+    total = np.array(frame_ms)
+    print(f"{'total':<34}{total.mean():9.2f}{np.percentile(total, 50):9.2f}{np.percentile(total, 95):9.2f}")
+    print(f"FPS: {1000.0 / total.mean():.1f}")
+    if motion_gate:
+        print(f"Motion gate: {motion_gate.stats()}")
+    if pipeline.smoke_cascade:
+        print(f"Smoke cascade: {pipeline.smoke_cascade.stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: float reference decode vs quantized-domain OutputDecoder
+
+Generates synthetic uint8 outputs shaped like a 640x640 YOLOv8 HEF
+(strides 8/16/32, 64 DFL channels + N classes), checks both paths produce
+the same detections and reports per-frame latency.
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from postprocess import OutputDecoder, decode, dequantize_outputs
+
+def make_outputs(num_classes, hot_cells, seed=0, size=640):
+    rng = np.random.default_rng(seed)
+    raw_outputs, infos = {}, []
+    for i, stride in enumerate((8, 16, 32)):
+        h = w = size // stride
+        c = 64 + num_classes
+        feat = rng.integers(90, 170, size=(1, h, w, c), dtype=np.uint8)
+        # Background: class logits well below threshold
+        feat[..., 64:] = rng.integers(0, 60, size=(1, h, w, num_classes), dtype=np.uint8)
+        n = max(1, hot_cells >> (2 * i))
+        ys, xs = rng.integers(0, h, n), rng.integers(0, w, n)
+        feat[0, ys, xs, 64 + rng.integers(0, num_classes, n)] = rng.integers(140, 255, n, dtype=np.uint8)
+        name = f'yolov8/conv{41 + 11 * i}'
+        raw_outputs[name] = feat
+        infos.append(SimpleNamespace(name=name, quant_info=SimpleNamespace(qp_zp=128.0, qp_scale=0.08)))
+    return raw_outputs, infos
+
+def timed(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / iterations, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--hot-cells', type=int, default=64, help='above-threshold cells on the stride-8 map')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--conf', type=float, default=0.25)
+    args = parser.parse_args()
+
+    raw_outputs, infos = make_outputs(args.classes, args.hot_cells)
+    decoder = OutputDecoder(infos, conf_thresh=args.conf)
+
+    ref_ms, (rb, rs, rc) = timed(lambda: decode(dequantize_outputs(raw_outputs, infos), conf_thresh=args.conf), args.iterations)
+    lut_ms, (qb, qs, qc) = timed(lambda: decoder(raw_outputs), args.iterations)
+
+    assert len(rb) == len(qb), f"detection count differs: {len(rb)} vs {len(qb)}"
+    assert np.array_equal(rc, qc), "class ids differ"
+    assert np.allclose(rs, qs, rtol=0, atol=1e-6), "scores differ"
+    assert np.allclose(rb, qb, rtol=0, atol=1e-3), "boxes differ"
+
+    print(f"Detections: {len(qb)} (outputs match reference)")
+    print(f"Reference decode : {ref_ms:8.2f} ms/frame")
+    print(f"OutputDecoder    : {lut_ms:8.2f} ms/frame")
+    print(f"Speedup          : {ref_ms / lut_ms:8.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Check: on-chip NMS output vs the CPU decode + NMS path
+
+Converts a recording of raw DFL outputs (bench_pipeline.py --record) into
+the recording an NMS-compiled HEF would have produced: every detection
+model's outputs are replaced by per-class box lists holding what the CPU
+path keeps. Both recordings are then replayed through DetectionPipeline and
+the detections compared frame by frame, and the per-frame decode + NMS time
+of each path is reported. Without --recording, synthetic outputs are used.
+A recording made on the Pi from NMS HEFs can be replayed with --nms-recording
+to check the decode path alone.
+
+  python3 check_nms_output.py --recording /tmp/rec --write-nms /tmp/rec_nms
+  python3 check_nms_output.py --nms-recording /tmp/rec_nms
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from bench_postprocess import make_outputs
+from inference_backends import ReplayBackend, VStreamInfo
+from nms import batched_nms, MAX_DETECTIONS
+from pipeline import MODELS, DetectionPipeline
+from postprocess import NMSDecoder, OutputDecoder, dense_nms, nms_class_lists
+
+def is_dfl_model(outputs):
+    """Detection heads: three DFL feature maps (64 box channels + classes)"""
+    return len(outputs) == 3 and all(o['shape'] and o['shape'][-1] > 64 for o in outputs)
+
+def to_class_lists(decoder, raw_outputs, num_classes, iou, input_size):
+    """What a HEF with on-chip NMS returns for one frame: per-class (n, 5) [y1, x1, y2, x2, score]"""
+    boxes, scores, classes = decoder(raw_outputs)
+    lists = [np.zeros((0, 5), np.float32) for _ in range(num_classes)]
+    if len(boxes):
+        keep, kept_scores = batched_nms(boxes, scores, classes, iou)
+        for b, s, c in zip(boxes[keep], kept_scores, classes[keep]):
+            row = np.array([[b[1], b[0], b[3], b[2], 0]], np.float32) / input_size
+            row[0, 4] = s
+            lists[c] = np.concatenate([lists[c], row])
+    return lists
+
+def write_nms_recording(src, dst, conf, iou, max_boxes):
+    """Copy recording `src` to `dst` with every detection model's outputs run through NMS"""
+    with open(os.path.join(src, 'meta.json')) as f:
+        meta = json.load(f)
+    converted = {}
+    for name, m in meta['models'].items():
+        if name in MODELS and is_dfl_model(m['outputs']):
+            infos = [VStreamInfo.from_dict(o) for o in m['outputs']]
+            converted[name] = (OutputDecoder(infos, conf), len(MODELS[name]['classes']), m['input_shape'][1])
+            m['outputs'] = [VStreamInfo(f'{name}/nms', None, nms={'classes': converted[name][1],
+                                                                    'max_boxes': max_boxes}).to_dict()]
+    os.makedirs(os.path.join(dst, 'frames'), exist_ok=True)
+    with open(os.path.join(dst, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    for path in sorted(glob.glob(os.path.join(src, 'frames', '*.npz'))):
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+        for name, (decoder, num_classes, input_size) in converted.items():
+            prefix = f'{name}::'
+            raw = {k[len(prefix):]: arrays.pop(k) for k in list(arrays) if k.startswith(prefix)}
+            if not raw:
+                continue
+            batch = len(next(iter(raw.values())))
+            lists = [to_class_lists(decoder, {k: v[i:i + 1] for k, v in raw.items()}, num_classes, iou, input_size)
+                     for i in range(batch)]
+            arrays[f'{name}::{name}/nms'] = dense_nms(lists, num_classes, max_boxes)
+        np.savez(os.path.join(dst, 'frames', os.path.basename(path)), **arrays)
+    return sorted(converted)
+
+def replay(path, conf, iou):
+    """[(detections by model, decode + NMS ms)] for every recorded frame"""
+    backend = ReplayBackend(path, loop=False)
+    pipeline = DetectionPipeline(backend, MODELS, conf, iou)
+    out = []
+    for path in backend.paths:
+        with np.load(path) as data:
+            frame = data['frame']
+        result = pipeline.process(frame)
+        ms = (result.timings.get('decode', 0.0) + result.timings.get('nms', 0.0)) * 1000
+        out.append((result.detections, ms))
+    return out
+
+def same_detections(a, b, tol=1):
+    """Equal up to float32 coordinate rounding (boxes are ints after mapping back to the frame)"""
+    if len(a) != len(b):
+        return False
+    key = lambda d: (d[4], -d[5], d[0], d[1])
+    for da, db in zip(sorted(a, key=key), sorted(b, key=key)):
+        if da[4] != db[4] or abs(da[5] - db[5]) > 1e-5 or max(abs(x - y) for x, y in zip(da[:4], db[:4])) > tol:
+            return False
+    return True
+
+def check_synthetic(conf, iou, classes=5, hot_cells=64):
+    raw_outputs, infos = make_outputs(classes, hot_cells)
+    lists = to_class_lists(OutputDecoder(infos, conf), raw_outputs, classes, iou, 640)
+    decoder = NMSDecoder(VStreamInfo('nms'), conf)
+    by_layout = {'list': [lists], 'dense': dense_nms([lists], classes, MAX_DETECTIONS)}
+    results = {layout: decoder({'nms': raw}) for layout, raw in by_layout.items()}
+    for layout, (boxes, scores, _) in results.items():
+        assert np.allclose(boxes, results['list'][0], atol=1e-3), f"{layout} layout boxes differ"
+        assert np.allclose(scores, results['list'][1], atol=1e-6), f"{layout} layout scores differ"
+    assert sum(len(c) for c in nms_class_lists(by_layout['dense'])) == len(results['list'][0])
+    print(f"✓ Synthetic: {len(results['list'][0])} boxes decode identically from list and dense NMS layouts")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recording', metavar='DIR', help="recording with raw DFL outputs")
+    parser.add_argument('--write-nms', metavar='DIR', help="keep the converted NMS recording here")
+    parser.add_argument('--nms-recording', metavar='DIR', help="replay a recording made from NMS HEFs")
+    parser.add_argument('--max-boxes', type=int, default=MAX_DETECTIONS, help="boxes per class in the NMS output")
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--iou', type=float, default=0.45)
+    args = parser.parse_args()
+
+    check_synthetic(args.conf, args.iou)
+
+    if args.nms_recording:
+        frames = replay(args.nms_recording, args.conf, args.iou)
+        detections = sum(len(d) for dets, _ in frames for d in dets.values())
+        print(f"✓ NMS recording: {len(frames)} frames, {detections} detections, "
+              f"decode+nms {np.mean([ms for _, ms in frames]):.2f} ms/frame")
+
+    if not args.recording:
+        return
+    dst = args.write_nms or tempfile.mkdtemp(prefix='nms_recording_')
+    try:
+        models = write_nms_recording(args.recording, dst, args.conf, args.iou, args.max_boxes)
+        cpu, chip = replay(args.recording, args.conf, args.iou), replay(dst, args.conf, args.iou)
+    finally:
+        if not args.write_nms:
+            shutil.rmtree(dst)
+
+    mismatched = [i for i, ((a, _), (b, _)) in enumerate(zip(cpu, chip))
+                  if any(not same_detections(a[m], b[m]) for m in a)]
+    detections = sum(len(d) for dets, _ in cpu for d in dets.values())
+    print(f"Models converted : {', '.join(models)}")
+    print(f"Frames           : {len(cpu)} ({detections} detections)")
+    print(f"CPU decode+NMS   : {np.mean([ms for _, ms in cpu]):8.2f} ms/frame")
+    print(f"On-chip NMS      : {np.mean([ms for _, ms in chip]):8.2f} ms/frame")
+    if mismatched:
+        print(f"✗ Detections differ on frames {mismatched}")
+        raise SystemExit(1)
+    print("✓ Detections match on every frame")
+
+if __name__ == '__main__':
+    main()
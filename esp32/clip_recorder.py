@@ -0,0 +1,200 @@
+"""
+Evidence clip recorder - pre-event ring buffer of the encoded H.264 stream
+
+The ffmpeg stage already encodes the annotated stream into fMP4 HLS segments
+in RAM. This module copies every finished segment into an in-memory ring
+covering the last CLIP_PRE_SECONDS (plus the post-event window), and when a
+smoke event fires it writes init segment + the segments spanning
+[T - pre, T + post] as one MP4 file. No re-encoding; back-to-back events
+extend the same clip up to CLIP_MAX_SECONDS. Each segment is buffered with
+the init segment it was encoded against: after an ffmpeg restart a clip
+only joins segments that share one init.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+CLIP_RECORDING    = os.getenv('CLIP_RECORDING', 'true').lower() == 'true'
+CLIPS_DIR         = os.getenv('CLIPS_DIR', '/home/sevi/smoki_project/clips')
+CLIP_PRE_SECONDS  = float(os.getenv('CLIP_PRE_SECONDS', '10'))
+CLIP_POST_SECONDS = float(os.getenv('CLIP_POST_SECONDS', '6'))
+CLIP_MAX_SECONDS  = float(os.getenv('CLIP_MAX_SECONDS', '60'))
+CLIP_QUOTA_MB     = int(os.getenv('CLIP_QUOTA_MB', '1024'))
+POLL_INTERVAL     = 0.5     # seconds between playlist checks
+
+def parse_playlist(text):
+    """(init_uri, [(segment_uri, duration_s)]) from an HLS media playlist"""
+    init_uri, segments, duration = None, [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-MAP:'):
+            for attr in line[len('#EXT-X-MAP:'):].split(','):
+                key, _, value = attr.partition('=')
+                if key.strip() == 'URI':
+                    init_uri = value.strip('"')
+        elif line.startswith('#EXTINF:'):
+            duration = float(line[len('#EXTINF:'):].split(',')[0])
+        elif line and not line.startswith('#') and duration is not None:
+            segments.append((line, duration))
+            duration = None
+    return init_uri, segments
+
+def init_runs(segments):
+    """[init, start, end, [data]] runs of consecutive (start, end, data, init) segments sharing an init"""
+    runs = []
+    for start, end, data, init in segments:
+        if init is None:
+            continue
+        if runs and runs[-1][0] == init:
+            runs[-1][2] = end
+            runs[-1][3].append(data)
+        else:
+            runs.append([init, start, end, [data]])
+    return runs
+
+class Clip:
+    def __init__(self, event_id, path, start, end):
+        self.event_id = event_id
+        self.path = path
+        self.start = start
+        self.end = end
+
+# ─── RECORDER ──────────────────────────────────────────────────────────────
+class ClipRecorder:
+    """Ring-buffer HLS segments in RAM and cut evidence clips on request"""
+
+    def __init__(self, hls_dir, clips_dir=CLIPS_DIR, playlist='stream.m3u8', pre_seconds=CLIP_PRE_SECONDS,
+                 post_seconds=CLIP_POST_SECONDS, max_seconds=CLIP_MAX_SECONDS, quota_mb=CLIP_QUOTA_MB):
+        self.hls_dir = hls_dir
+        self.clips_dir = clips_dir
+        self.playlist_path = os.path.join(hls_dir, playlist)
+        self.pre = pre_seconds
+        self.post = post_seconds
+        self.max_seconds = max_seconds
+        self.quota_bytes = quota_mb * 1024 * 1024
+        self.init_uri = None
+        self.init_mtime = None
+        self.init_segment = None
+        self.segments = deque()          # (name, start, end, data, init segment), oldest first
+        self.seen = deque(maxlen=64)     # recently buffered segment names
+        self.pending = []
+        self.saved = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(clips_dir, exist_ok=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='clip-recorder', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Stop polling; pending clips are written with what is buffered"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._finish_due(force=True)
+
+    def request(self, event_id, event_time=None):
+        """Register a smoke event; returns the clip path (written once T + post is buffered)"""
+        now = time.time() if event_time is None else event_time
+        with self.lock:
+            for clip in self.pending:
+                # Continuing event: extend the open clip instead of cutting a new one
+                if now <= clip.end and now + self.post - clip.start <= self.max_seconds:
+                    clip.end = now + self.post
+                    return clip.path
+            path = os.path.join(self.clips_dir, f'{event_id}.mp4')
+            self.pending.append(Clip(event_id, path, now - self.pre, now + self.post))
+            return path
+
+    # ─── worker thread ──────────────────────────────────────────────────────
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._poll()
+                self._finish_due()
+            except Exception as e:
+                print(f"✗ Clip recorder error: {e}")
+            self._stop.wait(POLL_INTERVAL)
+
+    def _poll(self):
+        """Buffer segments that newly appeared in the playlist"""
+        try:
+            with open(self.playlist_path) as f:
+                init_uri, listed = parse_playlist(f.read())
+        except OSError:
+            return
+        if init_uri:
+            # ffmpeg rewrites the init segment when it restarts (possibly with another encoder)
+            init_path = os.path.join(self.hls_dir, init_uri)
+            try:
+                mtime = os.stat(init_path).st_mtime_ns
+                if init_uri != self.init_uri or mtime != self.init_mtime:
+                    with open(init_path, 'rb') as f:
+                        self.init_uri, self.init_mtime, self.init_segment = init_uri, mtime, f.read()
+            except OSError:
+                return   # mid-restart; retry on the next poll
+        now = time.time()
+        for name, duration in listed:
+            if name in self.seen:
+                continue
+            try:
+                with open(os.path.join(self.hls_dir, name), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue   # already rotated out
+            self.seen.append(name)
+            # A segment is listed once it is complete, so it ended roughly now
+            with self.lock:
+                self.segments.append((name, now - duration, now, data, self.init_segment))
+        horizon = now - self.pre - self.max_seconds - self.post
+        with self.lock:
+            while self.segments and self.segments[0][2] < horizon:
+                self.segments.popleft()
+
+    def _finish_due(self, force=False):
+        with self.lock:
+            newest = self.segments[-1][2] if self.segments else 0.0
+            due = [c for c in self.pending if force or newest >= c.end or time.time() > c.end + 3 * self.post]
+            for clip in due:
+                self.pending.remove(clip)
+            parts = {c.path: [s[1:] for s in self.segments if s[2] > c.start and s[1] < c.end] for c in due}
+        for clip in due:
+            self._write(clip, parts[clip.path])
+
+    def _write(self, clip, segments):
+        runs = init_runs(segments)
+        if not runs:
+            print(f"✗ No buffered video for clip {clip.event_id}")
+            return
+        # Fragments only decode with their own init: keep the run at the event (else the longest)
+        event_time = clip.start + self.pre
+        run = next((r for r in runs if r[1] <= event_time <= r[2]), max(runs, key=lambda r: len(r[3])))
+        init_segment, _, _, segments = run
+        if len(runs) > 1:
+            print(f"✗ Stream restarted during clip {clip.event_id}, keeping the {len(segments)} segments "
+                  f"of one encoder run")
+        tmp = clip.path + '.part'
+        with open(tmp, 'wb') as f:
+            f.write(init_segment)
+            for data in segments:
+                f.write(data)
+        os.replace(tmp, clip.path)
+        self.saved += 1
+        print(f"🎞 Saved clip {os.path.basename(clip.path)} ({len(segments)} segments)")
+        self._enforce_quota()
+
+    def _enforce_quota(self):
+        clips = sorted((e for e in os.scandir(self.clips_dir) if e.name.endswith('.mp4')),
+                       key=lambda e: e.stat().st_mtime)
+        used = sum(e.stat().st_size for e in clips)
+        for entry in clips:
+            if used <= self.quota_bytes:
+                break
+            used -= entry.stat().st_size
+            os.remove(entry.path)
+            print(f"🗑 Evicted clip {entry.name} (disk quota)")
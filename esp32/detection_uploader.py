@@ -0,0 +1,326 @@
+"""
+Background detection uploader - keeps backend HTTP calls off the inference loop
+
+Events are queued in memory, batched, and POSTed over a pooled keep-alive
+session. When the backend is unreachable, events go to an on-disk SQLite (WAL)
+spool and are replayed with exponential backoff once it comes back. Payloads
+the backend keeps failing with a server error are retried one at a time and
+moved to a dead-letter table after UPLOAD_MAX_ATTEMPTS, so they cannot block
+the spool. Batches the backend rejects (4xx) go straight to the dead-letter
+table; on 422 the batch is resent one payload at a time so only the invalid
+ones do. Both tables are capped, oldest rows first.
+"""
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+UPLOAD_QUEUE_SIZE    = int(os.getenv('UPLOAD_QUEUE_SIZE', '256'))
+UPLOAD_BATCH_SIZE    = int(os.getenv('UPLOAD_BATCH_SIZE', '16'))
+UPLOAD_BATCH_WAIT    = float(os.getenv('UPLOAD_BATCH_WAIT', '0.5'))     # seconds to wait for a batch to fill
+UPLOAD_TIMEOUT       = float(os.getenv('UPLOAD_TIMEOUT', '5'))
+UPLOAD_MAX_ATTEMPTS  = int(os.getenv('UPLOAD_MAX_ATTEMPTS', '8'))       # server errors before dead-lettering
+SPOOL_MAX_ROWS       = int(os.getenv('SPOOL_MAX_ROWS', '50000'))        # oldest payloads evicted beyond this
+DEAD_LETTER_MAX_ROWS = int(os.getenv('DEAD_LETTER_MAX_ROWS', '1000'))   # kept for inspection, oldest evicted
+BACKOFF_INITIAL      = 1.0
+BACKOFF_MAX          = 300.0
+# Frame events: N smoke boxes sharing one context (detections, screenshots, plate)
+EVENTS_ENDPOINT      = '/api/detections/events'
+# Request body key for each batch endpoint (default: "detections")
+BATCH_KEYS           = {'/api/camera/telemetry': 'samples', EVENTS_ENDPOINT: 'events'}
+
+# ─── DISK SPOOL ────────────────────────────────────────────────────────────
+class DetectionSpool:
+    """Crash-safe FIFO of pending payloads stored in SQLite (WAL mode), with a dead-letter table"""
+
+    def __init__(self, path, max_rows=SPOOL_MAX_ROWS, dead_max_rows=DEAD_LETTER_MAX_ROWS):
+        self.max_rows = max_rows
+        self.dead_max_rows = dead_max_rows
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        # Spools written before attempts were counted
+        if 'attempts' not in [r[1] for r in self.conn.execute("PRAGMA table_info(spool)")]:
+            self.conn.execute("ALTER TABLE spool ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                failed_at REAL NOT NULL,
+                reason TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def push(self, endpoint, payloads, attempts=0):
+        """Append payloads; returns how many of the oldest were evicted to stay under max_rows"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO spool (endpoint, payload, created_at, attempts) VALUES (?, ?, ?, ?)",
+                [(endpoint, json.dumps(p), now, attempts) for p in payloads]
+            )
+            return self._trim('spool', self.max_rows)
+
+    def peek(self, limit):
+        """Oldest pending payloads for the oldest endpoint, as (ids, endpoint, payloads).
+
+        A payload that already failed with a server error is returned alone, so
+        one bad payload cannot fail (and dead-letter) the payloads batched with it.
+        """
+        row = self.conn.execute("SELECT endpoint, attempts FROM spool ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            return [], None, []
+        rows = self.conn.execute(
+            "SELECT id, payload FROM spool WHERE endpoint = ? ORDER BY id LIMIT ?",
+            (row[0], 1 if row[1] else limit)
+        ).fetchall()
+        return [r[0] for r in rows], row[0], [json.loads(r[1]) for r in rows]
+
+    def delete(self, ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+
+    def fail(self, ids, reason, max_attempts=UPLOAD_MAX_ATTEMPTS):
+        """Count a server error against payloads; returns how many were moved to dead_letter"""
+        marks = ",".join("?" * len(ids))
+        with self.conn:
+            self.conn.execute(f"UPDATE spool SET attempts = attempts + 1 WHERE id IN ({marks})", ids)
+            dead = self.conn.execute(
+                f"""INSERT INTO dead_letter (endpoint, payload, created_at, attempts, failed_at, reason)
+                    SELECT endpoint, payload, created_at, attempts, ?, ? FROM spool
+                    WHERE id IN ({marks}) AND attempts >= ? ORDER BY id""",
+                (time.time(), reason, *ids, max_attempts)
+            ).rowcount
+            if dead:
+                self.conn.execute(f"DELETE FROM spool WHERE id IN ({marks}) AND attempts >= ?", (*ids, max_attempts))
+                self._trim('dead_letter', self.dead_max_rows)
+        return dead
+
+    def dead(self, endpoint, payloads, reason, attempts=1):
+        """Store payloads the backend rejected in dead_letter"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                """INSERT INTO dead_letter (endpoint, payload, created_at, attempts, failed_at, reason)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(endpoint, json.dumps(p), now, attempts, now, reason) for p in payloads]
+            )
+            self._trim('dead_letter', self.dead_max_rows)
+
+    def _trim(self, table, max_rows):
+        excess = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - max_rows
+        if excess > 0:
+            self.conn.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} ORDER BY id LIMIT ?)",
+                              (excess,))
+        return max(excess, 0)
+
+    def dead_letters(self):
+        return self.conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+# ─── UPLOADER ──────────────────────────────────────────────────────────────
+class DetectionUploader:
+    """Non-blocking, batching uploader with disk spool fallback.
+
+    `submit()` never touches the network or disk; all I/O happens on a
+    single background thread that owns the HTTP session and the spool.
+    """
+
+    def __init__(self, backend_url, spool_path, endpoint='/api/detections/smoke/batch',
+                 queue_size=UPLOAD_QUEUE_SIZE, batch_size=UPLOAD_BATCH_SIZE,
+                 batch_wait=UPLOAD_BATCH_WAIT, timeout=UPLOAD_TIMEOUT):
+        self.backend_url = backend_url.rstrip('/')
+        self.spool_path = spool_path
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.sent = 0
+        self.spooled = 0
+        self.evicted = 0
+        self.dead_lettered = 0
+        self._last_status = None
+        self._backoff = 0.0
+        self._next_retry = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='detection-uploader', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """Stop the worker; anything still queued is written to the spool"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def submit(self, payload, endpoint=None):
+        """Queue a payload for upload. Never blocks; returns False if dropped."""
+        try:
+            self.queue.put_nowait((endpoint or self.endpoint, payload))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"✗ Upload queue full, dropped event ({self.dropped} total)")
+            return False
+
+    # ─── worker thread ──────────────────────────────────────────────────────
+    def _run(self):
+        spool = DetectionSpool(self.spool_path)
+        pending = len(spool)
+        if pending:
+            print(f"↻ {pending} spooled detections pending replay")
+        dead = spool.dead_letters()
+        if dead:
+            print(f"✗ {dead} detection(s) in the dead-letter table of {self.spool_path}")
+        try:
+            while not self._stop.is_set():
+                for endpoint, batch in self._collect_batches():
+                    # Keep ordering: once anything is spooled, new events queue behind it
+                    if len(spool) or time.monotonic() < self._next_retry:
+                        self._spool(spool, endpoint, batch)
+                    elif not self._post(spool, endpoint, batch):
+                        # A server error counts as the first attempt; an unreachable backend does not
+                        self._spool(spool, endpoint, batch, attempts=1 if self._last_status else 0)
+                self._replay(spool)
+                self.spooled = len(spool)
+            for endpoint, batch in self._collect_batches(block=False):
+                self._spool(spool, endpoint, batch)
+        finally:
+            spool.close()
+            self.session.close()
+
+    def _collect_batches(self, block=True):
+        """Drain up to batch_size queued events, grouped by endpoint"""
+        items = []
+        try:
+            items.append(self.queue.get(timeout=self.batch_wait) if block else self.queue.get_nowait())
+            deadline = time.monotonic() + self.batch_wait
+            while len(items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not block:
+                    items.append(self.queue.get_nowait())
+                else:
+                    items.append(self.queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        batches = {}
+        for endpoint, payload in items:
+            batches.setdefault(endpoint, []).append(payload)
+        return list(batches.items())
+
+    def _spool(self, spool, endpoint, batch, attempts=0):
+        evicted = spool.push(endpoint, batch, attempts)
+        if evicted:
+            self.evicted += evicted
+            metrics.inc('upload_spool_evicted', evicted)
+            print(f"✗ Spool full, evicted {evicted} oldest detection(s) ({self.evicted} total)")
+
+    def _replay(self, spool):
+        if time.monotonic() < self._next_retry:
+            return
+        ids, endpoint, batch = spool.peek(self.batch_size)
+        if not ids:
+            return
+        if self._post(spool, endpoint, batch):
+            spool.delete(ids)
+            print(f"↻ Replayed {len(ids)} spooled detections ({len(spool)} left)")
+        elif self._last_status:
+            dead = spool.fail(ids, f"HTTP {self._last_status}")
+            if dead:
+                self.dead_lettered += dead
+                metrics.inc('upload_dead_letters', dead)
+                # The next payloads are not at fault: retry them without waiting out the backoff
+                self._backoff = 0.0
+                self._next_retry = 0.0
+                print(f"✗ Moved {dead} detection(s) to the dead-letter table after {UPLOAD_MAX_ATTEMPTS} "
+                      f"server errors")
+
+    def _post(self, spool, endpoint, batch):
+        """POST one batch. Returns True if the batch is done with (sent, or rejected and dead-lettered).
+
+        On failure, `_last_status` is the HTTP status, or None if the backend was not reached.
+        """
+        start = time.perf_counter()
+        self._last_status = None
+        try:
+            response = self.session.post(
+                f"{self.backend_url}{endpoint}",
+                json={BATCH_KEYS.get(endpoint, "detections"): batch},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            metrics.inc('upload_errors')
+            self._schedule_retry(f"{type(e).__name__}")
+            return False
+        finally:
+            metrics.observe('upload', time.perf_counter() - start)
+
+        if response.status_code == 200:
+            self.sent += len(batch)
+            self._backoff = 0.0
+            self._next_retry = 0.0
+            print(f"✓ Uploaded {len(batch)} detection(s)")
+            return True
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            if response.status_code == 422 and len(batch) > 1:
+                # One invalid payload fails its whole batch: resend one at a time so only it is dead-lettered
+                print(f"✗ Backend rejected a batch of {len(batch)} detection(s) (422), resending them one by one")
+                for payload in batch:
+                    if not self._post(spool, endpoint, [payload]):
+                        self._spool(spool, endpoint, [payload], attempts=1 if self._last_status else 0)
+                return True
+            # The backend will never accept this batch: keep it for inspection, not in the spool
+            spool.dead(endpoint, batch, f"HTTP {response.status_code}: {response.text[:200]}")
+            self.dead_lettered += len(batch)
+            metrics.inc('upload_dead_letters', len(batch))
+            print(f"✗ Backend rejected {len(batch)} detection(s): {response.status_code}, moved to the "
+                  f"dead-letter table")
+            return True
+        metrics.inc('upload_errors')
+        self._last_status = response.status_code
+        self._schedule_retry(f"HTTP {response.status_code}")
+        return False
+
+    def _schedule_retry(self, reason):
+        self._backoff = min(BACKOFF_MAX, self._backoff * 2 if self._backoff else BACKOFF_INITIAL)
+        delay = self._backoff * random.uniform(0.8, 1.2)
+        self._next_retry = time.monotonic() + delay
+        print(f"✗ Upload failed ({reason}), retrying in {delay:.1f}s")
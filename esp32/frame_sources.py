@@ -0,0 +1,305 @@
+"""
+Frame sources for the detection pipeline
+
+Every source yields RGB uint8 frames (the layout Picamera2's "BGR888" format
+produces) from `read()`, returning None when exhausted. Hardware modules are
+imported lazily so the non-camera sources work on any Linux box.
+"""
+import glob
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+class FrameSource:
+    """Base class: iterate frames until read() returns None"""
+
+    dropped = 0
+
+    def read(self):
+        raise NotImplementedError
+
+    def capture(self):
+        """Next frame as a CameraFrame-like object (`rgb`, `display`, `release()`), None when exhausted"""
+        rgb = self.read()
+        return None if rgb is None else HostFrame(rgb)
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PicameraSource(FrameSource):
+    """Raspberry Pi camera via Picamera2.
+
+    `dropped` counts sensor frames that were never delivered, detected from
+    gaps in the per-frame SensorTimestamp metadata.
+    """
+
+    def __init__(self, size=(640, 480), camera_num=0):
+        from picamera2 import Picamera2
+        self.picam2 = Picamera2(camera_num)
+        config = self.picam2.create_video_configuration(main={"format": "BGR888", "size": size})
+        self.picam2.configure(config)
+        self.picam2.start()
+        self.dropped = 0
+        self.last_timestamp = None
+
+    def read(self):
+        request = self.picam2.capture_request()
+        try:
+            frame = request.make_array('main')
+            self._count_dropped(request.get_metadata())
+        finally:
+            request.release()
+        return frame
+
+    def _count_dropped(self, metadata):
+        timestamp, duration = metadata.get('SensorTimestamp'), metadata.get('FrameDuration')
+        if timestamp and duration and self.last_timestamp:
+            # SensorTimestamp is in ns, FrameDuration in µs
+            missed = round((timestamp - self.last_timestamp) / (duration * 1000)) - 1
+            self.dropped += max(0, missed)
+        self.last_timestamp = timestamp
+
+    def close(self):
+        self.picam2.stop()
+
+class HostFrame:
+    """A frame in ordinary memory: nothing to hand back, drawn on after conversion"""
+
+    display = None
+
+    def __init__(self, rgb):
+        self.rgb = rgb
+
+    def release(self):
+        pass
+
+class CameraFrame:
+    """One dual-stream capture.
+
+    `rgb` is the inference frame (lores stream, RGB) and `display` is a BGR
+    view straight into the main stream's camera buffer, so drawing on it and
+    writing it to the encoder involves no pixel copies. Call release() once
+    the display frame has been consumed to hand the buffer back to the camera.
+    """
+
+    def __init__(self, request, mapped, rgb, display):
+        self.request = request
+        self.mapped = mapped
+        self.rgb = rgb
+        self.display = display
+
+    def release(self):
+        self.mapped.__exit__(None, None, None)
+        self.request.release()
+
+class DualStreamSource(PicameraSource):
+    """Picamera2 main + lores streams: the ISP delivers the BGR encoder frame
+    and the RGB inference frame directly, so no CPU colour conversion is needed.
+
+    On Pi 4 the lores stream can only be YUV420; it is then converted once
+    with a single cvtColor (still cheaper than resize + RGB/BGR swaps).
+    """
+
+    def __init__(self, size=(640, 480), camera_num=0):
+        from picamera2 import Picamera2, MappedArray
+        self.MappedArray = MappedArray
+        self.picam2 = Picamera2(camera_num)
+        # Picamera2's "RGB888" is BGR byte order (what ffmpeg's bgr24 expects); "BGR888" is RGB
+        try:
+            config = self.picam2.create_video_configuration(
+                main={"format": "RGB888", "size": size}, lores={"format": "BGR888", "size": size})
+            self.picam2.configure(config)
+            self.lores_yuv = False
+        except Exception:
+            config = self.picam2.create_video_configuration(
+                main={"format": "RGB888", "size": size}, lores={"format": "YUV420", "size": size})
+            self.picam2.configure(config)
+            self.lores_yuv = True
+        self.picam2.start()
+        self.dropped = 0
+        self.last_timestamp = None
+
+    def capture(self):
+        """Next CameraFrame; the caller must release() it"""
+        request = self.picam2.capture_request()
+        try:
+            rgb = request.make_array('lores')
+            if self.lores_yuv:
+                rgb = cv2.cvtColor(rgb, cv2.COLOR_YUV420p2RGB)
+            self._count_dropped(request.get_metadata())
+            mapped = self.MappedArray(request, 'main')
+            display = mapped.__enter__().array
+        except Exception:
+            request.release()
+            raise
+        return CameraFrame(request, mapped, rgb, display)
+
+    def read(self):
+        frame = self.capture()
+        rgb = frame.rgb
+        frame.release()
+        return rgb
+
+class VideoFileSource(FrameSource):
+    """Video file (anything OpenCV/FFmpeg can decode), optionally looped"""
+
+    def __init__(self, path, size=None, loop=False):
+        self.path = path
+        self.size = size
+        self.loop = loop
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+
+    def read(self):
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        if not ok:
+            return None
+        if self.size:
+            frame = cv2.resize(frame, self.size)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def close(self):
+        self.cap.release()
+
+class LiveSource(FrameSource):
+    """USB/UVC device, RTSP/HTTP stream, or a video file standing in for one.
+
+    A reader thread keeps only the newest frame, as a live camera must be
+    drained even when inference is slower; frames replaced before being read
+    count as `dropped`. A file is paced at its own frame rate and looped, so
+    a recording can stand in for a network camera during local testing.
+    """
+
+    def __init__(self, target, size=None):
+        self.size = size
+        device = int(target) if target.isdigit() else target
+        self.is_file = isinstance(device, str) and os.path.isfile(device)
+        self.cap = cv2.VideoCapture(device)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open live source: {target}")
+        self.interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 15.0) if self.is_file else 0.0
+        self.latest = None
+        self.ended = False
+        self.cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='live-source', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            ok, frame = self.cap.read()
+            if not ok and self.is_file:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.cap.read()
+            if not ok:
+                break
+            with self.cond:
+                if self.latest is not None:
+                    self.dropped += 1
+                self.latest = frame
+                self.cond.notify_all()
+            if self.interval:
+                next_time += self.interval
+                self._stop.wait(max(0.0, next_time - time.monotonic()))
+        with self.cond:
+            self.ended = True
+            self.cond.notify_all()
+
+    def read(self):
+        with self.cond:
+            self.cond.wait_for(lambda: self.latest is not None or self.ended)
+            frame, self.latest = self.latest, None
+        if frame is None:
+            return None
+        if self.size and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            frame = cv2.resize(frame, self.size)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(2)
+        self.cap.release()
+
+class ImageDirSource(FrameSource):
+    """Directory of still images, read in sorted order"""
+
+    def __init__(self, path, size=None, loop=False):
+        self.paths = sorted(p for p in glob.glob(os.path.join(path, '*'))
+                            if p.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.paths:
+            raise ValueError(f"No images found in {path}")
+        self.size = size
+        self.loop = loop
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.paths):
+            if not self.loop:
+                return None
+            self.index = 0
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        if self.size:
+            frame = cv2.resize(frame, self.size)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+class TensorReplaySource(FrameSource):
+    """Frames stored in a recording made by inference_backends.RecordingBackend"""
+
+    def __init__(self, path, loop=False):
+        self.paths = sorted(glob.glob(os.path.join(path, 'frames', '*.npz')))
+        if not self.paths:
+            raise ValueError(f"No recorded frames found in {path}")
+        self.loop = loop
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.paths):
+            if not self.loop:
+                return None
+            self.index = 0
+        with np.load(self.paths[self.index]) as data:
+            frame = data['frame']
+        self.index += 1
+        return frame
+
+def open_source(spec, size=(640, 480), loop=False):
+    """Open a source from a spec: 'camera[:N]', 'dual[:N]', 'live:DEVICE|URL|FILE', 'video:PATH',
+    'images:DIR' or 'replay:DIR' (N is the CSI camera number)"""
+    kind, _, arg = spec.partition(':')
+    if kind == 'camera':
+        return PicameraSource(size, int(arg or 0))
+    if kind == 'dual':
+        return DualStreamSource(size, int(arg or 0))
+    if kind == 'live':
+        return LiveSource(arg, size)
+    if kind == 'video':
+        return VideoFileSource(arg, size, loop)
+    if kind == 'images':
+        return ImageDirSource(arg, size, loop)
+    if kind == 'replay':
+        return TensorReplaySource(arg, loop)
+    raise ValueError(f"Unknown frame source: {spec}")
@@ -0,0 +1,503 @@
+"""
+HLS origin - asyncio HTTP server for the ffmpeg HLS output, with segments held in memory
+
+One event loop thread serves every viewer, replacing a thread per request.
+ffmpeg's playlist is polled (one stat per HLS_POLL_INTERVAL, not one per
+request); each newly listed segment is read once into an in-memory cache and
+served from there with a memoryview write. Anything else under the HLS
+directory is sent with sendfile(). The playlist advertises blocking
+playlist reload (LL-HLS CAN-BLOCK-RELOAD): clients ask for `_HLS_msn` and
+the request is held until that segment is listed, instead of polling.
+ffmpeg emits whole fMP4 segments only, so no partial segments or preload
+hints are advertised. Bytes sent per client are
+tracked and exported as metrics. Metadata feeds (detection overlays) are
+pushed to viewers over WebSocket connections on the same port.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from email.utils import formatdate
+from urllib.parse import parse_qs, urlsplit
+
+from metrics import metrics
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+HLS_ORIGIN          = os.getenv('HLS_ORIGIN', 'true').lower() == 'true'
+HLS_PORT            = int(os.getenv('LOCAL_PORT', '8000'))
+HLS_CACHE_SEGMENTS  = int(os.getenv('HLS_CACHE_SEGMENTS', '12'))
+HLS_POLL_INTERVAL   = float(os.getenv('HLS_POLL_INTERVAL', '0.05'))   # seconds between playlist stats
+CLIENT_RATE_WINDOW  = 10.0         # seconds of history for per-client bandwidth
+CLIENT_IDLE_TIMEOUT = 60.0         # seconds before an idle client is forgotten
+MAX_HEADER_BYTES    = 16384
+MAX_BODY_BYTES      = 65536
+WS_QUEUE_SIZE       = 30           # feed messages buffered per WebSocket viewer (oldest dropped)
+WS_GUID             = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+CONTENT_TYPES = {'.m3u8': 'application/vnd.apple.mpegurl', '.m4s': 'video/iso.segment',
+                 '.mp4': 'video/mp4', '.ts': 'video/mp2t'}
+REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+def ws_frame(opcode, payload=b''):
+    """One unmasked, unfragmented server-to-client WebSocket frame"""
+    n = len(payload)
+    if n < 126:
+        head = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 65536:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return head + payload
+
+def parse_media_playlist(text):
+    """(media_sequence, target_duration, init_uri, [(uri, duration)], ended) from an HLS media playlist"""
+    sequence, target, init_uri, segments, duration, ended = 0, 2.0, None, [], None, False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            target = float(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-MAP:'):
+            match = re.search(r'URI="([^"]+)"', line)
+            init_uri = match.group(1) if match else None
+        elif line.startswith('#EXTINF:'):
+            duration = float(line[len('#EXTINF:'):].split(',')[0])
+        elif line == '#EXT-X-ENDLIST':
+            ended = True
+        elif line and not line.startswith('#') and duration is not None:
+            segments.append((line, duration))
+            duration = None
+    return sequence, target, init_uri, segments, ended
+
+class ClientStats:
+    def __init__(self):
+        self.bytes = 0
+        self.requests = 0
+        self.history = deque()     # (monotonic time, bytes)
+        self.last_seen = time.monotonic()
+
+    def sent(self, n):
+        now = time.monotonic()
+        self.bytes += n
+        self.requests += 1
+        self.last_seen = now
+        self.history.append((now, n))
+
+    def rate(self):
+        """Bytes per second over the last CLIENT_RATE_WINDOW seconds"""
+        cutoff = time.monotonic() - CLIENT_RATE_WINDOW
+        while self.history and self.history[0][0] < cutoff:
+            self.history.popleft()
+        return sum(n for _, n in self.history) / CLIENT_RATE_WINDOW
+
+# ─── STREAM ────────────────────────────────────────────────────────────────
+class HLSStream:
+    """One ffmpeg HLS output directory: parsed playlist state and cached segments"""
+
+    def __init__(self, hls_dir, playlist='stream.m3u8', cache_segments=HLS_CACHE_SEGMENTS):
+        self.hls_dir = os.path.realpath(hls_dir)
+        self.playlist_name = playlist
+        self.cache_segments = cache_segments
+        self.segments = OrderedDict()     # uri -> bytes, oldest first
+        self.init_uri = None
+        self.init_segment = None
+        self.init_mtime = None
+        self.playlist = None              # rewritten playlist (bytes)
+        self.sequence = 0
+        self.last_msn = -1
+        self.target = 2.0
+        self._mtime = None
+
+    def poll(self):
+        """Reload the playlist if ffmpeg rewrote it; True when it changed"""
+        path = os.path.join(self.hls_dir, self.playlist_name)
+        mtime = os.stat(path).st_mtime_ns
+        if mtime == self._mtime:
+            return False
+        with open(path) as f:
+            self._update(f.read())
+        # Only once the update succeeded, so a failed one (init segment mid-rewrite) is retried
+        self._mtime = mtime
+        return True
+
+    def _read(self, uri):
+        with open(os.path.join(self.hls_dir, uri), 'rb') as f:
+            return f.read()
+
+    def _update(self, text):
+        sequence, target, init_uri, listed, _ = parse_media_playlist(text)
+        if init_uri:
+            # ffmpeg rewrites the init segment when it restarts
+            mtime = os.stat(os.path.join(self.hls_dir, init_uri)).st_mtime_ns
+            if init_uri != self.init_uri or mtime != self.init_mtime:
+                self.init_uri, self.init_mtime, self.init_segment = init_uri, mtime, self._read(init_uri)
+        for uri, _ in listed:
+            if uri not in self.segments:
+                try:
+                    self.segments[uri] = self._read(uri)
+                except OSError:
+                    continue    # already rotated out
+        while len(self.segments) > self.cache_segments:
+            self.segments.popitem(last=False)
+
+        self.sequence, self.target = sequence, target
+        self.last_msn = sequence + len(listed) - 1
+        self.playlist = self._rewrite(text).encode()
+
+    def _rewrite(self, text):
+        """Advertise blocking playlist reload in ffmpeg's playlist"""
+        out = []
+        for line in text.splitlines():
+            out.append(line)
+            if line.startswith('#EXT-X-TARGETDURATION:'):
+                out.append('#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES')
+        return '\n'.join(out) + '\n'
+
+# ─── ORIGIN ────────────────────────────────────────────────────────────────
+class HLSOrigin:
+    """Serve one or more HLS output directories over HTTP from one asyncio thread.
+
+    `streams` maps URL prefixes to directories ({'cam_a': '/dev/shm/hls/cam_a'}
+    serves /cam_a/stream.m3u8); prefix '' serves at the root. A single
+    `hls_dir` is served at the root. `routes` maps extra paths to callables
+    returning (body, content_type), e.g. {'/metrics': lambda: (metrics.prometheus(), 'text/plain')}.
+    `actions` does the same for POST, called with the parsed query string;
+    a ValueError from an action is answered with 400. `feeds` maps paths to
+    MetadataFeed-like objects (`subscribe(fn)`/`unsubscribe(fn)`, `fn(camera_id,
+    text)`) streamed to WebSocket clients; `?camera=ID` filters one camera.
+    """
+
+    def __init__(self, hls_dir=None, port=HLS_PORT, playlist='stream.m3u8', routes=None,
+                 cache_segments=HLS_CACHE_SEGMENTS, poll_interval=HLS_POLL_INTERVAL, streams=None, actions=None,
+                 feeds=None):
+        self.port = port
+        self.routes = routes or {}
+        self.actions = actions or {}
+        self.feeds = feeds or {}
+        self.subscribers = 0
+        self.cache_segments = cache_segments
+        self.poll_interval = poll_interval
+        # Prefixes pointing at the same directory share one stream (and one watcher)
+        by_dir = {}
+        self.streams = {}
+        for prefix, path in (streams or {'': hls_dir}).items():
+            path = os.path.realpath(path)
+            if path not in by_dir:
+                by_dir[path] = HLSStream(path, playlist, cache_segments)
+            self.streams[prefix.strip('/')] = by_dir[path]
+        self.clients = {}
+        self.blocked = 0
+        self._loop = None
+        self._changed = None
+        self._stopping = None
+        self._thread = None
+        self._writers = set()
+        self._ready = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._main()), name='hls-origin', daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        metrics.gauge('hls_clients', lambda: len(self.clients))
+        metrics.gauge('hls_bytes_per_second', lambda: sum(c.rate() for c in list(self.clients.values())))
+        metrics.gauge('hls_blocked_requests', lambda: self.blocked)
+        metrics.gauge('feed_subscribers', lambda: self.subscribers)
+        metrics.labeled_gauge('hls_client_bytes_per_second', 'client', self.client_rates)
+        print(f"✓ HLS origin on port {self.port} (blocking playlist reload, {self.cache_segments} cached segments)")
+        return self
+
+    def stop(self, timeout=5):
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def client_rates(self):
+        return {client: round(stats.rate(), 1) for client, stats in list(self.clients.items())}
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Condition()
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_server(self._handle, '', self.port, reuse_address=True)
+        watcher = asyncio.create_task(self._watch())
+        self._ready.set()
+        async with server:
+            await self._stopping.wait()
+            watcher.cancel()
+            # Let keep-alive connections end cleanly instead of being cancelled mid-read
+            for writer in list(self._writers):
+                writer.close()
+            await asyncio.sleep(0.1)
+
+    # ─── playlist watcher ───────────────────────────────────────────────────
+    async def _watch(self):
+        streams = list({id(s): s for s in self.streams.values()}.values())
+        while True:
+            changed = False
+            for stream in streams:
+                try:
+                    changed = stream.poll() or changed
+                except OSError:
+                    pass
+                except Exception as e:
+                    print(f"✗ HLS origin playlist error ({stream.hls_dir}): {e}")
+            if changed:
+                async with self._changed:
+                    self._changed.notify_all()
+            self._prune_clients()
+            await asyncio.sleep(self.poll_interval)
+
+    def _resolve(self, path):
+        """URL path -> (stream, file name), or (None, None)"""
+        prefix, _, rest = path.lstrip('/').partition('/')
+        if rest and prefix in self.streams:
+            return self.streams[prefix], rest
+        if '' in self.streams:
+            return self.streams[''], path.lstrip('/')
+        return None, None
+
+    async def _wait_for(self, stream, predicate):
+        """Hold a request until `predicate()` is true; False on timeout (3 target durations)"""
+        if predicate():
+            return True
+        self.blocked += 1
+        try:
+            async with self._changed:
+                await asyncio.wait_for(self._changed.wait_for(predicate), stream.target * 3)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.blocked -= 1
+
+    # ─── HTTP ───────────────────────────────────────────────────────────────
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        client = peer[0] if peer else 'unknown'
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                if len(head) > MAX_HEADER_BYTES:
+                    return
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = request_line.split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, client, 400, b'', 'text/plain')
+                    return
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        key, value = line.split(':', 1)
+                        headers[key.strip().lower()] = value.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1')
+                try:
+                    length = int(headers.get('content-length', '0'))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    await self._respond(writer, client, 400, b'', 'text/plain')
+                    return
+                if length:
+                    # Actions take their arguments from the query string; the body is discarded
+                    try:
+                        await reader.readexactly(length)
+                    except asyncio.IncompleteReadError:
+                        return
+                url = urlsplit(target)
+                if method == 'GET' and url.path in self.feeds:
+                    # The connection becomes a WebSocket until either side closes it
+                    return await self._websocket(reader, writer, client, self.feeds[url.path],
+                                                 headers, parse_qs(url.query))
+                await self._dispatch(writer, client, method, target, keep_alive)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, writer, client, method, target, keep_alive):
+        if method == 'OPTIONS':
+            return await self._respond(writer, client, 204, b'', 'text/plain', keep_alive)
+        url = urlsplit(target)
+        path = url.path
+        if method == 'POST' and path in self.actions:
+            try:
+                body, content_type = self.actions[path](parse_qs(url.query))
+                status = 200
+            except ValueError as e:
+                body, content_type, status = str(e), 'text/plain', 400
+            body = body.encode() if isinstance(body, str) else body
+            return await self._respond(writer, client, status, body, content_type, keep_alive)
+        if method not in ('GET', 'HEAD'):
+            return await self._respond(writer, client, 405, b'', 'text/plain', keep_alive)
+        head_only = method == 'HEAD'
+
+        if path in self.routes:
+            body, content_type = self.routes[path]()
+            body = body.encode() if isinstance(body, str) else body
+            return await self._respond(writer, client, 200, body, content_type, keep_alive, head_only=head_only)
+
+        stream, name = self._resolve(path)
+        if stream is None:
+            return await self._respond(writer, client, 404, b'', 'text/plain', keep_alive)
+        if name == stream.playlist_name:
+            return await self._playlist(writer, client, stream, parse_qs(url.query), keep_alive, head_only)
+
+        data = stream.segments.get(name)
+        if data is None and name == stream.init_uri:
+            data = stream.init_segment
+        content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+        cache = 'max-age=3600' if data is not None and name != stream.init_uri else 'no-cache'
+        if data is not None:
+            return await self._respond(writer, client, 200, data, content_type, keep_alive,
+                                       cache=cache, head_only=head_only)
+        return await self._sendfile(writer, client, stream, name, content_type, keep_alive, head_only)
+
+    async def _playlist(self, writer, client, stream, query, keep_alive, head_only):
+        """Playlist request, blocking on `_HLS_msn` (LL-HLS blocking playlist reload)"""
+        if '_HLS_msn' in query:
+            try:
+                wanted = int(query['_HLS_msn'][0])
+            except ValueError:
+                return await self._respond(writer, client, 400, b'', 'text/plain', keep_alive)
+            if stream.playlist is not None and wanted > stream.last_msn + 2:
+                return await self._respond(writer, client, 400, b'', 'text/plain', keep_alive)
+            if not await self._wait_for(stream, lambda: stream.last_msn >= wanted):
+                return await self._respond(writer, client, 503, b'', 'text/plain', keep_alive)
+        elif stream.playlist is None:
+            await self._wait_for(stream, lambda: stream.playlist is not None)
+        if stream.playlist is None:
+            return await self._respond(writer, client, 404, b'', 'text/plain', keep_alive)
+        await self._respond(writer, client, 200, stream.playlist, CONTENT_TYPES['.m3u8'], keep_alive,
+                            head_only=head_only)
+
+    async def _sendfile(self, writer, client, stream, name, content_type, keep_alive, head_only):
+        path = os.path.realpath(os.path.join(stream.hls_dir, name))
+        if not path.startswith(stream.hls_dir + os.sep) or not os.path.isfile(path):
+            return await self._respond(writer, client, 404, b'', 'text/plain', keep_alive)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return await self._respond(writer, client, 404, b'', 'text/plain', keep_alive)
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            writer.write(self._headers(200, size, content_type, keep_alive, 'no-cache'))
+            if not head_only:
+                # Kernel-to-socket copy (falls back to read/write where sendfile is unavailable)
+                await self._loop.sendfile(writer.transport, f)
+            await writer.drain()
+        self._count(client, size if not head_only else 0)
+
+    def _headers(self, status, length, content_type, keep_alive, cache):
+        return (f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                f'Date: {formatdate(usegmt=True)}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {length}\r\n'
+                f'Cache-Control: {cache}\r\n'
+                'Access-Control-Allow-Origin: *\r\n'
+                'Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n'
+                'Access-Control-Allow-Headers: *\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n').encode('latin-1')
+
+    # ─── WebSocket feeds ────────────────────────────────────────────────────
+    async def _websocket(self, reader, writer, client, feed, headers, query):
+        key = headers.get('sec-websocket-key')
+        if headers.get('upgrade', '').lower() != 'websocket' or not key:
+            return await self._respond(writer, client, 400, b'WebSocket upgrade required', 'text/plain')
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode('latin-1'))
+
+        camera = query.get('camera', [None])[0]
+        messages = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        loop = self._loop
+
+        def offer(text):
+            if messages.full():
+                # A slow viewer gets the newest overlays, not a growing backlog
+                messages.get_nowait()
+            messages.put_nowait(text)
+
+        def push(camera_id, text):
+            if camera is None or camera_id == camera:
+                loop.call_soon_threadsafe(offer, text)
+
+        feed.subscribe(push)
+        self.subscribers += 1
+        receiver = asyncio.ensure_future(self._ws_receive(reader, writer))
+        try:
+            while True:
+                getter = asyncio.ensure_future(messages.get())
+                await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    return
+                data = getter.result().encode()
+                writer.write(ws_frame(0x1, data))
+                await writer.drain()
+                self._count(client, len(data))
+        except ConnectionError:
+            pass
+        finally:
+            feed.unsubscribe(push)
+            self.subscribers -= 1
+            receiver.cancel()
+
+    async def _ws_receive(self, reader, writer):
+        """Answer pings and close frames from the client; returns when the connection ends"""
+        try:
+            while True:
+                b0, b1 = await reader.readexactly(2)
+                opcode, n = b0 & 0x0F, b1 & 0x7F
+                if n == 126:
+                    n = struct.unpack('!H', await reader.readexactly(2))[0]
+                elif n == 127:
+                    n = struct.unpack('!Q', await reader.readexactly(8))[0]
+                if n > MAX_BODY_BYTES:
+                    return
+                mask = await reader.readexactly(4) if b1 & 0x80 else b'\0\0\0\0'
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(n)))
+                if opcode == 0x8:
+                    writer.write(ws_frame(0x8, payload[:2]))
+                    return
+                if opcode == 0x9:
+                    writer.write(ws_frame(0xA, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+
+    async def _respond(self, writer, client, status, body, content_type, keep_alive=False,
+                       cache='no-cache, no-store, must-revalidate', head_only=False):
+        writer.write(self._headers(status, len(body), content_type, keep_alive, cache))
+        if body and not head_only:
+            # Cached segments are written from a memoryview: no copy on the Python side
+            writer.write(memoryview(body))
+        await writer.drain()
+        self._count(client, 0 if head_only else len(body))
+
+    def _count(self, client, n):
+        stats = self.clients.get(client)
+        if stats is None:
+            stats = self.clients[client] = ClientStats()
+        stats.sent(n)
+        metrics.inc('hls_bytes_sent', n)
+        metrics.inc('hls_requests')
+
+    def _prune_clients(self):
+        cutoff = time.monotonic() - CLIENT_IDLE_TIMEOUT
+        for client in [c for c, s in self.clients.items() if s.last_seen < cutoff]:
+            del self.clients[client]
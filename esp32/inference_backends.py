@@ -0,0 +1,393 @@
+"""
+Inference backends for the detection pipeline
+
+A backend runs named models on (N, H, W, 3) uint8 batches and returns the
+raw output dict ({output_name: ndarray}, NHWC). It also exposes each model's
+output vstream infos (name + quant_info) and input shape so post-processing
+can be set up once. Backends:
+
+- HailoBackend:     HEFs on the Hailo accelerator (Raspberry Pi)
+- ReplayBackend:    raw outputs recorded by RecordingBackend, no hardware needed
+- OnnxBackend:      ONNX Runtime on the CPU, for models exported with the same
+                    output cut as the HEFs (three DFL feature maps)
+- RecordingBackend: wraps any backend and records frames + raw outputs
+
+Backends that can swap models at runtime bump `generation`; pipelines
+rebuild their per-model state when it changes.
+"""
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+
+from postprocess import dense_nms
+
+# ─── OUTPUT INFO ───────────────────────────────────────────────────────────
+class QuantInfo:
+    def __init__(self, qp_zp=0.0, qp_scale=1.0):
+        self.qp_zp = qp_zp
+        self.qp_scale = qp_scale
+
+def is_nms_info(info):
+    """True for a HailoRT vstream info whose output went through on-chip NMS"""
+    fmt = getattr(info, 'format', None)
+    return fmt is not None and 'NMS' in str(getattr(fmt, 'order', ''))
+
+class VStreamInfo:
+    """Minimal stand-in for hailo_platform's vstream info.
+
+    `nms` is {'classes': N, 'max_boxes': M} for an on-chip NMS output, else None.
+    """
+
+    def __init__(self, name, shape=None, qp_zp=0.0, qp_scale=1.0, nms=None):
+        self.name = name
+        self.shape = tuple(shape) if shape else None
+        self.quant_info = QuantInfo(qp_zp, qp_scale)
+        self.nms = nms
+
+    def to_dict(self):
+        d = {'name': self.name, 'shape': list(self.shape) if self.shape else None,
+             'zp': float(self.quant_info.qp_zp), 'scale': float(self.quant_info.qp_scale)}
+        if self.nms:
+            d['nms'] = self.nms
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['name'], d.get('shape'), d['zp'], d['scale'], d.get('nms'))
+
+    @classmethod
+    def from_hailo(cls, info):
+        nms = getattr(info, 'nms', None)
+        if nms is None and is_nms_info(info):
+            nms = {'classes': int(info.nms_shape.number_of_classes),
+                   'max_boxes': int(info.nms_shape.max_bboxes_per_class)}
+        return cls(info.name, info.shape, info.quant_info.qp_zp, info.quant_info.qp_scale, nms)
+
+# ─── BASE ──────────────────────────────────────────────────────────────────
+class InferenceBackend:
+    """Base class; subclasses fill self.model_names and implement infer()"""
+
+    model_names = ()
+    generation = 0
+
+    def begin_frame(self, frame):
+        """Called by the pipeline once per frame before any infer()"""
+
+    def infer(self, model_name, batch):
+        raise NotImplementedError
+
+    def output_infos(self, model_name):
+        raise NotImplementedError
+
+    def input_shape(self, model_name):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ─── HEF METADATA CACHE ────────────────────────────────────────────────────
+class HEFMetaCache:
+    """Input shape and output vstream infos per HEF, persisted as JSON.
+
+    Entries are keyed by path and dropped when the file's size or mtime
+    changes, so a replaced HEF is always read again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def stamp(hef_path):
+        st = os.stat(hef_path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def get(self, hef_path):
+        """(input_shape, [VStreamInfo]), or None if missing or stale"""
+        entry = self.entries.get(hef_path)
+        try:
+            if entry is None or entry['stamp'] != self.stamp(hef_path):
+                return None
+        except OSError:
+            return None
+        return tuple(entry['input_shape']), [VStreamInfo.from_dict(o) for o in entry['outputs']]
+
+    def put(self, hef_path, input_shape, output_infos):
+        with self.lock:
+            self.entries[hef_path] = {'stamp': self.stamp(hef_path), 'input_shape': list(input_shape),
+                                      'outputs': [VStreamInfo.from_hailo(o).to_dict() for o in output_infos]}
+            try:
+                tmp = f'{self.path}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(self.entries, f, indent=2)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"✗ Could not write HEF metadata cache {self.path}: {e}")
+
+# ─── HAILO ─────────────────────────────────────────────────────────────────
+class HailoBackend(InferenceBackend):
+    """Configure every HEF in `models` ({name: {'path': ...}}) on one VDevice.
+
+    Models named in `defer` are not configured here; they (and new versions
+    of loaded models) come in through `load()`, typically from a
+    ModelManager thread. `load()` configures the HEF next to the running
+    model and stages it, and the next `begin_frame()` swaps it in, so a
+    frame never mixes two versions of a model. Output infos and input shapes
+    come from `meta_cache` (an HEFMetaCache) when it has them.
+    """
+
+    def __init__(self, models, meta_cache=None, defer=()):
+        import hailo_platform as hp
+        self.hp = hp
+        self.target = hp.VDevice()
+        self.meta_cache = meta_cache
+        self.lock = threading.Lock()
+        self.models = {}         # name -> (network group, in params, out params, input shape, output infos)
+        self.staged = {}
+        for model_name, model_config in models.items():
+            if model_name in defer:
+                continue
+            try:
+                self.models[model_name] = self._configure(model_config['path'])
+                print(f"✓ Loaded {model_name}")
+            except Exception as e:
+                print(f"✗ Failed to load {model_name}: {e}")
+        self.model_names = tuple(self.models)
+
+    def _configure(self, path):
+        hp = self.hp
+        hef = hp.HEF(path)
+        network_group = self.target.configure(hef, hp.ConfigureParams.create_from_hef(hef, hp.HailoStreamInterface.PCIe))[0]
+        in_params = hp.InputVStreamParams.make_from_network_group(network_group, hp.FormatType.UINT8)
+        out_params = hp.OutputVStreamParams.make_from_network_group(network_group, hp.FormatType.UINT8)
+        # On-chip NMS outputs (per-class box lists) are only produced as float32
+        nms_names = [v.name for v in network_group.get_output_vstream_infos() if is_nms_info(v)]
+        if nms_names:
+            float_params = hp.OutputVStreamParams.make_from_network_group(network_group, hp.FormatType.FLOAT32)
+            for name in nms_names:
+                out_params[name] = float_params[name]
+
+        cached = self.meta_cache.get(path) if self.meta_cache else None
+        if cached:
+            input_shape, output_infos = cached
+        else:
+            input_shape = tuple(hef.get_input_vstream_infos()[0].shape)
+            output_infos = [VStreamInfo.from_hailo(v) for v in hef.get_output_vstream_infos()]
+            if self.meta_cache:
+                self.meta_cache.put(path, input_shape, output_infos)
+        network_group.activate()
+        return network_group, in_params, out_params, input_shape, output_infos
+
+    def load(self, model_name, path):
+        """Configure `path` as `model_name` and stage it for the next frame (any thread)"""
+        entry = self._configure(path)
+        with self.lock:
+            replaced = self.staged.get(model_name)
+            self.staged[model_name] = entry
+        if replaced:
+            replaced[0].deactivate()
+
+    def begin_frame(self, frame):
+        if self.staged:
+            self._swap()
+
+    def _swap(self):
+        with self.lock:
+            staged, self.staged = self.staged, {}
+        for model_name, entry in staged.items():
+            old = self.models.get(model_name)
+            self.models[model_name] = entry
+            if old:
+                old[0].deactivate()
+            print(f"✓ Swapped in {model_name}")
+        self.model_names = tuple(self.models)
+        self.generation += 1
+
+    def infer(self, model_name, batch):
+        network_group, in_params, out_params = self.models[model_name][:3]
+        with self.hp.InferVStreams(network_group, in_params, out_params) as vstreams:
+            return vstreams.infer(batch)
+
+    def output_infos(self, model_name):
+        return self.models[model_name][4]
+
+    def input_shape(self, model_name):
+        return self.models[model_name][3]
+
+    def close(self):
+        with self.lock:
+            staged, self.staged = self.staged, {}
+        for entry in list(self.models.values()) + list(staged.values()):
+            entry[0].deactivate()
+        self.target.release()
+
+# ─── RECORD / REPLAY ───────────────────────────────────────────────────────
+# Recording layout:
+#   DIR/meta.json             {"models": {name: {"input_shape": [...], "outputs": [VStreamInfo...]}}}
+#   DIR/frames/000000.npz     "frame" plus "<model>::<output>" raw outputs for that frame
+
+class RecordingBackend(InferenceBackend):
+    """Pass-through backend that records each frame and its raw outputs"""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.model_names = backend.model_names
+        self.index = 0
+        self.pending = None
+        os.makedirs(os.path.join(path, 'frames'), exist_ok=True)
+        meta = {'models': {
+            name: {'input_shape': list(backend.input_shape(name)),
+                   'outputs': [VStreamInfo.from_hailo(v).to_dict() for v in backend.output_infos(name)]}
+            for name in self.model_names
+        }}
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    def _flush(self):
+        if self.pending is not None:
+            np.savez(os.path.join(self.path, 'frames', f'{self.index:06d}.npz'), **self.pending)
+            self.index += 1
+            self.pending = None
+
+    def begin_frame(self, frame):
+        self._flush()
+        self.pending = {'frame': frame}
+        self.backend.begin_frame(frame)
+
+    def infer(self, model_name, batch):
+        outputs = self.backend.infer(model_name, batch)
+        if self.pending is not None:
+            nms = {v.name: v.nms for v in self.backend.output_infos(model_name) if getattr(v, 'nms', None)}
+            for name, raw in outputs.items():
+                if name in nms:
+                    # Per-class box lists are ragged: record the dense layout
+                    raw = dense_nms(raw, nms[name]['classes'], nms[name]['max_boxes'])
+                self.pending[f'{model_name}::{name}'] = raw
+        return outputs
+
+    def output_infos(self, model_name):
+        return self.backend.output_infos(model_name)
+
+    def input_shape(self, model_name):
+        return self.backend.input_shape(model_name)
+
+    def close(self):
+        self._flush()
+        self.backend.close()
+
+class ReplayBackend(InferenceBackend):
+    """Serve raw outputs from a recording, one recorded frame per begin_frame()"""
+
+    def __init__(self, path, loop=True):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)['models']
+        self.infos = {name: [VStreamInfo.from_dict(o) for o in m['outputs']] for name, m in meta.items()}
+        self.input_shapes = {name: tuple(m['input_shape']) for name, m in meta.items()}
+        self.model_names = tuple(meta)
+        self.paths = sorted(glob.glob(os.path.join(path, 'frames', '*.npz')))
+        if not self.paths:
+            raise ValueError(f"No recorded frames found in {path}")
+        self.loop = loop
+        self.index = -1
+        self.current = {}
+
+    def begin_frame(self, frame):
+        self.index += 1
+        if self.index >= len(self.paths):
+            if not self.loop:
+                raise StopIteration("Recording exhausted")
+            self.index = 0
+        with np.load(self.paths[self.index]) as data:
+            self.current = {key: data[key] for key in data.files if key != 'frame'}
+
+    def infer(self, model_name, batch):
+        prefix = f'{model_name}::'
+        outputs = {k[len(prefix):]: v for k, v in self.current.items() if k.startswith(prefix)}
+        if not outputs:
+            # Model wasn't run on this recorded frame: return empty (all-background) outputs
+            outputs = {o.name: np.zeros((len(batch), o.nms['classes'], 5, 1), dtype=np.float32) if o.nms
+                       else np.full((len(batch),) + o.shape, background_q(o), dtype=np.uint8)
+                       for o in self.infos[model_name]}
+        return outputs
+
+def background_q(v_info):
+    """uint8 value that dequantizes to the most negative logit of an output (scores far below threshold).
+
+    The zero point dequantizes to logit 0, i.e. score 0.5, which clears any usual threshold.
+    """
+    return 0 if v_info.quant_info.qp_scale > 0 else 255
+
+    def output_infos(self, model_name):
+        return self.infos[model_name]
+
+    def input_shape(self, model_name):
+        return self.input_shapes[model_name]
+
+# ─── ONNX RUNTIME (CPU) ────────────────────────────────────────────────────
+class OnnxBackend(InferenceBackend):
+    """Run DIR/<model_name>.onnx with ONNX Runtime on the CPU.
+
+    NCHW float models get 0-1 scaled input and have 4-D outputs transposed to
+    NHWC, so the same post-processing runs on their (float) outputs.
+    """
+
+    def __init__(self, model_dir, models):
+        import onnxruntime as ort
+        self.sessions = {}
+        for model_name in models:
+            path = os.path.join(model_dir, f'{model_name}.onnx')
+            if not os.path.exists(path):
+                continue
+            sess = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+            inp = sess.get_inputs()[0]
+            nchw = len(inp.shape) == 4 and inp.shape[1] == 3
+            self.sessions[model_name] = (sess, inp, nchw)
+            print(f"✓ Loaded {model_name} (ONNX CPU)")
+        self.model_names = tuple(self.sessions)
+
+    def infer(self, model_name, batch):
+        sess, inp, nchw = self.sessions[model_name]
+        x = batch
+        if inp.type == 'tensor(float)':
+            x = batch.astype(np.float32) / 255.0
+        if nchw:
+            x = x.transpose(0, 3, 1, 2)
+        outputs = {}
+        for meta, out in zip(sess.get_outputs(), sess.run(None, {inp.name: np.ascontiguousarray(x)})):
+            outputs[meta.name] = out.transpose(0, 2, 3, 1) if nchw and out.ndim == 4 else out
+        return outputs
+
+    def output_infos(self, model_name):
+        return [VStreamInfo(o.name) for o in self.sessions[model_name][0].get_outputs()]
+
+    def input_shape(self, model_name):
+        _, inp, nchw = self.sessions[model_name]
+        shape = inp.shape[1:]
+        return (shape[1], shape[2], shape[0]) if nchw else tuple(shape)
+
+def open_backend(spec, models):
+    """Open a backend from a spec: 'hailo', 'replay:DIR' or 'onnx:DIR'"""
+    kind, _, arg = spec.partition(':')
+    if kind == 'hailo':
+        return HailoBackend(models)
+    if kind == 'replay':
+        return ReplayBackend(arg)
+    if kind == 'onnx':
+        return OnnxBackend(arg, models)
+    raise ValueError(f"Unknown inference backend: {spec}")
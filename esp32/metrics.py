@@ -0,0 +1,194 @@
+"""
+Runtime metrics - per-stage latency histograms, counters and gauges
+
+Stages report into the process-wide `metrics` registry; the HLS server exposes
+it in Prometheus text format at /metrics and as a rolling JSON summary at
+/metrics.json, so field regressions show up without SSH access.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+METRICS_WINDOW  = int(os.getenv('METRICS_WINDOW', '300'))     # frames in the rolling JSON summary
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)   # seconds
+THERMAL_ZONE    = '/sys/class/thermal/thermal_zone0/temp'
+METRIC_PREFIX   = 'smoki'
+
+def soc_temperature():
+    """SoC temperature in °C, or None off the Pi"""
+    try:
+        with open(THERMAL_ZONE) as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+# ─── HISTOGRAM ─────────────────────────────────────────────────────────────
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total, out = 0, []
+        for le, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            out.append((le, total))
+        return out
+
+# ─── REGISTRY ──────────────────────────────────────────────────────────────
+class Metrics:
+    """Thread-safe registry of stage histograms, counters and gauges"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.lock = threading.Lock()
+        self.window = window
+        self.histograms = {}
+        self.recent = {}
+        self.counters = {}
+        self.gauges = {}
+        self.labeled_gauges = {}
+        # (monotonic time, accelerator seconds) per frame, for the busy ratio
+        self.frames = deque(maxlen=window)
+        self.started = time.time()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self._observe(stage, seconds)
+
+    def _observe(self, stage, seconds):
+        if stage not in self.histograms:
+            self.histograms[stage] = Histogram()
+            self.recent[stage] = deque(maxlen=self.window)
+        self.histograms[stage].observe(seconds)
+        self.recent[stage].append(seconds)
+
+    def observe_frame(self, timings):
+        """Record one frame's {stage: seconds} timings"""
+        with self.lock:
+            for stage, seconds in timings.items():
+                self._observe(stage, seconds)
+            infer = sum(s for stage, s in timings.items() if stage.startswith('infer.'))
+            self.frames.append((time.monotonic(), infer))
+            self.counters['frames'] = self.counters.get('frames', 0) + 1
+
+    def inc(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_counter(self, name, value):
+        """Mirror a counter maintained elsewhere (e.g. a component's drop count)"""
+        with self.lock:
+            self.counters[name] = value
+
+    def gauge(self, name, fn):
+        """Register a gauge read by calling `fn()` at scrape time"""
+        with self.lock:
+            self.gauges[name] = fn
+
+    def labeled_gauge(self, name, label, fn):
+        """Register a gauge family; `fn()` returns {label value: value} at scrape time"""
+        with self.lock:
+            self.labeled_gauges[name] = (label, fn)
+
+    def _labeled_values(self):
+        values = {}
+        for name, (label, fn) in self.labeled_gauges.items():
+            try:
+                values[name] = (label, fn())
+            except Exception:
+                values[name] = (label, {})
+        return values
+
+    def accelerator_busy(self):
+        """Share of wall time spent in infer.* stages over the rolling window"""
+        if len(self.frames) < 2:
+            return None
+        span = self.frames[-1][0] - self.frames[0][0]
+        if span <= 0:
+            return None
+        return min(1.0, sum(s for _, s in list(self.frames)[1:]) / span)
+
+    def _gauge_values(self):
+        values = {'soc_temperature_celsius': soc_temperature(),
+                  'accelerator_busy_ratio': self.accelerator_busy()}
+        for name, fn in self.gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                values[name] = None
+        return values
+
+    def fps(self):
+        if len(self.frames) < 2:
+            return None
+        span = self.frames[-1][0] - self.frames[0][0]
+        return (len(self.frames) - 1) / span if span > 0 else None
+
+    # ─── exposition ─────────────────────────────────────────────────────────
+    def prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        p = METRIC_PREFIX
+        with self.lock:
+            lines = [f'# HELP {p}_stage_latency_seconds Per-stage latency',
+                     f'# TYPE {p}_stage_latency_seconds histogram']
+            for stage, h in sorted(self.histograms.items()):
+                for le, n in h.cumulative():
+                    le_str = '+Inf' if le == float('inf') else repr(le)
+                    lines.append(f'{p}_stage_latency_seconds_bucket{{stage="{stage}",le="{le_str}"}} {n}')
+                lines.append(f'{p}_stage_latency_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{p}_stage_latency_seconds_count{{stage="{stage}"}} {h.count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'# TYPE {p}_{name}_total counter')
+                lines.append(f'{p}_{name}_total {value}')
+            for name, value in sorted(self._gauge_values().items()):
+                if value is not None:
+                    lines.append(f'# TYPE {p}_{name} gauge')
+                    lines.append(f'{p}_{name} {float(value):.6g}')
+            for name, (label, values) in sorted(self._labeled_values().items()):
+                lines.append(f'# TYPE {p}_{name} gauge')
+                for key, value in sorted(values.items()):
+                    lines.append(f'{p}_{name}{{{label}="{key}"}} {float(value):.6g}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Rolling summary over the last `window` samples of each stage (ms)"""
+        with self.lock:
+            stages = {}
+            for stage, values in sorted(self.recent.items()):
+                arr = np.array(values) * 1000
+                stages[stage] = {'mean_ms': round(float(arr.mean()), 3),
+                                 'p50_ms': round(float(np.percentile(arr, 50)), 3),
+                                 'p95_ms': round(float(np.percentile(arr, 95)), 3),
+                                 'max_ms': round(float(arr.max()), 3),
+                                 'samples': len(arr)}
+            fps = self.fps()
+            return {'uptime_s': round(time.time() - self.started, 1),
+                    'fps': round(fps, 2) if fps else None,
+                    'window': self.window,
+                    'stages': stages,
+                    'counters': dict(self.counters),
+                    'gauges': self._gauge_values(),
+                    'labeled_gauges': {name: values for name, (_, values) in self._labeled_values().items()}}
+
+    def summary_json(self):
+        return json.dumps(self.summary())
+
+# Process-wide registry shared by the pipeline, uploader and screenshot writer
+metrics = Metrics()
@@ -0,0 +1,137 @@
+"""
+Model manager - hot reload of HEF models without restarting the stream
+
+A background thread watches each model's HEF (size + mtime) and reloads a
+model once its file has changed and then stayed unchanged for one poll
+interval, so a half-copied HEF is never configured. Reloads can also be
+requested over the local HTTP server (POST /models/reload?model=NAME). The
+new network group is configured on this thread next to the running one and
+the backend swaps it in between frames; if configuring fails, the old model
+keeps running. Models in MODEL_DEFER are skipped at startup and configured
+here right after, so the stream comes up as soon as the models it needs do.
+"""
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import metrics
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+MODEL_WATCH          = os.getenv('MODEL_WATCH', 'true').lower() == 'true'
+MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', '2.0'))      # s between HEF file checks
+MODEL_DEFER          = [m.strip() for m in os.getenv('MODEL_DEFER', 'license_plate_detection,license_plate_recognition').split(',') if m.strip()]
+HEF_META_CACHE       = os.getenv('HEF_META_CACHE', '/home/sevi/smoki_project/models/.hef_meta.json')
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+# ─── MANAGER ───────────────────────────────────────────────────────────────
+class ModelManager:
+    """Load deferred models and reload changed ones on a background thread.
+
+    `backend` must provide `load(model_name, path)` (HailoBackend).
+    """
+
+    def __init__(self, backend, models, defer=(), watch=MODEL_WATCH, interval=MODEL_WATCH_INTERVAL):
+        self.backend = backend
+        self.models = models
+        self.watch = watch
+        self.interval = interval
+        self.requests = queue.Queue()
+        self.stamps = {name: file_stamp(config['path']) for name, config in models.items()}
+        self.changing = {}          # name -> stamp seen on the last check, waiting to settle
+        self.state = {}
+        for name in models:
+            status = 'loaded' if name in backend.model_names else 'deferred' if name in defer else 'failed'
+            self.state[name] = {'status': status, 'loaded_at': None, 'load_seconds': None, 'error': None}
+        self.reloads = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+        for name in defer:
+            if name in models:
+                self.requests.put(name)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='model-manager', daemon=True)
+        self._thread.start()
+        if self.watch:
+            print(f"✓ Watching {len(self.models)} model files for changes (every {self.interval:g}s)")
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self.requests.put(None)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def reload(self, model_name=None):
+        """Queue a reload of one model (or all of them); returns the names queued"""
+        if model_name and model_name not in self.models:
+            raise ValueError(f"Unknown model: {model_name}")
+        names = [model_name] if model_name else list(self.models)
+        for name in names:
+            self.requests.put(name)
+        return names
+
+    def status(self):
+        return {'generation': self.backend.generation, 'reloads': self.reloads, 'failures': self.failures,
+                'models': {name: dict(state) for name, state in self.state.items()}}
+
+    def _run(self):
+        next_check = time.monotonic() + self.interval
+        while not self._stop.is_set():
+            try:
+                name = self.requests.get(timeout=max(0.0, next_check - time.monotonic()))
+                if name is None:
+                    break
+                self._load(name)
+            except queue.Empty:
+                pass
+            if time.monotonic() >= next_check:
+                if self.watch:
+                    self._check_files()
+                next_check = time.monotonic() + self.interval
+
+    def _check_files(self):
+        for name, config in self.models.items():
+            stamp = file_stamp(config['path'])
+            if stamp is None or stamp == self.stamps[name]:
+                self.changing.pop(name, None)
+            elif self.changing.get(name) == stamp:
+                # Unchanged since the last check: the copy has finished
+                del self.changing[name]
+                print(f"🔄 {name} changed on disk, reloading")
+                self._load(name)
+            else:
+                self.changing[name] = stamp
+
+    def _load(self, name):
+        path = self.models[name]['path']
+        state = self.state[name]
+        # Remember the version we tried, so a broken file isn't retried every check
+        self.stamps[name] = file_stamp(path)
+        previous = state['status']
+        state['status'] = 'loading'
+        start = time.perf_counter()
+        try:
+            self.backend.load(name, path)
+        except Exception as e:
+            self.failures += 1
+            metrics.inc('model_load_failures')
+            state.update(status='failed' if previous in ('deferred', 'failed') else previous, error=str(e))
+            print(f"✗ Failed to load {name}: {e}" + (" (keeping the running model)" if previous == 'loaded' else ''))
+            return
+        seconds = time.perf_counter() - start
+        self.reloads += 1
+        metrics.inc('model_loads')
+        metrics.observe('model_load', seconds)
+        state.update(status='loaded', error=None, load_seconds=round(seconds, 3),
+                     loaded_at=datetime.now(timezone.utc).isoformat())
+        print(f"✓ Configured {name} in {seconds:.2f}s, swapping in at the next frame")
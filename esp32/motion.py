@@ -0,0 +1,81 @@
+"""
+Motion gate - skip inference on frames where nothing in the scene changed
+
+Each frame is compared against a running-average background on a small
+blurred grayscale copy, which costs well under a millisecond on the Pi. The
+models run when enough of the scene changed, for a short hold period after
+that, and on a keep-alive cadence so slow-moving smoke is still sampled.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+MOTION_GATE       = os.getenv('MOTION_GATE', 'true').lower() == 'true'
+MOTION_WIDTH      = int(os.getenv('MOTION_WIDTH', '160'))           # px, analysis frame width
+MOTION_PIXEL_DIFF = int(os.getenv('MOTION_PIXEL_DIFF', '18'))       # gray levels for a pixel to count as changed
+MOTION_MIN_AREA   = float(os.getenv('MOTION_MIN_AREA', '0.004'))    # changed fraction of the frame that triggers
+MOTION_HOLD       = int(os.getenv('MOTION_HOLD', '15'))             # frames to keep running after motion
+MOTION_KEEPALIVE  = float(os.getenv('MOTION_KEEPALIVE', '2.0'))     # seconds between forced runs on a static scene
+MOTION_LEARN_RATE = 0.05                                             # background running-average weight
+
+class MotionGate:
+    """Decide per frame whether the expensive models need to run"""
+
+    def __init__(self, width=MOTION_WIDTH, pixel_diff=MOTION_PIXEL_DIFF, min_area=MOTION_MIN_AREA,
+                 hold=MOTION_HOLD, keepalive=MOTION_KEEPALIVE, learn_rate=MOTION_LEARN_RATE):
+        self.width = width
+        self.pixel_diff = pixel_diff
+        self.min_area = min_area
+        self.hold = hold
+        self.keepalive = keepalive
+        self.learn_rate = learn_rate
+        self.background = None
+        self.hold_left = 0
+        self.last_run = 0.0
+        self.changed = 0.0
+        self.frames = 0
+        self.skipped = 0
+        self.keepalive_runs = 0
+
+    def _small_gray(self, frame_rgb):
+        h, w = frame_rgb.shape[:2]
+        small = cv2.resize(frame_rgb, (self.width, max(1, h * self.width // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame_rgb, now=None):
+        """True if this frame should go through the models"""
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        gray = self._small_gray(frame_rgb)
+        if self.background is None:
+            self.background = gray.astype(np.float32)
+            self.last_run = now
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        self.changed = np.count_nonzero(diff > self.pixel_diff) / diff.size
+        cv2.accumulateWeighted(gray, self.background, self.learn_rate)
+
+        if self.changed >= self.min_area:
+            self.hold_left = self.hold
+        elif self.hold_left > 0:
+            self.hold_left -= 1
+        elif now - self.last_run < self.keepalive:
+            self.skipped += 1
+            return False
+        else:
+            self.keepalive_runs += 1
+        self.last_run = now
+        return True
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def stats(self):
+        return {'frames': self.frames, 'skipped': self.skipped, 'keepalive_runs': self.keepalive_runs,
+                'skip_ratio': round(self.skip_ratio, 3), 'changed_area': round(float(self.changed), 4)}
@@ -0,0 +1,137 @@
+"""
+Multi-camera ingest - several cameras through one pipeline process and one Hailo VDevice
+
+Each camera gets a CameraChannel: a capture thread that keeps only the newest
+frame (superseded frames are handed straight back to the camera), plus the
+camera's own pipeline state, encoder and HLS directory. The scheduler hands
+out rounds of at most one frame per camera, rotating which camera goes first,
+so a fast or busy camera cannot starve the others. A round is either batched
+(`pipeline.process_batch`: one inference call per model for every camera) or
+interleaved (one camera after another through the shared network groups).
+"""
+import os
+import threading
+import time
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+CAMERAS           = os.getenv('CAMERAS', '')                # 'id=source;id=source', e.g. 'cam_a=dual:0;cam_b=live:/dev/video0'
+CAMERA_LOCATIONS  = os.getenv('CAMERA_LOCATIONS', '')       # 'id=location;...' (default: CAMERA_LOCATION)
+CAMERA_BATCH      = os.getenv('CAMERA_BATCH', 'true').lower() == 'true'
+CAMERA_BATCH_WAIT = float(os.getenv('CAMERA_BATCH_WAIT', '0.02'))   # s to wait for the other cameras' frames
+
+def _pairs(spec):
+    out = []
+    for entry in spec.split(';'):
+        key, sep, value = entry.strip().partition('=')
+        if sep and key.strip():
+            out.append((key.strip(), value.strip()))
+    return out
+
+def parse_cameras(spec=CAMERAS, locations=CAMERA_LOCATIONS, default_location='unknown'):
+    """[(camera_id, source_spec, location)] from the CAMERAS / CAMERA_LOCATIONS strings"""
+    location_of = dict(_pairs(locations))
+    cameras = _pairs(spec)
+    ids = [camera_id for camera_id, _ in cameras]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Duplicate camera id in CAMERAS: {spec}")
+    return [(camera_id, source, location_of.get(camera_id, default_location)) for camera_id, source in cameras]
+
+# ─── CHANNEL ───────────────────────────────────────────────────────────────
+class CameraChannel:
+    """One camera: source, newest-frame mailbox and per-camera outputs.
+
+    The caller attaches `pipeline`, `encoder`, `clip_recorder` and `hls_dir`.
+    """
+
+    def __init__(self, camera_id, source, location='unknown'):
+        self.camera_id = camera_id
+        self.source = source
+        self.location = location
+        self.pipeline = None
+        self.encoder = None
+        self.clip_recorder = None
+        self.hls_dir = None
+        self.latest = None        # (frame, capture time)
+        self.ended = False
+        self.processed = 0
+        self.superseded = 0
+        self._thread = None
+
+    def start(self, cond, stop):
+        self._thread = threading.Thread(target=self._grab, args=(cond, stop), daemon=True,
+                                        name=f'capture-{self.camera_id}')
+        self._thread.start()
+
+    def _grab(self, cond, stop):
+        while not stop.is_set():
+            try:
+                frame = self.source.capture()
+            except Exception as e:
+                print(f"✗ Camera {self.camera_id} capture failed: {e}")
+                break
+            if frame is None:
+                break
+            with cond:
+                old, self.latest = self.latest, (frame, time.time())
+                cond.notify_all()
+            if old:
+                # Inference hasn't caught up: the older frame goes straight back to the camera
+                old[0].release()
+                self.superseded += 1
+        with cond:
+            self.ended = True
+            cond.notify_all()
+
+    def take(self):
+        item, self.latest = self.latest, None
+        if item:
+            self.processed += 1
+        return item
+
+    def close(self):
+        if self._thread:
+            self._thread.join(2)
+        if self.latest:
+            self.latest[0].release()
+            self.latest = None
+        self.source.close()
+
+# ─── SCHEDULER ─────────────────────────────────────────────────────────────
+class FairScheduler:
+    """Round-robin over camera channels; each round has at most one (the newest) frame per camera"""
+
+    def __init__(self, channels, batch_wait=CAMERA_BATCH_WAIT):
+        self.channels = list(channels)
+        self.batch_wait = batch_wait
+        self.cond = threading.Condition()
+        self.offset = 0
+        self.rounds = 0
+        self._stop = threading.Event()
+
+    def start(self):
+        for channel in self.channels:
+            channel.start(self.cond, self._stop)
+        return self
+
+    @property
+    def ended(self):
+        return all(channel.ended and channel.latest is None for channel in self.channels)
+
+    def next_round(self, timeout=1.0):
+        """[(channel, (frame, capture_time))] in this round's camera order; [] on timeout"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: any(c.latest for c in self.channels) or self.ended, timeout):
+                return []
+            if self.batch_wait > 0:
+                # Give the other cameras a moment so the round can be batched
+                self.cond.wait_for(lambda: all(c.latest or c.ended for c in self.channels), self.batch_wait)
+            n = len(self.channels)
+            order = self.channels[self.offset:] + self.channels[:self.offset]
+            self.offset = (self.offset + 1) % n
+            self.rounds += 1
+            return [(channel, channel.take()) for channel in order if channel.latest is not None]
+
+    def stop(self):
+        self._stop.set()
+        for channel in self.channels:
+            channel.close()
@@ -0,0 +1,109 @@
+"""
+Non-maximum suppression shared by the camera scripts
+
+`batched_nms()` pre-filters to the top-k candidates, makes suppression
+class-aware by offsetting each class's boxes into a disjoint coordinate range
+(so all classes are handled in one pass), and stops at a max-detections cap.
+Hard (greedy) and Gaussian soft-NMS are supported.
+"""
+import os
+
+import numpy as np
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+NMS_TOP_K      = int(os.getenv('NMS_TOP_K', '300'))
+MAX_DETECTIONS = int(os.getenv('MAX_DETECTIONS', '100'))
+SOFT_NMS_SIGMA = 0.5
+
+# ─── REFERENCE ─────────────────────────────────────────────────────────────
+def nms(boxes, scores, thresh):
+    """Original class-agnostic greedy NMS (kept for benchmarks)"""
+    if len(boxes) == 0: return []
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2-x1)*(y2-y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]; keep.append(i)
+        xx1, yy1 = np.maximum(x1[i], x1[order[1:]]), np.maximum(y1[i], y1[order[1:]])
+        xx2, yy2 = np.minimum(x2[i], x2[order[1:]]), np.minimum(y2[i], y2[order[1:]])
+        w, h = np.maximum(0, xx2-xx1), np.maximum(0, yy2-yy1)
+        ovr = (w*h)/(areas[i]+areas[order[1:]]-(w*h)+1e-6)
+        order = order[1:][ovr < thresh]
+    return keep
+
+# ─── VECTORIZED ENGINE ─────────────────────────────────────────────────────
+def pairwise_iou(boxes):
+    """(N, N) IoU matrix for (N, 4) x1y1x2y2 boxes"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    w = np.maximum(0, np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]))
+    h = np.maximum(0, np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]))
+    inter = w * h
+    return inter / (areas[:, None] + areas[None, :] - inter + 1e-6)
+
+def batched_nms(boxes, scores, classes=None, iou_thresh=0.45, top_k=NMS_TOP_K,
+                max_det=MAX_DETECTIONS, class_aware=True, soft=False,
+                sigma=SOFT_NMS_SIGMA, min_score=0.001):
+    """Suppress overlapping boxes.
+
+    Returns (keep, kept_scores): indices into the inputs, best first, and the
+    score of each kept box (decayed by soft-NMS when `soft=True`).
+    """
+    empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    if len(boxes) == 0:
+        return empty
+    boxes = np.asarray(boxes, dtype=np.float32)
+    scores = np.asarray(scores, dtype=np.float64)
+
+    # Top-k pre-filter, then sort best first
+    order = np.arange(len(scores))
+    if top_k and len(scores) > top_k:
+        order = np.argpartition(-scores, top_k - 1)[:top_k]
+    order = order[np.argsort(-scores[order], kind='stable')]
+
+    cand = boxes[order]
+    if class_aware and classes is not None and len(np.unique(classes)) > 1:
+        # Shift each class into its own coordinate range so cross-class IoU is 0
+        span = float(cand.max() - min(cand.min(), 0)) + 1
+        cand = cand + (np.asarray(classes)[order] * span)[:, None].astype(np.float32)
+    cand_scores = scores[order]
+
+    if soft:
+        keep, kept_scores = _soft_suppress(pairwise_iou(cand), cand_scores, max_det, sigma, min_score)
+    else:
+        keep = _hard_suppress(cand, iou_thresh, max_det)
+        kept_scores = cand_scores[keep]
+    if len(keep) == 0:
+        return empty
+    return order[keep], kept_scores
+
+def _hard_suppress(boxes, thresh, max_det):
+    """Greedy NMS over score-sorted boxes; each step only tests the survivors"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    remaining = np.arange(len(boxes))
+    keep = []
+    while remaining.size > 0:
+        i, rest = remaining[0], remaining[1:]
+        keep.append(i)
+        if max_det and len(keep) >= max_det:
+            break
+        w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        remaining = rest[inter / (areas[i] + areas[rest] - inter + 1e-6) < thresh]
+    return np.array(keep, dtype=np.int64)
+
+def _soft_suppress(iou, scores, max_det, sigma, min_score):
+    scores = scores.copy()
+    alive = scores >= min_score
+    keep = []
+    while alive.any() and not (max_det and len(keep) >= max_det):
+        i = int(np.argmax(np.where(alive, scores, -np.inf)))
+        keep.append(i)
+        alive[i] = False
+        scores = np.where(alive, scores * np.exp(-(iou[i] ** 2) / sigma), scores)
+        alive &= scores >= min_score
+    keep = np.array(keep, dtype=np.int64)
+    return keep, scores[keep]
@@ -0,0 +1,72 @@
+"""
+Detection overlays - per-frame detection metadata for viewers to draw themselves
+
+Instead of burning boxes and labels into the stream, each streamed frame's
+detections are published as a JSON message once the encoder has written the
+frame, stamped with the frame's presentation time (`pts`, seconds since the
+encoder started) and the matching wall-clock `stream_time`, which lines up
+with the playlist's EXT-X-PROGRAM-DATE-TIME. The HLS origin fans messages out
+over a WebSocket (/detections) and keeps the last few for /detections.json.
+Stream and screenshots stay clean; OVERLAY_BURN_IN=true draws as before.
+"""
+import json
+import os
+import threading
+from collections import deque
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+OVERLAY_BURN_IN = os.getenv('OVERLAY_BURN_IN', 'false').lower() == 'true'   # draw boxes into the frames
+OVERLAY_HISTORY = int(os.getenv('OVERLAY_HISTORY', '150'))                  # messages kept for /detections.json
+
+def overlay_payload(result, camera_id, capture_time):
+    """Frame metadata known after inference (the encoder adds the timing)"""
+    h, w = result.vis_frame.shape[:2]
+    boxes = []
+    for model_name in ('vehicle_detection', 'smoke_detection'):
+        for x1, y1, x2, y2, class_name, conf in result.detections[model_name]:
+            boxes.append({'model': model_name, 'class': class_name, 'confidence': round(conf, 3),
+                          'box': [x1, y1, x2, y2]})
+    for plate in result.plates:
+        boxes.append({'model': 'license_plate_detection', 'class': 'license_plate',
+                      'confidence': round(plate['confidence'], 3), 'box': list(plate['bbox']),
+                      'text': plate.get('text')})
+    return {'camera_id': camera_id, 'capture_time': round(capture_time, 3), 'width': w, 'height': h,
+            'inferred': result.inferred, 'detections': boxes}
+
+# ─── FEED ──────────────────────────────────────────────────────────────────
+class MetadataFeed:
+    """Thread-safe fan-out of overlay messages to subscribers, with a short history"""
+
+    def __init__(self, history=OVERLAY_HISTORY):
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=history)
+        self.subscribers = set()
+        self.published = 0
+
+    def subscribe(self, fn):
+        """`fn(camera_id, text)` is called for every message, from the publishing thread"""
+        with self.lock:
+            self.subscribers.add(fn)
+
+    def unsubscribe(self, fn):
+        with self.lock:
+            self.subscribers.discard(fn)
+
+    def publish_frame(self, payload, pts, stream_time):
+        """StreamEncoder `on_frame` hook: the frame went out at `pts`"""
+        message = dict(payload, pts=round(pts, 4), stream_time=round(stream_time, 4))
+        # Serialized once, whatever the number of viewers
+        text = json.dumps(message)
+        with self.lock:
+            self.recent.append(message)
+            self.published += 1
+            subscribers = list(self.subscribers)
+        for fn in subscribers:
+            fn(message['camera_id'], text)
+
+    def history_json(self):
+        with self.lock:
+            return json.dumps(list(self.recent))
+
+# Process-wide feed shared by the stream encoders and the HLS origin
+overlay_feed = MetadataFeed()
@@ -0,0 +1,414 @@
+"""
+Detection pipeline - per-frame vehicle, smoke, plate and face processing
+
+Hardware-independent: frames come from any `frame_sources` source and models
+run on any `inference_backends` backend, so the same decode/NMS/cascade code
+runs on the Pi (Hailo) and off it (replay, ONNX CPU). Each stage is timed for
+the benchmark CLI and the live FPS line.
+"""
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from nms import batched_nms, MAX_DETECTIONS
+from plates import PlateCascade, CTCDecoder, best_plate_text
+from postprocess import make_decoder
+from overlays import OVERLAY_BURN_IN
+from preprocess import letterbox
+from privacy import FaceTracker
+from smoke_cascade import SmokeCascade
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+# 6 Separate HEF Models
+MODELS = {
+    'vehicle_detection': {
+        'path': r'/home/sevi/smoki_project/models/vehicle_detection.hef',
+        'classes': ['passenger', 'puv', 'service', 'two_wheel', 'exhaust_pipe']
+    },
+    'smoke_detection': {
+        'path': r'/home/sevi/smoki_project/models/smoke_detection.hef',
+        'classes': ['smoke_black', 'smoke_white']
+    },
+    'license_plate_detection': {
+        'path': r'/home/sevi/smoki_project/models/license_plate_detection.hef',
+        'classes': ['license_plate']
+    },
+    'license_plate_recognition': {
+        'path': r'/home/sevi/smoki_project/models/license_plate_recognition.hef',
+        'classes': ['text']
+    },
+    'face_detection': {
+        'path': r'/home/sevi/smoki_project/models/face_detection.hef',
+        'classes': ['face']
+    },
+    'face_blur': {
+        'path': r'/home/sevi/smoki_project/models/face_blur.hef',
+        'classes': ['blurred_face']
+    }
+}
+
+# Box colours (BGR) used on the visualisation frame
+VEHICLE_COLOR = (0, 255, 0)
+SMOKE_COLOR   = (0, 0, 255)
+PLATE_COLOR   = (255, 255, 0)
+
+# ─── HELPERS ───────────────────────────────────────────────────────────────
+def draw_detection(frame, det, color):
+    x1, y1, x2, y2, class_name, conf = det
+    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+    cv2.putText(frame, f"{class_name} {conf:.2f}", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+def draw_plates(frame, plates):
+    for plate in plates:
+        x1, y1, x2, y2 = plate['bbox']
+        cv2.rectangle(frame, (x1, y1), (x2, y2), PLATE_COLOR, 2)
+        if plate['text']:
+            cv2.putText(frame, plate['text'], (x1, y2+15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, PLATE_COLOR, 2)
+
+def decode_detections(decoder, raw_outputs, class_names, transform, iou_thresh, timer):
+    """Raw outputs of one full-frame model -> [(x1, y1, x2, y2, class_name, conf)] in frame coordinates"""
+    ratio, pad_left, pad_top = transform
+    with timer.stage('decode'):
+        boxes, scores, classes = decoder(raw_outputs)
+    detections = []
+    if len(boxes) == 0:
+        return detections
+    with timer.stage('nms'):
+        if getattr(decoder, 'suppressed', False):
+            # Already suppressed on the accelerator: keep the best MAX_DETECTIONS
+            keep = np.argsort(-scores, kind='stable')[:MAX_DETECTIONS]
+            kept_scores = scores[keep]
+        else:
+            keep, kept_scores = batched_nms(boxes, scores, classes, iou_thresh)
+        for b, s, c in zip(boxes[keep], kept_scores, classes[keep]):
+            x1, y1, x2, y2 = map(int, (b - [pad_left, pad_top, pad_left, pad_top]) / ratio)
+            detections.append((x1, y1, x2, y2, class_names[c], float(s)))
+    return detections
+
+def empty_detections():
+    return {'vehicle_detection': [], 'smoke_detection': [], 'license_plate_detection': [], 'face_detection': []}
+
+class StageTimer:
+    """Accumulates wall time per named stage for one frame"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+# ─── RESULT ────────────────────────────────────────────────────────────────
+class FrameResult:
+    """Everything the pipeline produced for one frame.
+
+    `detections` is keyed by model name with (x1, y1, x2, y2, class_name, conf)
+    tuples, the shape `send_smoke_event()` uploads. `faces` are the boxes
+    that must be masked; `vis_frame` is unmasked until `mask()` is called.
+    """
+
+    def __init__(self, frame, vis_frame, detections, faces, plates, plate_text, timings, inferred=True,
+                 smoke_analysis=None):
+        self.frame = frame
+        self.vis_frame = vis_frame
+        self.detections = detections
+        self.faces = faces
+        self.plates = plates
+        self.plate_text = plate_text
+        self.timings = timings
+        self.inferred = inferred   # False when the motion gate skipped the models
+        self.smoke_analysis = smoke_analysis or [None] * len(detections['smoke_detection'])
+        self.meta = None          # caller data carried through (e.g. capture time)
+        self.release = None       # set when vis_frame lives in a buffer that must be handed back
+        self.masker = None
+        self.masked = False
+
+    def mask(self):
+        """Mask faces on vis_frame (once) and return it; call before the frame is encoded or saved"""
+        if not self.masked:
+            if self.masker is not None and self.faces:
+                self.masker(self.vis_frame, self.faces)
+            self.masked = True
+        return self.vis_frame
+
+    @property
+    def smoke_detections(self):
+        return self.detections['smoke_detection']
+
+    @property
+    def smoke_detected(self):
+        return len(self.smoke_detections) > 0
+
+    @property
+    def all_detections(self):
+        """Vehicle, smoke and plate boxes (the ones drawn and saved with screenshots)"""
+        return (self.detections['vehicle_detection'] + self.detections['smoke_detection']
+                + self.detections['license_plate_detection'])
+
+# ─── PIPELINE ──────────────────────────────────────────────────────────────
+class DetectionPipeline:
+    """Run the multi-model pipeline on RGB frames.
+
+    `models` is the MODELS config ({name: {'classes': [...]}}); models the
+    backend didn't load are skipped, as on the Pi when a HEF fails to load.
+    With a `motion_gate`, frames it rejects skip inference entirely. With
+    `smoke_cascade`, the smoke model runs on ROIs around exhaust pipes and
+    vehicles, with a periodic full-frame pass. A `smoke_analyzer` adds
+    opacity/colour characterization for every smoke box. Face boxes are
+    tracked between face-model runs and masked by `privacy_masker` when the
+    result's `mask()` is called. Boxes and labels are drawn into `vis_frame`
+    only with `burn_in`; otherwise viewers draw them from the overlay feed.
+    Models the backend swaps in at runtime are picked up by `sync()` at the
+    start of the next frame.
+    """
+
+    def __init__(self, backend, models, conf_thresh=0.25, iou_thresh=0.45, input_size=640,
+                 motion_gate=None, smoke_cascade=False, smoke_analyzer=None, privacy_masker=None,
+                 burn_in=OVERLAY_BURN_IN):
+        self.backend = backend
+        self.models = models
+        self.conf_thresh = conf_thresh
+        self.iou_thresh = iou_thresh
+        self.input_size = input_size
+        self.motion_gate = motion_gate
+        self.smoke_analyzer = smoke_analyzer
+        self.privacy_masker = privacy_masker
+        self.burn_in = burn_in
+        self.use_smoke_cascade = smoke_cascade
+        self.face_tracker = None
+        self.smoke_cascade = None
+        self.plate_cascade = None
+        self._build()
+
+    def sync(self):
+        """Rebuild per-model state if the backend swapped models in; True if it did"""
+        if self.generation == self.backend.generation:
+            return False
+        self._build()
+        return True
+
+    def _build(self):
+        backend, models = self.backend, self.models
+        self.generation = backend.generation
+        self.loaded = set(backend.model_names)
+        self.decoders = {name: make_decoder(backend.output_infos(name), self.conf_thresh, self.input_size)
+                         for name in backend.model_names}
+        # Trackers and cascade counters carry over a model swap
+        if self.face_tracker is None and 'face_detection' in self.loaded:
+            self.face_tracker = FaceTracker()
+
+        if not self.use_smoke_cascade or 'smoke_detection' not in self.loaded:
+            self.smoke_cascade = None
+        elif self.smoke_cascade is None:
+            self.smoke_cascade = SmokeCascade(self.decoders['smoke_detection'], models['smoke_detection']['classes'],
+                                              self.input_size, self.iou_thresh)
+        else:
+            self.smoke_cascade.decoder = self.decoders['smoke_detection']
+
+        # License plate cascade: one detector call and one OCR call per frame
+        self.plate_cascade = None
+        if 'license_plate_detection' in self.loaded:
+            ocr_infer = ocr_decoder = ocr_input_shape = None
+            if 'license_plate_recognition' in self.loaded:
+                ocr_infer = lambda batch: backend.infer('license_plate_recognition', batch)
+                ocr_decoder = CTCDecoder(backend.output_infos('license_plate_recognition')[0])
+                ocr_input_shape = backend.input_shape('license_plate_recognition')
+            self.plate_cascade = PlateCascade(
+                lambda batch: backend.infer('license_plate_detection', batch),
+                self.decoders['license_plate_detection'],
+                ocr_infer, ocr_decoder, ocr_input_shape, iou_thresh=self.iou_thresh
+            )
+
+    def detect(self, model_name, input_data, transform, timer, raw=None):
+        """Full-frame detection with one model -> [(x1, y1, x2, y2, class_name, conf)]
+
+        `raw` may hold this frame's outputs from a batched call ({model: outputs}).
+        """
+        if raw and model_name in raw:
+            raw_outputs = raw[model_name]
+        else:
+            with timer.stage(f'infer.{model_name}'):
+                raw_outputs = self.backend.infer(model_name, input_data)
+        return decode_detections(self.decoders[model_name], raw_outputs, self.models[model_name]['classes'],
+                                 transform, self.iou_thresh, timer)
+
+    def prepare(self, frame_rgb, timer):
+        """Letterbox once; the same input feeds every full-frame model"""
+        with timer.stage('preprocess'):
+            input_frame, ratio, pad_left, pad_top = letterbox(frame_rgb, self.input_size)
+            input_data = np.expand_dims(input_frame, axis=0)
+        return input_data, (ratio, pad_left, pad_top)
+
+    def run_plates(self, frame_rgb, detections, timer):
+        """Plate cascade over the vehicle detections; fills detections['license_plate_detection']"""
+        if self.plate_cascade is None or not detections['vehicle_detection']:
+            return [], None
+        with timer.stage('plates'):
+            plates = self.plate_cascade.run(frame_rgb, detections['vehicle_detection'])
+            detections['license_plate_detection'] = [
+                p['bbox'] + ('license_plate', p['confidence']) for p in plates
+            ]
+            return plates, best_plate_text(plates)
+
+    def analyze_smoke(self, frame_rgb, detections, timer):
+        """Smoke opacity / colour against this camera's background"""
+        if self.smoke_analyzer is None:
+            return None
+        with timer.stage('smoke_analysis'):
+            smoke_analysis = self.smoke_analyzer.analyze_all(frame_rgb, detections['smoke_detection'])
+            self.smoke_analyzer.update_background(
+                frame_rgb, detections['vehicle_detection'] + detections['smoke_detection'])
+        return smoke_analysis
+
+    def process(self, frame_rgb, vis_frame=None):
+        """Run all models on an RGB frame.
+
+        `vis_frame` is an optional same-size BGR frame to draw on (e.g. the
+        camera's main stream buffer); without it one is converted from `frame_rgb`.
+        """
+        timer = StageTimer()
+        if not self.gate(frame_rgb, timer):
+            return self.skip(frame_rgb, vis_frame, empty_detections(), timer)
+        input_data, transform = self.prepare(frame_rgb, timer)
+        return self.run(frame_rgb, vis_frame, input_data, transform, timer)
+
+    def gate(self, frame_rgb, timer):
+        """Start a frame; False when the motion gate lets the models be skipped"""
+        self.backend.begin_frame(frame_rgb)
+        self.sync()
+        if self.motion_gate is None:
+            return True
+        with timer.stage('motion'):
+            return self.motion_gate.check(frame_rgb)
+
+    def batchable_models(self):
+        """Full-frame models the next frame will run on the shared letterboxed input"""
+        names = [m for m in ('vehicle_detection', 'smoke_detection') if m in self.loaded]
+        if self.smoke_cascade is not None and 'smoke_detection' in names:
+            names.remove('smoke_detection')      # runs on ROIs chosen from this frame's vehicles
+        if self.face_tracker is not None and self.face_tracker.due:
+            names.append('face_detection')
+        return names
+
+    def run(self, frame_rgb, vis_frame, input_data, transform, timer, raw=None):
+        """Models, cascades and drawing for a letterboxed frame (`raw`: outputs from a batched call)"""
+        detections = empty_detections()
+        faces = []
+        if vis_frame is None:
+            with timer.stage('preprocess'):
+                vis_frame = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+
+        # 1. Vehicle detection
+        if 'vehicle_detection' in self.loaded:
+            detections['vehicle_detection'] = self.detect('vehicle_detection', input_data, transform, timer, raw)
+
+        # 2. Smoke detection: full frame, or batched ROIs around exhaust pipes / vehicles in cascade mode
+        if self.smoke_cascade is not None:
+            detections['smoke_detection'] = self.detect_smoke_rois(frame_rgb, detections['vehicle_detection'],
+                                                                   input_data, transform, timer)
+        elif 'smoke_detection' in self.loaded:
+            detections['smoke_detection'] = self.detect('smoke_detection', input_data, transform, timer, raw)
+
+        smoke_analysis = self.analyze_smoke(frame_rgb, detections, timer)
+
+        # 3-4. License plate detection + recognition (batched over vehicle ROIs)
+        plates, plate_text = self.run_plates(frame_rgb, detections, timer)
+
+        # 5. Face detection (every few frames; known boxes are carried in between)
+        if self.face_tracker is not None:
+            if self.face_tracker.should_detect():
+                face_dets = self.detect('face_detection', input_data, transform, timer, raw)
+                detections['face_detection'] = [d[:4] + ('face', 1.0) for d in face_dets]
+                self.face_tracker.update([d[:4] for d in face_dets])
+            else:
+                self.face_tracker.carry()
+            faces = self.face_tracker.boxes()
+
+        if self.burn_in:
+            with timer.stage('draw'):
+                for det in detections['vehicle_detection']:
+                    draw_detection(vis_frame, det, VEHICLE_COLOR)
+                for det in detections['smoke_detection']:
+                    draw_detection(vis_frame, det, SMOKE_COLOR)
+                draw_plates(vis_frame, plates)
+
+        # 6. Privacy masking is deferred to result.mask(): frames the encoder drops are never masked
+        return self.result(frame_rgb, vis_frame, detections, faces, plates, plate_text, timer.timings,
+                           smoke_analysis=smoke_analysis)
+
+    def result(self, *args, **kwargs):
+        result = FrameResult(*args, **kwargs)
+        result.masker = self.privacy_masker
+        return result
+
+    def detect_smoke_rois(self, frame_rgb, vehicle_detections, input_data, transform, timer):
+        cascade = self.smoke_cascade
+        if cascade.wants_full_frame():
+            return self.detect('smoke_detection', input_data, transform, timer)
+
+        def infer(batch):
+            with timer.stage('infer.smoke_detection'):
+                return self.backend.infer('smoke_detection', batch)
+
+        # Includes the batched smoke inference, which is also reported on its own
+        with timer.stage('smoke_cascade'):
+            rois = cascade.select_rois(frame_rgb, vehicle_detections)
+            return cascade.run(frame_rgb, rois, infer)
+
+    def skip(self, frame_rgb, vis_frame, detections, timer):
+        """Result for a frame the motion gate skipped: no detections, but faces
+        from the last inferred frame stay masked (the scene hasn't changed)"""
+        if vis_frame is None:
+            vis_frame = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+        if self.smoke_analyzer is not None:
+            # Static frames are the cleanest background samples
+            with timer.stage('smoke_analysis'):
+                self.smoke_analyzer.update_background(frame_rgb)
+        faces = self.face_tracker.boxes() if self.face_tracker is not None else []
+        return self.result(frame_rgb, vis_frame, detections, faces, [], None, timer.timings, inferred=False)
+
+def process_batch(items):
+    """Process frames from several pipelines (one per camera) that share a backend.
+
+    `items` is [(pipeline, frame_rgb, vis_frame)]. Each full-frame model runs
+    once on the stacked inputs of every frame that needs it instead of once
+    per camera; motion gates, trackers and cascades stay per pipeline. The
+    batched inference time is split evenly over the frames' timings.
+    Returns FrameResults in item order.
+    """
+    results = [None] * len(items)
+    pending = []
+    for i, (pipeline, frame_rgb, vis_frame) in enumerate(items):
+        timer = StageTimer()
+        if not pipeline.gate(frame_rgb, timer):
+            results[i] = pipeline.skip(frame_rgb, vis_frame, empty_detections(), timer)
+            continue
+        input_data, transform = pipeline.prepare(frame_rgb, timer)
+        pending.append((i, timer, input_data, transform))
+    # A later camera's gate may have swapped a model in: sync every pipeline before the batched calls
+    for p in pending:
+        items[p[0]][0].sync()
+    pending = [p + (items[p[0]][0].batchable_models(),) for p in pending]
+
+    raw = {i: {} for i, *_ in pending}
+    for model_name in sorted({m for *_, names in pending for m in names}):
+        members = [p for p in pending if model_name in p[4]]
+        backend = items[members[0][0]][0].backend
+        start = time.perf_counter()
+        outputs = backend.infer(model_name, np.concatenate([p[2] for p in members]))
+        share = (time.perf_counter() - start) / len(members)
+        for j, (i, timer, *_) in enumerate(members):
+            raw[i][model_name] = {name: out[j:j + 1] for name, out in outputs.items()}
+            stage = f'infer.{model_name}'
+            timer.timings[stage] = timer.timings.get(stage, 0.0) + share
+
+    for i, timer, input_data, transform, _ in pending:
+        pipeline, frame_rgb, vis_frame = items[i]
+        results[i] = pipeline.run(frame_rgb, vis_frame, input_data, transform, timer, raw[i])
+    return results
@@ -0,0 +1,140 @@
+"""
+License plate cascade - batched plate detection and OCR over vehicle ROIs
+
+All vehicle ROIs in a frame go to the plate detector in one batched call, and
+the best plate crop per vehicle goes to the recognizer in a second batched
+call, so the number of accelerator round-trips per frame is fixed (two)
+regardless of how many vehicles are in view.
+"""
+import os
+
+import cv2
+import numpy as np
+
+from nms import batched_nms
+from postprocess import OutputQuant
+from preprocess import letterbox
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+# Recognizer output classes in order; the CTC blank is the last class (LPRNet convention)
+PLATE_CHARSET         = os.getenv('PLATE_CHARSET', '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+PLATE_VEHICLE_CLASSES = {'passenger', 'puv', 'service'}
+PLATE_MAX_ROIS        = int(os.getenv('PLATE_MAX_ROIS', '8'))
+PLATE_MIN_ROI         = 32    # px; smaller vehicle boxes can't carry a readable plate
+
+# ─── OCR DECODE ────────────────────────────────────────────────────────────
+class CTCDecoder:
+    """Greedy CTC decode of a quantized recognizer output into (text, confidence)"""
+
+    def __init__(self, output_v_info, charset=PLATE_CHARSET):
+        self.charset = charset
+        self.num_classes = len(charset) + 1
+        self.blank = len(charset)
+        quant = OutputQuant(output_v_info.quant_info.qp_zp, output_v_info.quant_info.qp_scale, 0.0)
+        self.dequant = quant.dequant
+
+    def __call__(self, raw):
+        """Decode one item's raw uint8 output (any layout holding T x classes)"""
+        raw = np.squeeze(raw)
+        logits = self.dequant[raw] if raw.dtype == np.uint8 else raw.astype(np.float32)
+        if logits.ndim != 2:
+            logits = logits.reshape(-1, self.num_classes)
+        elif logits.shape[1] != self.num_classes and logits.shape[0] == self.num_classes:
+            logits = logits.T
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs = exp / exp.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        best_p = probs[np.arange(len(best)), best]
+
+        chars, confs, prev = [], [], self.blank
+        for idx, p in zip(best, best_p):
+            if idx != prev and idx != self.blank:
+                chars.append(self.charset[idx])
+                confs.append(p)
+            prev = idx
+        return ''.join(chars), float(np.mean(confs)) if confs else 0.0
+
+# ─── CASCADE ───────────────────────────────────────────────────────────────
+class PlateCascade:
+    """Vehicle ROIs -> one batched plate-detector call -> one batched OCR call.
+
+    `detect_infer` / `ocr_infer` take a (N, H, W, 3) uint8 batch and return
+    the raw output dict, so the cascade works with any inference backend.
+    """
+
+    def __init__(self, detect_infer, detect_decoder, ocr_infer=None, ocr_decoder=None,
+                 ocr_input_shape=None, detect_size=640, iou_thresh=0.45,
+                 vehicle_classes=PLATE_VEHICLE_CLASSES, max_rois=PLATE_MAX_ROIS):
+        self.detect_infer = detect_infer
+        self.detect_decoder = detect_decoder
+        self.ocr_infer = ocr_infer
+        self.ocr_decoder = ocr_decoder
+        self.ocr_input_shape = ocr_input_shape   # (H, W, C) of the recognizer input
+        self.detect_size = detect_size
+        self.iou_thresh = iou_thresh
+        self.vehicle_classes = vehicle_classes
+        self.max_rois = max_rois
+
+    def select_rois(self, frame, vehicle_detections):
+        """Clamp vehicle boxes to the frame, keep plate-bearing classes, largest first"""
+        h, w = frame.shape[:2]
+        rois = []
+        for x1, y1, x2, y2, class_name, conf in vehicle_detections:
+            if class_name not in self.vehicle_classes:
+                continue
+            x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+            if x2 - x1 >= PLATE_MIN_ROI and y2 - y1 >= PLATE_MIN_ROI:
+                rois.append((x1, y1, x2, y2))
+        rois.sort(key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)
+        return rois[:self.max_rois]
+
+    def run(self, frame, vehicle_detections):
+        """Return one plate per vehicle ROI where found:
+        [{'bbox': (x1, y1, x2, y2), 'confidence', 'text', 'text_confidence'}]
+        """
+        rois = self.select_rois(frame, vehicle_detections)
+        if not rois:
+            return []
+
+        # Stage 1: plate detection, all ROIs in one call
+        batch, transforms = [], []
+        for x1, y1, x2, y2 in rois:
+            img, ratio, pad_left, pad_top = letterbox(frame[y1:y2, x1:x2], self.detect_size)
+            batch.append(img)
+            transforms.append((x1, y1, ratio, pad_left, pad_top))
+        results = self.detect_decoder.decode_batch(self.detect_infer(np.stack(batch).astype(np.uint8)))
+
+        plates = []
+        for (boxes, scores, classes), (ox, oy, ratio, pad_left, pad_top) in zip(results, transforms):
+            if len(boxes) == 0:
+                continue
+            keep, kept_scores = batched_nms(boxes, scores, classes, self.iou_thresh, max_det=1)
+            b = (boxes[keep[0]] - [pad_left, pad_top, pad_left, pad_top]) / ratio
+            px1, py1, px2, py2 = map(int, b + [ox, oy, ox, oy])
+            plates.append({'bbox': (px1, py1, px2, py2), 'confidence': float(kept_scores[0]),
+                           'text': None, 'text_confidence': 0.0})
+
+        # Stage 2: OCR, all plate crops in one call
+        if plates and self.ocr_infer is not None:
+            h, w = frame.shape[:2]
+            ocr_h, ocr_w = self.ocr_input_shape[:2]
+            crops, readable = [], []
+            for plate in plates:
+                x1, y1, x2, y2 = plate['bbox']
+                crop = frame[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+                if crop.size > 0:
+                    crops.append(cv2.resize(crop, (ocr_w, ocr_h)))
+                    readable.append(plate)
+            if crops:
+                raw_outputs = self.ocr_infer(np.stack(crops).astype(np.uint8))
+                raw = next(iter(raw_outputs.values()))
+                for i, plate in enumerate(readable):
+                    plate['text'], plate['text_confidence'] = self.ocr_decoder(raw[i])
+        return plates
+
+def best_plate_text(plates):
+    """Text of the most confident recognized plate, or None"""
+    read = [p for p in plates if p['text']]
+    if not read:
+        return None
+    return max(read, key=lambda p: p['confidence'] * p['text_confidence'])['text']
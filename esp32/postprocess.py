@@ -0,0 +1,204 @@
+"""
+Post-processing for Hailo YOLOv8-style (DFL) outputs
+
+`OutputDecoder` precomputes per-output quantization parameters and 256-entry
+lookup tables once per network group, thresholds directly on the raw uint8
+class scores, and only dequantizes the candidate cells. Float outputs (e.g.
+from the ONNX CPU backend) are thresholded in the logit domain instead.
+`decode()` is the original float reference kept for comparison and benchmarks.
+
+HEFs compiled with NMS post-processing skip all of that: `NMSDecoder` reads
+the accelerator's per-class box lists, and `make_decoder()` picks the right
+decoder from the output vstream infos.
+"""
+import numpy as np
+
+DEFAULT_STRIDES = (8, 16, 32)
+
+# ─── FLOAT REFERENCE ───────────────────────────────────────────────────────
+def dequantize_outputs(raw_outputs, output_v_infos):
+    """Dequantize raw uint8 outputs into (C, H, W) float features, largest map first"""
+    final_feats = []
+    sorted_names = sorted(raw_outputs.keys(), key=lambda n: raw_outputs[n].shape[1], reverse=True)
+    for name in sorted_names:
+        v_info = [v for v in output_v_infos if v.name == name][0]
+        zp, scale = v_info.quant_info.qp_zp, v_info.quant_info.qp_scale
+        dequantized = (raw_outputs[name].astype(np.float32) - zp) * scale
+        final_feats.append(np.squeeze(dequantized).transpose(2, 0, 1))
+    return final_feats
+
+def decode(outputs, strides=[8, 16, 32], reg_max=16, conf_thresh=0.25):
+    all_boxes, all_scores, all_classes = [], [], []
+    for feat, stride in zip(outputs, strides):
+        C, H, W = feat.shape
+        box_feat, cls_feat = feat[:4*reg_max], feat[4*reg_max:]
+        cls_scores = 1 / (1 + np.exp(-cls_feat))
+        max_scores = cls_scores.max(axis=0)
+        ys, xs = np.where(max_scores > conf_thresh)
+        for y, x in zip(ys, xs):
+            score = max_scores[y, x]
+            cls_id = cls_scores[:, y, x].argmax()
+            reg = box_feat[:, y, x].reshape(4, reg_max)
+            reg_exp = np.exp(reg)
+            reg = (reg_exp / reg_exp.sum(axis=1, keepdims=True) * np.arange(reg_max)).sum(axis=1)
+            cx, cy = (x + 0.5) * stride, (y + 0.5) * stride
+            all_boxes.append([cx-reg[0]*stride, cy-reg[1]*stride, cx+reg[2]*stride, cy+reg[3]*stride])
+            all_scores.append(float(score))
+            all_classes.append(int(cls_id))
+    return np.array(all_boxes), np.array(all_scores), np.array(all_classes)
+
+# ─── QUANTIZED-DOMAIN DECODER ──────────────────────────────────────────────
+class OutputQuant:
+    """Lookup tables and uint8 score threshold for one output vstream"""
+
+    def __init__(self, zp, scale, conf_thresh):
+        q = np.arange(256, dtype=np.float32)
+        self.zp, self.scale = zp, scale
+        self.dequant = (q - zp) * scale
+        self.exp = np.exp(self.dequant)
+        self.sigmoid = 1 / (1 + np.exp(-self.dequant))
+        above = self.sigmoid > conf_thresh
+        # Sigmoid of an affine map is monotonic, so "score > thresh" is "q >= q_min"
+        self.monotonic = scale > 0
+        self.q_min = int(np.argmax(above)) if above.any() else 256
+        self.above = above
+
+    def candidates(self, cls_q):
+        """(ys, xs, best uint8 score) of cells whose best class clears the threshold"""
+        max_q = cls_q.max(axis=-1)
+        if self.monotonic:
+            ys, xs = np.nonzero(max_q >= self.q_min)
+        else:
+            ys, xs = np.nonzero(self.above[cls_q].any(axis=-1))
+            max_q = self.sigmoid[cls_q].max(axis=-1)
+        return ys, xs, max_q[ys, xs]
+
+class OutputDecoder:
+    """Decode raw uint8 outputs of one network group.
+
+    Quant parameters, LUTs and the output order are resolved once; per frame
+    only the cells above the confidence threshold are dequantized.
+    """
+
+    def __init__(self, output_v_infos, conf_thresh=0.25, reg_max=16, strides=DEFAULT_STRIDES):
+        self.conf_thresh = conf_thresh
+        self.logit_thresh = float(np.log(conf_thresh / (1 - conf_thresh)))
+        self.reg_max = reg_max
+        self.strides = tuple(strides)
+        self.quant = {
+            v.name: OutputQuant(v.quant_info.qp_zp, v.quant_info.qp_scale, conf_thresh)
+            for v in output_v_infos
+        }
+        self.bins = np.arange(reg_max)
+        self._order = None
+
+    def __call__(self, raw_outputs):
+        if self._order is None:
+            self._order = sorted(raw_outputs.keys(), key=lambda n: raw_outputs[n].shape[-3], reverse=True)
+        n_box = 4 * self.reg_max
+        all_boxes, all_scores, all_classes = [], [], []
+        for name, stride in zip(self._order, self.strides):
+            raw = raw_outputs[name]
+            feat = raw.reshape(raw.shape[-3:])                  # (H, W, C)
+            if raw.dtype == np.uint8:
+                ys, xs, scores, classes, reg_exp = self._candidates_quantized(self.quant[name], feat, n_box)
+            else:
+                ys, xs, scores, classes, reg_exp = self._candidates_float(feat, n_box)
+            if len(ys) == 0:
+                continue
+            reg_exp = reg_exp.reshape(-1, 4, self.reg_max)
+            dist = (reg_exp / reg_exp.sum(axis=2, keepdims=True) * self.bins).sum(axis=2) * stride
+            cx, cy = (xs + 0.5) * stride, (ys + 0.5) * stride
+            all_boxes.append(np.stack([cx - dist[:, 0], cy - dist[:, 1], cx + dist[:, 2], cy + dist[:, 3]], axis=1))
+            all_scores.append(scores.astype(np.float64))
+            all_classes.append(classes.astype(np.int64))
+        if not all_boxes:
+            return np.array([]), np.array([]), np.array([])
+        return np.concatenate(all_boxes), np.concatenate(all_scores), np.concatenate(all_classes)
+
+    def _candidates_quantized(self, qt, feat, n_box):
+        ys, xs, best_q = qt.candidates(feat[..., n_box:])
+        cand = feat[ys, xs]                                     # (N, C) uint8
+        if qt.monotonic:
+            scores = qt.sigmoid[best_q]
+            classes = cand[:, n_box:].argmax(axis=1)
+        else:
+            cls_scores = qt.sigmoid[cand[:, n_box:]]
+            scores = cls_scores.max(axis=1)
+            classes = cls_scores.argmax(axis=1)
+        return ys, xs, scores, classes, qt.exp[cand[:, :n_box]]
+
+    def _candidates_float(self, feat, n_box):
+        ys, xs = np.nonzero(feat[..., n_box:].max(axis=-1) > self.logit_thresh)
+        cand = feat[ys, xs].astype(np.float32)
+        cls_logits = cand[:, n_box:]
+        scores = 1 / (1 + np.exp(-cls_logits.max(axis=1)))
+        return ys, xs, scores, cls_logits.argmax(axis=1), np.exp(cand[:, :n_box])
+
+    def decode_batch(self, raw_outputs):
+        """Decode batched (N, H, W, C) outputs into a list of per-item results"""
+        batch = len(next(iter(raw_outputs.values())))
+        return [self({name: raw[i] for name, raw in raw_outputs.items()}) for i in range(batch)]
+
+# ─── ON-CHIP NMS OUTPUT ────────────────────────────────────────────────────
+# Per frame, an NMS output holds one box list per class: (n, 5) float32 rows of
+# [y_min, x_min, y_max, x_max, score], normalized to the model input. The dense
+# form (classes, 5, max_boxes), zero-padded, is HailoRT's TF layout; recordings
+# and the post-processing pool store that, since it has a fixed shape.
+
+def nms_class_lists(raw):
+    """Per-class (n, 5) box arrays for one frame, from the list or the dense layout"""
+    if isinstance(raw, np.ndarray):
+        dense = raw.reshape(raw.shape[-3:])
+        return [c.T[c[4] > 0] for c in dense]
+    if len(raw) == 1 and not isinstance(raw[0], np.ndarray):
+        raw = raw[0]                      # batch of one
+    return [np.asarray(c, dtype=np.float32).reshape(-1, 5) for c in raw]
+
+def dense_nms(raw, classes, max_boxes):
+    """(N, classes, 5, max_boxes) float32 for a batch of NMS outputs in either layout"""
+    out = np.zeros((len(raw), classes, 5, max_boxes), np.float32)
+    for i, item in enumerate(raw):
+        for c, boxes in enumerate(nms_class_lists(item)[:classes]):
+            n = min(len(boxes), max_boxes)
+            out[i, c, :, :n] = boxes[:n].T
+    return out
+
+class NMSDecoder:
+    """Boxes from a HEF with on-chip NMS, as (boxes, scores, classes) in model-input pixels.
+
+    The accelerator already suppressed overlapping boxes per class
+    (`suppressed`), so callers skip the CPU NMS; only the confidence
+    threshold is applied here.
+    """
+
+    suppressed = True
+
+    def __init__(self, output_v_info, conf_thresh=0.25, input_size=640):
+        self.name = output_v_info.name
+        self.conf_thresh = conf_thresh
+        self.input_size = input_size
+
+    def __call__(self, raw_outputs):
+        all_boxes, all_scores, all_classes = [], [], []
+        for class_id, boxes in enumerate(nms_class_lists(raw_outputs[self.name])):
+            boxes = boxes[boxes[:, 4] > self.conf_thresh]
+            if len(boxes) == 0:
+                continue
+            all_boxes.append(boxes[:, [1, 0, 3, 2]].astype(np.float64) * self.input_size)
+            all_scores.append(boxes[:, 4].astype(np.float64))
+            all_classes.append(np.full(len(boxes), class_id, dtype=np.int64))
+        if not all_boxes:
+            return np.array([]), np.array([]), np.array([])
+        return np.concatenate(all_boxes), np.concatenate(all_scores), np.concatenate(all_classes)
+
+    def decode_batch(self, raw_outputs):
+        raw = raw_outputs[self.name]
+        return [self({self.name: raw[i:i + 1]}) for i in range(len(raw))]
+
+def make_decoder(output_v_infos, conf_thresh=0.25, input_size=640):
+    """NMSDecoder if the network group has an on-chip NMS output, else OutputDecoder"""
+    nms_infos = [v for v in output_v_infos if getattr(v, 'nms', None)]
+    if nms_infos:
+        return NMSDecoder(nms_infos[0], conf_thresh, input_size)
+    return OutputDecoder(output_v_infos, conf_thresh)
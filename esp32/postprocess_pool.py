@@ -0,0 +1,320 @@
+"""
+Multi-process post-processing - decode, NMS, drawing and face blur off the main process
+
+The main process keeps the accelerator busy (capture, letterbox, inference)
+and copies each frame plus its raw output tensors into a
+`multiprocessing.shared_memory` ring slot; only the slot index and a few
+scalars go over the worker queues. Workers decode, run NMS, and convert and
+draw the visualisation frame in place in the slot, and results are handed
+back in frame order. Stages that need the accelerator or per-camera state
+(plate cascade, smoke analysis, face tracking) run in the main process when
+a result comes back; faces are masked when the result is consumed. When
+the backend swaps a model in, the ring and the workers' decoders are
+rebuilt once every slot has come back.
+
+Workers are forked, so the pool must be started before the camera, the
+accelerator or any background thread is opened.
+"""
+import multiprocessing as mp
+import os
+import queue
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from inference_backends import VStreamInfo
+from pipeline import StageTimer, decode_detections, empty_detections, draw_detection, draw_plates, SMOKE_COLOR, VEHICLE_COLOR
+from overlays import OVERLAY_BURN_IN
+from postprocess import dense_nms, make_decoder
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+POSTPROCESS_WORKERS = int(os.getenv('POSTPROCESS_WORKERS', '0'))     # 0 = post-process in-process
+POSTPROCESS_SLOTS   = int(os.getenv('POSTPROCESS_SLOTS', '0'))       # 0 = 2 per worker + 4 for consumers
+POOL_MODELS         = ('vehicle_detection', 'smoke_detection', 'face_detection')
+
+# ─── SHARED MEMORY RING ────────────────────────────────────────────────────
+def slot_layout(arrays):
+    """{name: (offset, shape, dtype str)} and total size for a dict of arrays"""
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = (offset, tuple(arr.shape), arr.dtype.str)
+        offset += (arr.nbytes + 63) // 64 * 64
+    return layout, offset
+
+def slot_views(shm, layout):
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()}
+
+def attach(name):
+    """Attach to an existing block without letting this process's resource tracker unlink it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:   # Python < 3.13
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+# ─── WORKER ────────────────────────────────────────────────────────────────
+def _worker(tasks, results, models, conf_thresh, iou_thresh, burn_in):
+    cv2.setNumThreads(1)   # one core per worker; parallelism comes from the pool
+    blocks, layout, decoders = [], None, {}
+    while True:
+        msg = tasks.get()
+        if msg is None:
+            break
+        if msg[0] == 'init':
+            _, names, layout, specs, input_size = msg
+            for shm in blocks:
+                shm.close()
+            blocks = [attach(n) for n in names]
+            decoders = {m: make_decoder([VStreamInfo.from_dict(d) for d in infos], conf_thresh, input_size)
+                        for m, infos in specs.items()}
+            continue
+
+        _, seq, slot, transform, ran = msg
+        timer = StageTimer()
+        try:
+            views = slot_views(blocks[slot], layout)
+            detections = {}
+            for model_name in ran:
+                decoder = decoders[model_name]
+                prefix = f'{model_name}::'
+                raw_outputs = {k[len(prefix):]: v for k, v in views.items() if k.startswith(prefix)}
+                detections[model_name] = decode_detections(decoder, raw_outputs, models[model_name]['classes'],
+                                                           transform, iou_thresh, timer)
+            vis_frame = views['vis']
+            with timer.stage('preprocess'):
+                cv2.cvtColor(views['frame'], cv2.COLOR_RGB2BGR, dst=vis_frame)
+            if burn_in:
+                with timer.stage('draw'):
+                    for det in detections.get('vehicle_detection', []):
+                        draw_detection(vis_frame, det, VEHICLE_COLOR)
+                    for det in detections.get('smoke_detection', []):
+                        draw_detection(vis_frame, det, SMOKE_COLOR)
+            results.put((seq, slot, detections, timer.timings, None))
+        except Exception as e:
+            results.put((seq, slot, None, timer.timings, repr(e)))
+    for shm in blocks:
+        shm.close()
+
+# ─── POOL ──────────────────────────────────────────────────────────────────
+class ParallelPipeline:
+    """DetectionPipeline with decode/NMS/draw in worker processes.
+
+    submit() runs the motion gate and inference and hands the frame to a
+    worker; results() returns finished FrameResults in submission order.
+    Each result's vis_frame lives in a shared slot: call `result.release()`
+    once it has been consumed (the stream encoder does this after writing).
+    """
+
+    def __init__(self, models, conf_thresh=0.25, iou_thresh=0.45, workers=POSTPROCESS_WORKERS,
+                 slots=POSTPROCESS_SLOTS, burn_in=OVERLAY_BURN_IN):
+        self.models = models
+        self.conf_thresh = conf_thresh
+        self.iou_thresh = iou_thresh
+        self.burn_in = burn_in
+        self.workers = workers
+        self.num_slots = slots or workers * 2 + 4
+        self.ctx = mp.get_context('fork')
+        self.tasks = [self.ctx.Queue() for _ in range(workers)]
+        self.results_q = self.ctx.Queue()
+        self.procs = []
+        self.pipeline = None
+        self.blocks = []
+        self.layout = None
+        self.nms_outputs = {}    # slot array name -> nms shape, for outputs stored in the dense layout
+        self.free = queue.Queue()
+        self.pending = {}        # seq -> (timer, meta, FrameResult or None)
+        self.next_submit = 0
+        self.next_result = 0
+        self.dropped = 0
+        self.generation = 0
+
+    def start(self):
+        """Fork the workers; call before opening the camera or accelerator"""
+        for tasks in self.tasks:
+            p = self.ctx.Process(target=_worker, daemon=True, name='postprocess-worker',
+                                 args=(tasks, self.results_q, self.models, self.conf_thresh, self.iou_thresh,
+                                       self.burn_in))
+            p.start()
+            self.procs.append(p)
+        print(f"✓ Post-processing pool: {self.workers} worker processes")
+        return self
+
+    def attach_pipeline(self, pipeline):
+        """Use `pipeline`'s backend, motion gate, plate cascade, smoke analyzer and face tracker"""
+        if pipeline.smoke_cascade is not None:
+            print("✗ Smoke cascade needs vehicle detections before smoke inference; using full-frame smoke")
+            pipeline.use_smoke_cascade = False
+            pipeline.smoke_cascade = None
+        self.pipeline = pipeline
+        self.generation = pipeline.generation
+
+    def stop(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for p in self.procs:
+            p.join(5)
+            if p.is_alive():
+                p.terminate()
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+
+    def _reset(self):
+        """Retire the ring after a model swap; False while results still hold slots"""
+        if self.layout is not None:
+            if self.free.qsize() < self.num_slots:
+                return False
+            for shm in self.blocks:
+                shm.close()
+                shm.unlink()
+            self.blocks, self.layout, self.free, self.nms_outputs = [], None, queue.Queue(), {}
+        self.generation = self.pipeline.generation
+        return True
+
+    def _allocate(self, frame_rgb, raw_by_model):
+        arrays = {'frame': frame_rgb, 'vis': frame_rgb}
+        specs = {}
+        # Every pool model gets room, not just the ones this frame ran (the face model skips frames)
+        for model_name in POOL_MODELS:
+            if model_name not in self.pipeline.loaded:
+                continue
+            infos = self.pipeline.backend.output_infos(model_name)
+            raw_outputs = raw_by_model.get(model_name, {})
+            for v in infos:
+                key, raw = f'{model_name}::{v.name}', raw_outputs.get(v.name)
+                if v.nms:
+                    # On-chip NMS box lists vary in length: slots hold the zero-padded dense layout
+                    self.nms_outputs[key] = v.nms
+                    arrays[key] = np.empty((1, v.nms['classes'], 5, v.nms['max_boxes']), np.float32)
+                else:
+                    arrays[key] = raw if raw is not None else np.empty((1,) + tuple(v.shape), np.uint8)
+            specs[model_name] = [VStreamInfo.from_hailo(v).to_dict() for v in infos]
+        self.layout, size = slot_layout(arrays)
+        self.blocks = [shared_memory.SharedMemory(create=True, size=size) for _ in range(self.num_slots)]
+        for i in range(self.num_slots):
+            self.free.put(i)
+        for tasks in self.tasks:
+            tasks.put(('init', [b.name for b in self.blocks], self.layout, specs, self.pipeline.input_size))
+        print(f"✓ Shared memory ring: {self.num_slots} slots x {size / 1e6:.1f} MB")
+
+    def submit(self, frame_rgb, meta=None):
+        """Run inference on a frame and queue its post-processing. Never blocks;
+        returns False if every slot is busy and the frame was dropped."""
+        pipeline = self.pipeline
+        timer = StageTimer()
+        seq = self.next_submit
+
+        if not pipeline.gate(frame_rgb, timer):
+            result = pipeline.skip(frame_rgb, None, empty_detections(), timer)
+            # skip() already recorded this frame's timings on the result
+            self.pending[seq] = (StageTimer(), meta, result)
+            self.next_submit += 1
+            return True
+
+        # Output layouts may have changed with a swapped model: drop frames until the ring is rebuilt
+        if pipeline.generation != self.generation and not self._reset():
+            self.dropped += 1
+            return False
+        if self.layout is not None and self.free.empty():
+            self.dropped += 1
+            return False
+
+        input_data, transform = pipeline.prepare(frame_rgb, timer)
+        raw_by_model = {}
+        for model_name in POOL_MODELS:
+            if model_name == 'face_detection' and pipeline.face_tracker is not None:
+                if not pipeline.face_tracker.should_detect():
+                    continue
+            if model_name in pipeline.loaded:
+                with timer.stage(f'infer.{model_name}'):
+                    raw_by_model[model_name] = pipeline.backend.infer(model_name, input_data)
+
+        if self.layout is None:
+            self._allocate(frame_rgb, raw_by_model)
+        slot = self.free.get_nowait()
+        with timer.stage('shm_copy'):
+            views = slot_views(self.blocks[slot], self.layout)
+            views['frame'][...] = frame_rgb
+            for model_name, raw_outputs in raw_by_model.items():
+                for name, raw in raw_outputs.items():
+                    key = f'{model_name}::{name}'
+                    nms = self.nms_outputs.get(key)
+                    views[key][...] = dense_nms(raw, nms['classes'], nms['max_boxes']) if nms else raw
+        self.tasks[seq % self.workers].put(('task', seq, slot, transform, list(raw_by_model)))
+        self.pending[seq] = (timer, meta, None)
+        self.next_submit += 1
+        return True
+
+    def results(self, block=False, timeout=None):
+        """Finished results in frame order (blocks for the next one if `block`)"""
+        while True:
+            try:
+                wait = block and self.next_result not in self._ready()
+                seq, slot, detections, timings, error = self.results_q.get(wait, timeout)
+            except queue.Empty:
+                break
+            self.pending[seq] = self.pending[seq][:2] + (self._finish(seq, slot, detections, timings, error),)
+            block = False
+
+        out = []
+        while self.next_result in self._ready():
+            timer, meta, result = self.pending.pop(self.next_result)
+            if callable(result):
+                result = result()
+            elif self.pipeline.face_tracker is not None:
+                # Skipped frame: mask the faces known as of the frames before it
+                result.faces = self.pipeline.face_tracker.boxes()
+            result.meta = meta
+            for stage, seconds in timer.timings.items():
+                result.timings[stage] = result.timings.get(stage, 0.0) + seconds
+            out.append(result)
+            self.next_result += 1
+        return out
+
+    def _ready(self):
+        return {seq for seq, entry in self.pending.items() if entry[2] is not None}
+
+    def _finish(self, seq, slot, detections, timings, error):
+        """Main-process stages for a worker result; they need the accelerator or
+        per-camera state, so they run in frame order (deferred until results() emits it)"""
+        def finish():
+            pipeline = self.pipeline
+            timer = StageTimer()
+            timer.timings.update(timings)
+            views = slot_views(self.blocks[slot], self.layout)
+            frame_rgb, vis_frame = views['frame'], views['vis']
+            all_detections = empty_detections()
+            if error:
+                print(f"✗ Post-processing failed for frame {seq}: {error}")
+                # The worker may have failed before converting: 'vis' could still hold an older frame
+                with timer.stage('preprocess'):
+                    cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR, dst=vis_frame)
+                # Keep masking the faces we already know about
+                if pipeline.face_tracker is not None:
+                    pipeline.face_tracker.carry()
+            else:
+                all_detections.update(detections)
+                face_dets = detections.get('face_detection')
+                if pipeline.face_tracker is not None:
+                    if face_dets is None:
+                        pipeline.face_tracker.carry()
+                    else:
+                        all_detections['face_detection'] = [d[:4] + ('face', 1.0) for d in face_dets]
+                        pipeline.face_tracker.update([d[:4] for d in face_dets])
+            faces = pipeline.face_tracker.boxes() if pipeline.face_tracker is not None else []
+
+            smoke_analysis = pipeline.analyze_smoke(frame_rgb, all_detections, timer)
+            plates, plate_text = pipeline.run_plates(frame_rgb, all_detections, timer)
+            if self.burn_in:
+                with timer.stage('draw'):
+                    draw_plates(vis_frame, plates)
+
+            result = pipeline.result(frame_rgb, vis_frame, all_detections, faces, plates, plate_text,
+                                     timer.timings, smoke_analysis=smoke_analysis)
+            result.release = lambda: self.free.put(slot)
+            return result
+        return finish
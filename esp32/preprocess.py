@@ -0,0 +1,16 @@
+"""
+Frame pre-processing shared by the camera scripts
+"""
+import cv2
+
+def letterbox(img, size=640):
+    h, w = img.shape[:2]
+    r = size / max(h, w)
+    new_w, new_h = int(w * r), int(h * r)
+    if (new_w, new_h) != (w, h):
+        # Frames already delivered at model width (ISP lores stream) only need padding
+        img = cv2.resize(img, (new_w, new_h))
+    pad_w, pad_h = size - new_w, size - new_h
+    top, left = pad_h // 2, pad_w // 2
+    img = cv2.copyMakeBorder(img, top, pad_h-top, left, pad_w-left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return img, r, left, top
@@ -1,48 +1,33 @@
-import hailo_platform as hp
-import numpy as np
-import cv2
 import time
-import subprocess
 import os
 import shutil
 import threading
-import requests
 import json
 from datetime import datetime, timezone
-from picamera2 import Picamera2
+from detection_uploader import DetectionUploader, EVENTS_ENDPOINT
+from screenshot_writer import ScreenshotWriter
+from clip_recorder import ClipRecorder, CLIP_RECORDING
+from stream_encoder import StreamEncoder
+from hls_origin import HLSOrigin, HLS_ORIGIN
+from overlays import overlay_feed, overlay_payload
+from frame_sources import DualStreamSource, open_source
+from inference_backends import HailoBackend, HEFMetaCache
+from model_manager import ModelManager, MODEL_DEFER, HEF_META_CACHE
+from pipeline import MODELS, DetectionPipeline, process_batch
+from multi_camera import CameraChannel, FairScheduler, parse_cameras, CAMERA_BATCH
+from postprocess_pool import ParallelPipeline, POSTPROCESS_WORKERS
+from metrics import metrics
+from telemetry import TelemetryReporter, TELEMETRY
+from motion import MotionGate, MOTION_GATE
+from smoke_cascade import SMOKE_CASCADE
+from smoke_analysis import SmokeAnalyzer, SMOKE_ANALYSIS
+from privacy import PrivacyMasker, PRIVACY_MASKING
 from http.server import SimpleHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
 
 # ─── CONFIGURATION ─────────────────────────────────────────────────────────
-# 6 Separate HEF Models
-MODELS = {
-    'vehicle_detection': {
-        'path': r'/home/sevi/smoki_project/models/vehicle_detection.hef',
-        'classes': ['passenger', 'puv', 'service', 'two_wheel', 'exhaust_pipe']
-    },
-    'smoke_detection': {
-        'path': r'/home/sevi/smoki_project/models/smoke_detection.hef',
-        'classes': ['smoke_black', 'smoke_white']
-    },
-    'license_plate_detection': {
-        'path': r'/home/sevi/smoki_project/models/license_plate_detection.hef',
-        'classes': ['license_plate']
-    },
-    'license_plate_recognition': {
-        'path': r'/home/sevi/smoki_project/models/license_plate_recognition.hef',
-        'classes': ['text']
-    },
-    'face_detection': {
-        'path': r'/home/sevi/smoki_project/models/face_detection.hef',
-        'classes': ['face']
-    },
-    'face_blur': {
-        'path': r'/home/sevi/smoki_project/models/face_blur.hef',
-        'classes': ['blurred_face']
-    }
-}
-
 HLS_DIR     = '/dev/shm/hls'
 SCREENSHOTS_DIR = '/home/sevi/smoki_project/detections'
 CONF_THRESH = 0.25
@@ -53,10 +38,26 @@ SMOKE_CLASSES = {'smoke_black', 'smoke_white'}
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:8000')
 CAMERA_ID = os.getenv('CAMERA_ID', 'rpi_camera_01')
 CAMERA_LOCATION = os.getenv('CAMERA_LOCATION', 'unknown')
+UPLOAD_SPOOL_PATH = os.getenv('UPLOAD_SPOOL_PATH', '/home/sevi/smoki_project/upload_spool.db')
+
+# Several cameras from this one process (CAMERAS='id=source;...'); empty = the single CSI camera above
+cameras = parse_cameras(default_location=CAMERA_LOCATION)
+
+# Background uploader: detections are queued, batched and spooled to disk when offline
+uploader = DetectionUploader(BACKEND_URL, UPLOAD_SPOOL_PATH)
 
-# Clean up and prepare directories
+# Background screenshot writer: encodes in RAM staging, flushes to SCREENSHOTS_DIR under a disk quota
+screenshot_writer = ScreenshotWriter(SCREENSHOTS_DIR)
+
+# Evidence clips: the encoded HLS segments are ring-buffered in RAM and cut around each smoke event
+# (one recorder per camera in multi-camera mode)
+clip_recorder = ClipRecorder(HLS_DIR) if CLIP_RECORDING and not cameras else None
+
+# Clean up and prepare directories (one HLS directory per camera in multi-camera mode)
 if os.path.exists(HLS_DIR): shutil.rmtree(HLS_DIR)
 os.makedirs(HLS_DIR, exist_ok=True)
+for camera_id, _, _ in cameras:
+    os.makedirs(os.path.join(HLS_DIR, camera_id), exist_ok=True)
 os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
 
 # ─── HLS SERVER ────────────────────────────────────────────────────────────
@@ -66,7 +67,7 @@ class HLSHandler(SimpleHTTPRequestHandler):
     
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', '*')
         self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
         super().end_headers()
@@ -74,102 +75,82 @@ class HLSHandler(SimpleHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
         self.end_headers()
+    
+    def do_GET(self):
+        # Runtime metrics and model status are served next to the stream
+        if self.path not in METRICS_ROUTES:
+            return super().do_GET()
+        self.send_body(200, *METRICS_ROUTES[self.path]())
+    
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in MODEL_ACTIONS:
+            return self.send_error(404)
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            self.send_body(200, *MODEL_ACTIONS[url.path](parse_qs(url.query)))
+        except ValueError as e:
+            self.send_body(400, str(e), 'text/plain')
+    
+    def send_body(self, status, body, content_type):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     allow_reuse_address = True
 
-# ─── HELPERS ───────────────────────────────────────────────────────────────
-def letterbox(img, size=640):
-    h, w = img.shape[:2]
-    r = size / max(h, w)
-    new_w, new_h = int(w * r), int(h * r)
-    img = cv2.resize(img, (new_w, new_h))
-    pad_w, pad_h = size - new_w, size - new_h
-    top, left = pad_h // 2, pad_w // 2
-    img = cv2.copyMakeBorder(img, top, pad_h-top, left, pad_w-left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
-    return img, r, left, top
+# Asyncio origin (default): in-memory segments, LL-HLS blocking reloads, per-client bandwidth metrics
+METRICS_ROUTES = {
+    '/metrics': lambda: (metrics.prometheus(), 'text/plain; version=0.0.4'),
+    '/metrics.json': lambda: (metrics.summary_json(), 'application/json'),
+    '/models': lambda: (json.dumps(model_manager.status() if model_manager else {}), 'application/json'),
+    '/detections.json': lambda: (overlay_feed.history_json(), 'application/json'),
+}
 
-def decode(outputs, strides=[8, 16, 32], reg_max=16, conf_thresh=0.25):
-    all_boxes, all_scores, all_classes = [], [], []
-    for feat, stride in zip(outputs, strides):
-        C, H, W = feat.shape
-        box_feat, cls_feat = feat[:4*reg_max], feat[4*reg_max:]
-        cls_scores = 1 / (1 + np.exp(-cls_feat))
-        max_scores = cls_scores.max(axis=0)
-        ys, xs = np.where(max_scores > conf_thresh)
-        for y, x in zip(ys, xs):
-            score = max_scores[y, x]
-            cls_id = cls_scores[:, y, x].argmax()
-            reg = box_feat[:, y, x].reshape(4, reg_max)
-            reg_exp = np.exp(reg)
-            reg = (reg_exp / reg_exp.sum(axis=1, keepdims=True) * np.arange(reg_max)).sum(axis=1)
-            cx, cy = (x + 0.5) * stride, (y + 0.5) * stride
-            all_boxes.append([cx-reg[0]*stride, cy-reg[1]*stride, cx+reg[2]*stride, cy+reg[3]*stride])
-            all_scores.append(float(score))
-            all_classes.append(int(cls_id))
-    return np.array(all_boxes), np.array(all_scores), np.array(all_classes)
+# ─── MODELS ────────────────────────────────────────────────────────────────
+# Model manager of the running backend (set once the models are loading)
+model_manager = None
 
-def nms(boxes, scores, thresh):
-    if len(boxes) == 0: return []
-    x1, y1, x2, y2 = boxes.T
-    areas = (x2-x1)*(y2-y1)
-    order = scores.argsort()[::-1]
-    keep = []
-    while order.size > 0:
-        i = order[0]; keep.append(i)
-        xx1, yy1 = np.maximum(x1[i], x1[order[1:]]), np.maximum(y1[i], y1[order[1:]])
-        xx2, yy2 = np.minimum(x2[i], x2[order[1:]]), np.minimum(y2[i], y2[order[1:]])
-        w, h = np.maximum(0, xx2-xx1), np.maximum(0, yy2-yy1)
-        ovr = (w*h)/(areas[i]+areas[order[1:]]-(w*h)+1e-6)
-        order = order[1:][ovr < thresh]
-    return keep
+def open_models():
+    """HailoBackend without the MODEL_DEFER models; the model manager loads those and hot-reloads changed HEFs"""
+    global model_manager
+    backend = HailoBackend(MODELS, HEFMetaCache(HEF_META_CACHE), MODEL_DEFER)
+    model_manager = ModelManager(backend, MODELS, MODEL_DEFER).start()
+    metrics.gauge('model_generation', lambda: backend.generation)
+    return backend
 
-def blur_faces(frame, faces):
-    """Blur detected faces for privacy"""
-    for x1, y1, x2, y2 in faces:
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
-        face_roi = frame[y1:y2, x1:x2]
-        blurred = cv2.GaussianBlur(face_roi, (51, 51), 0)
-        frame[y1:y2, x1:x2] = blurred
-    return frame
+def reload_models(query):
+    """POST /models/reload[?model=NAME]: reconfigure one model (or all) and swap it in between frames"""
+    if model_manager is None:
+        raise ValueError("Models are not loaded yet")
+    names = model_manager.reload(query.get('model', [None])[0])
+    return json.dumps({'queued': names}), 'application/json'
 
-def save_detection_screenshots(frame, detections, timestamp_str):
-    """Save full frame and cropped detections"""
-    detection_id = timestamp_str.replace(':', '-').replace('.', '-')
-    detection_dir = os.path.join(SCREENSHOTS_DIR, detection_id)
-    os.makedirs(detection_dir, exist_ok=True)
-    
-    full_frame_path = os.path.join(detection_dir, 'full_frame.jpg')
-    cv2.imwrite(full_frame_path, frame)
-    
-    screenshots_info = {
-        'full_frame': full_frame_path,
-        'crops': []
-    }
-    
-    for idx, det in enumerate(detections):
-        x1, y1, x2, y2, class_name, confidence = det
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
-        
-        crop = frame[y1:y2, x1:x2]
-        crop_path = os.path.join(detection_dir, f'{idx:02d}_{class_name}_{confidence:.2f}.jpg')
-        cv2.imwrite(crop_path, crop)
-        
-        screenshots_info['crops'].append({
-            'path': crop_path,
-            'class': class_name,
-            'confidence': confidence,
-            'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
-        })
-    
-    return detection_dir, screenshots_info
+MODEL_ACTIONS = {'/models/reload': reload_models}
 
-def send_smoke_detection(timestamp, confidence, smoke_type, bounding_box, inference_time_ms, 
-                        screenshots_info=None, plate_text=None, all_detections=None):
-    """Send smoke detection metadata to backend with all model detections"""
+# ─── HELPERS ───────────────────────────────────────────────────────────────
+def send_smoke_event(timestamp, smoke_boxes, inference_time_ms, screenshots_info=None, plate_text=None,
+                     all_detections=None, camera_id=CAMERA_ID, location=CAMERA_LOCATION):
+    """Queue one frame event (every smoke box plus the shared detections/screenshots) for upload.
+    
+    `smoke_boxes` is a list of ((x1, y1, x2, y2, class_name, conf), smoke_analysis) pairs.
+    """
     try:
+        boxes = []
+        for (x1, y1, x2, y2, class_name, conf), analysis in smoke_boxes:
+            box = {
+                "confidence": float(conf),
+                "smoke_type": class_name,
+                "bounding_box": {"x1": int(x1), "y1": int(y1), "x2": int(x2), "y2": int(y2)}
+            }
+            if analysis:
+                box["metadata"] = {"smoke_analysis": analysis}
+            boxes.append(box)
+        
         # Build detections list from all models
         detections_list = []
         if all_detections:
@@ -185,11 +166,9 @@ def send_smoke_detection(timestamp, confidence, smoke_type, bounding_box, infere
         
         payload = {
             "timestamp": timestamp,
-            "confidence": float(confidence),
-            "smoke_type": smoke_type,
-            "bounding_box": bounding_box,
-            "camera_id": CAMERA_ID,
-            "location": CAMERA_LOCATION,
+            "boxes": boxes,
+            "camera_id": camera_id,
+            "location": location,
             "metadata": {
                 "inference_time_ms": inference_time_ms,
                 "models": list(MODELS.keys()),
@@ -204,236 +183,225 @@ def send_smoke_detection(timestamp, confidence, smoke_type, bounding_box, infere
         if plate_text:
             payload["license_plate"] = plate_text
         
-        response = requests.post(
-            f"{BACKEND_URL}/api/detections/smoke",
-            json=payload,
-            timeout=5
-        )
-        if response.status_code == 200:
-            print(f"✓ Smoke detection recorded: {smoke_type} ({confidence:.2f}) with {len(detections_list)} detections")
-        else:
-            print(f"✗ Failed to record detection: {response.status_code}")
+        uploader.submit(payload, EVENTS_ENDPOINT)
     except Exception as e:
-        print(f"✗ Error sending detection: {e}")
-
-def start_ffmpeg(w, h, fps=15):
-    cmd = ['ffmpeg', '-y',
-        '-f', 'rawvideo', '-vcodec', 'rawvideo',
-        '-pix_fmt', 'bgr24', '-s', f'{w}x{h}', '-r', str(fps),
-        '-i', '-', '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
-        '-b:v', '800k',
-        '-g', str(fps * 2),
-        '-hls_time', '2',
-        '-hls_list_size', '4',
-        '-hls_segment_type', 'fmp4',
-        '-hls_flags', 'delete_segments+append_list+independent_segments',
-        '-f', 'hls', os.path.join(HLS_DIR, 'stream.m3u8')]
-    return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        print(f"✗ Error queueing detection: {e}")
 
 # ─── MAIN PIPELINE ─────────────────────────────────────────────────────────
-def run_inference():
-    picam2 = Picamera2()
-    config = picam2.create_video_configuration(main={"format": "BGR888", "size": (640, 480)})
-    picam2.configure(config)
-    picam2.start()
-    ffmpeg_proc = start_ffmpeg(640, 480, fps=15)
+def capture_meta(start_time, camera_id=None):
+    """(capture time, ISO timestamp, screenshot id) carried with a frame through the pipeline"""
+    now = datetime.fromtimestamp(start_time, timezone.utc)
+    timestamp_str = now.strftime("%Y%m%d_%H%M%S_%f")[:-3]
+    return start_time, now.isoformat(), f"{camera_id}_{timestamp_str}" if camera_id else timestamp_str
+
+def handle_result(result, encoder, clips=clip_recorder, camera_id=CAMERA_ID, location=CAMERA_LOCATION):
+    """Screenshots, uploads and streaming for one processed frame"""
+    start_time, timestamp, timestamp_str = result.meta
+    metrics.observe_frame(result.timings)
     
-    # Load all 6 models
-    vstreams_dict = {}
-    network_groups = {}
+    # Save screenshots when smoke detected
+    if result.smoke_detected:
+        detection_dir, screenshots_info = screenshot_writer.save(result.mask(), result.all_detections, timestamp_str)
+        if clips:
+            screenshots_info['clip'] = clips.request(os.path.basename(detection_dir))
+        
+        # One event per frame: the boxes share the detections, screenshots and plate
+        send_smoke_event(timestamp, list(zip(result.smoke_detections, result.smoke_analysis)),
+                         int((time.time() - start_time) * 1000), screenshots_info, result.plate_text,
+                         result.detections, camera_id, location)
+        print(f"📸 Screenshots queued for: {detection_dir}")
     
-    with hp.VDevice() as target:
-        print("Loading 6 models...")
-        for model_name, model_config in MODELS.items():
-            try:
-                hef = hp.HEF(model_config['path'])
-                network_group = target.configure(hef, hp.ConfigureParams.create_from_hef(hef, hp.HailoStreamInterface.PCIe))[0]
-                in_params = hp.InputVStreamParams.make_from_network_group(network_group, hp.FormatType.UINT8)
-                out_params = hp.OutputVStreamParams.make_from_network_group(network_group, hp.FormatType.UINT8)
-                
-                network_groups[model_name] = network_group
-                vstreams_dict[model_name] = (network_group, in_params, out_params)
-                print(f"✓ Loaded {model_name}")
-            except Exception as e:
-                print(f"✗ Failed to load {model_name}: {e}")
+    # Push to Stream: the encoder thread masks faces, writes the frame buffer, then hands it back;
+    # the frame's boxes go to overlay viewers once it is written
+    encoder.submit(result.vis_frame, result.release, result.mask,
+                   meta=overlay_payload(result, camera_id, start_time))
+
+def make_pipeline(backend):
+    """Pipeline with this camera's own motion gate, background model and face tracker"""
+    # Skip the models on static frames (keep-alive runs still sample slow smoke)
+    return DetectionPipeline(backend, MODELS, CONF_THRESH, IOU_THRESH,
+                             motion_gate=MotionGate() if MOTION_GATE else None,
+                             smoke_cascade=SMOKE_CASCADE,
+                             smoke_analyzer=SmokeAnalyzer() if SMOKE_ANALYSIS else None,
+                             privacy_masker=PrivacyMasker() if PRIVACY_MASKING else None)
+
+def run_inference(pool=None):
+    # ISP delivers the RGB inference frame (lores) and the BGR encoder frame (main) directly
+    camera = DualStreamSource((640, 480))
+    encoder = StreamEncoder(HLS_DIR, 640, 480, fps=15, on_frame=overlay_feed.publish_frame).start()
+    
+    # Queue depths and drop counts are read at scrape time
+    metrics.gauge('upload_queue_depth', uploader.queue.qsize)
+    metrics.gauge('upload_spool_depth', lambda: uploader.spooled)
+    metrics.gauge('screenshot_queue_depth', screenshot_writer.jobs.qsize)
+    metrics.gauge('stream_queue_depth', encoder.frames.qsize)
+    if pool:
+        metrics.gauge('postprocess_in_flight', lambda: len(pool.pending))
+    
+    print("Loading 6 models...")
+    with open_models() as backend:
+        pipeline = make_pipeline(backend)
+        motion_gate = pipeline.motion_gate
+        if pool:
+            pool.attach_pipeline(pipeline)
+        if motion_gate:
+            metrics.gauge('motion_skip_ratio', lambda: motion_gate.skip_ratio)
+            metrics.gauge('motion_changed_area', lambda: motion_gate.changed)
         
         print(f"\n--- 6-Model Multi-Task Inference Active ---")
         print(f"Models: {', '.join(MODELS.keys())}")
         print(f"URL: http://localhost:8000/stream.m3u8")
+        print(f"Metrics: http://localhost:8000/metrics (JSON: /metrics.json)")
+        print(f"Model status: http://localhost:8000/models (reload: POST /models/reload?model=NAME)")
         print(f"Screenshots: {SCREENSHOTS_DIR}\n")
         
-        # Activate all networks
-        for model_name, network_group in network_groups.items():
-            network_group.activate()
-        
         try:
             while True:
                 start_time = time.time()
-                frame_rgb = picam2.capture_array()
-                vis_frame = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-                
-                timestamp = datetime.now(timezone.utc).isoformat()
-                timestamp_str = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S_%f")[:-3]
-                
-                all_detections = []
-                vehicle_detections = []
-                smoke_detections = []
-                faces = []
-                plate_text = None
-                smoke_detected = False
-                
-                # 1. Vehicle Detection
-                if 'vehicle_detection' in vstreams_dict:
-                    network_group, in_params, out_params = vstreams_dict['vehicle_detection']
-                    input_frame, ratio, pad_left, pad_top = letterbox(frame_rgb, 640)
-                    input_data = np.expand_dims(input_frame, axis=0).astype(np.uint8)
-                    
-                    with hp.InferVStreams(network_group, in_params, out_params) as vstreams:
-                        raw_outputs = vstreams.infer(input_data)
-                        final_feats = []
-                        output_v_infos = network_group.get_output_vstream_infos()
-                        sorted_names = sorted(raw_outputs.keys(), key=lambda n: raw_outputs[n].shape[1], reverse=True)
-                        
-                        for name in sorted_names:
-                            v_info = [v for v in output_v_infos if v.name == name][0]
-                            zp, scale = v_info.quant_info.qp_zp, v_info.quant_info.qp_scale
-                            dequantized = (raw_outputs[name].astype(np.float32) - zp) * scale
-                            final_feats.append(np.squeeze(dequantized).transpose(2, 0, 1))
-                        
-                        boxes, scores, classes = decode(final_feats, conf_thresh=CONF_THRESH)
-                        
-                        if len(boxes) > 0:
-                            keep = nms(boxes, scores, IOU_THRESH)
-                            for b, s, c in zip(boxes[keep], scores[keep], classes[keep]):
-                                x1, y1, x2, y2 = map(int, (b - [pad_left, pad_top, pad_left, pad_top]) / ratio)
-                                class_name = MODELS['vehicle_detection']['classes'][c]
-                                color = (0, 255, 0)
-                                cv2.rectangle(vis_frame, (x1, y1), (x2, y2), color, 2)
-                                label = f"{class_name} {s:.2f}"
-                                cv2.putText(vis_frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                                
-                                vehicle_detections.append((x1, y1, x2, y2, class_name, float(s)))
-                                all_detections.append((x1, y1, x2, y2, class_name, float(s)))
-                
-                # 2. Smoke Detection (separate model)
-                if 'smoke_detection' in vstreams_dict:
-                    network_group, in_params, out_params = vstreams_dict['smoke_detection']
-                    input_frame, ratio, pad_left, pad_top = letterbox(frame_rgb, 640)
-                    input_data = np.expand_dims(input_frame, axis=0).astype(np.uint8)
-                    
-                    with hp.InferVStreams(network_group, in_params, out_params) as vstreams:
-                        raw_outputs = vstreams.infer(input_data)
-                        final_feats = []
-                        output_v_infos = network_group.get_output_vstream_infos()
-                        sorted_names = sorted(raw_outputs.keys(), key=lambda n: raw_outputs[n].shape[1], reverse=True)
-                        
-                        for name in sorted_names:
-                            v_info = [v for v in output_v_infos if v.name == name][0]
-                            zp, scale = v_info.quant_info.qp_zp, v_info.quant_info.qp_scale
-                            dequantized = (raw_outputs[name].astype(np.float32) - zp) * scale
-                            final_feats.append(np.squeeze(dequantized).transpose(2, 0, 1))
-                        
-                        boxes, scores, classes = decode(final_feats, conf_thresh=CONF_THRESH)
-                        
-                        if len(boxes) > 0:
-                            keep = nms(boxes, scores, IOU_THRESH)
-                            for b, s, c in zip(boxes[keep], scores[keep], classes[keep]):
-                                x1, y1, x2, y2 = map(int, (b - [pad_left, pad_top, pad_left, pad_top]) / ratio)
-                                class_name = MODELS['smoke_detection']['classes'][c]
-                                color = (0, 0, 255)  # Red for smoke
-                                cv2.rectangle(vis_frame, (x1, y1), (x2, y2), color, 2)
-                                label = f"{class_name} {s:.2f}"
-                                cv2.putText(vis_frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-                                
-                                smoke_detections.append((x1, y1, x2, y2, class_name, float(s)))
-                                all_detections.append((x1, y1, x2, y2, class_name, float(s)))
-                                smoke_detected = True
-                
-                # 3. License Plate Detection (on vehicle ROI)
-                if 'license_plate_detection' in vstreams_dict and len(vehicle_detections) > 0:
-                    for det in vehicle_detections:
-                        x1, y1, x2, y2, class_name, conf = det
-                        if 'passenger' in class_name or 'puv' in class_name or 'service' in class_name:
-                            roi = frame_rgb[y1:y2, x1:x2]
-                            if roi.size > 0:
-                                network_group, in_params, out_params = vstreams_dict['license_plate_detection']
-                                input_frame, ratio, pad_left, pad_top = letterbox(roi, 640)
-                                input_data = np.expand_dims(input_frame, axis=0).astype(np.uint8)
-                                
-                                with hp.InferVStreams(network_group, in_params, out_params) as vstreams:
-                                    raw_outputs = vstreams.infer(input_data)
-                                    # Process license plate detections
-                
-                # 4. License Plate Recognition (OCR on detected plates)
-                if 'license_plate_recognition' in vstreams_dict:
-                    # Run OCR on detected license plates
-                    pass
+                capture_start = time.perf_counter()
+                frame = camera.capture()
+                metrics.observe('capture', time.perf_counter() - capture_start)
+                meta = capture_meta(start_time)
                 
-                # 5. Face Detection
-                if 'face_detection' in vstreams_dict:
-                    network_group, in_params, out_params = vstreams_dict['face_detection']
-                    input_frame, ratio, pad_left, pad_top = letterbox(frame_rgb, 640)
-                    input_data = np.expand_dims(input_frame, axis=0).astype(np.uint8)
-                    
-                    with hp.InferVStreams(network_group, in_params, out_params) as vstreams:
-                        raw_outputs = vstreams.infer(input_data)
-                        final_feats = []
-                        output_v_infos = network_group.get_output_vstream_infos()
-                        sorted_names = sorted(raw_outputs.keys(), key=lambda n: raw_outputs[n].shape[1], reverse=True)
-                        
-                        for name in sorted_names:
-                            v_info = [v for v in output_v_infos if v.name == name][0]
-                            zp, scale = v_info.quant_info.qp_zp, v_info.quant_info.qp_scale
-                            dequantized = (raw_outputs[name].astype(np.float32) - zp) * scale
-                            final_feats.append(np.squeeze(dequantized).transpose(2, 0, 1))
-                        
-                        boxes, scores, classes = decode(final_feats, conf_thresh=CONF_THRESH)
-                        
-                        if len(boxes) > 0:
-                            keep = nms(boxes, scores, IOU_THRESH)
-                            for b, s, c in zip(boxes[keep], scores[keep], classes[keep]):
-                                x1, y1, x2, y2 = map(int, (b - [pad_left, pad_top, pad_left, pad_top]) / ratio)
-                                faces.append((x1, y1, x2, y2))
+                if pool:
+                    # The frame is copied into a shared slot, so the camera buffer goes back right away;
+                    # results come back in frame order, a few frames behind
+                    pool.submit(frame.rgb, meta)
+                    frame.release()
+                    results = pool.results()
+                else:
+                    # Boxes are drawn straight into the camera's main buffer
+                    result = pipeline.process(frame.rgb, frame.display)
+                    result.meta, result.release = meta, frame.release
+                    results = [result]
                 
-                # 6. Face Blur (privacy protection)
-                if 'face_blur' in vstreams_dict and len(faces) > 0:
-                    vis_frame = blur_faces(vis_frame, faces)
+                for result in results:
+                    handle_result(result, encoder)
+                    metrics.observe('frame', time.time() - result.meta[0])
                 
-                # Save screenshots when smoke detected
-                if smoke_detected and len(all_detections) > 0:
-                    detection_dir, screenshots_info = save_detection_screenshots(vis_frame, all_detections, timestamp_str)
-                    
-                    # Organize detections by model
-                    detections_by_model = {
-                        'vehicle_detection': vehicle_detections,
-                        'smoke_detection': smoke_detections,
-                        'face_detection': [(x1, y1, x2, y2, 'face', 1.0) for x1, y1, x2, y2 in faces]
-                    }
-                    
-                    for det in smoke_detections:
-                        x1, y1, x2, y2, class_name, conf = det
-                        bounding_box = {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
-                        send_smoke_detection(timestamp, conf, class_name, bounding_box, 
-                                           int((time.time() - start_time) * 1000), 
-                                           screenshots_info, plate_text, detections_by_model)
-                    print(f"📸 Screenshots saved to: {detection_dir}")
+                elapsed = time.time() - start_time
+                metrics.set_counter('camera_frames_dropped', camera.dropped)
+                metrics.set_counter('uploads_dropped', uploader.dropped)
+                metrics.set_counter('screenshots_dropped', screenshot_writer.dropped)
+                metrics.set_counter('stream_frames_dropped', encoder.dropped)
+                metrics.set_counter('encoder_restarts', encoder.restarts)
+                if pool:
+                    metrics.set_counter('postprocess_frames_dropped', pool.dropped)
+                if motion_gate:
+                    metrics.set_counter('frames_skipped', motion_gate.skipped)
+                    metrics.set_counter('motion_keepalive_runs', motion_gate.keepalive_runs)
+                if results:
+                    result = results[-1]
+                    print(f"FPS: {1.0/elapsed:.2f} | Vehicles: {len(result.detections['vehicle_detection'])} | Smoke: {'YES' if result.smoke_detected else 'NO'} | Faces: {len(result.faces)}{f' | Skipped: {motion_gate.skip_ratio:.0%}' if motion_gate else ''}", end='\r')
+        
+        finally:
+            model_manager.stop()
+            encoder.stop()
+            camera.close()
+
+def run_multi_camera():
+    """Every camera in CAMERAS through one HailoBackend, with per-camera HLS output and CAMERA_ID"""
+    channels = []
+    for camera_id, source_spec, location in cameras:
+        channel = CameraChannel(camera_id, open_source(source_spec, (640, 480)), location)
+        channel.hls_dir = os.path.join(HLS_DIR, camera_id)
+        channel.encoder = StreamEncoder(channel.hls_dir, 640, 480, fps=15,
+                                       on_frame=overlay_feed.publish_frame).start()
+        channel.clip_recorder = ClipRecorder(channel.hls_dir).start() if CLIP_RECORDING else None
+        channels.append(channel)
+        print(f"✓ Camera {camera_id}: {source_spec} ({location})")
+    
+    metrics.gauge('upload_queue_depth', uploader.queue.qsize)
+    metrics.gauge('upload_spool_depth', lambda: uploader.spooled)
+    metrics.gauge('screenshot_queue_depth', screenshot_writer.jobs.qsize)
+    metrics.labeled_gauge('camera_frames_processed', 'camera', lambda: {c.camera_id: c.processed for c in channels})
+    metrics.labeled_gauge('camera_frames_superseded', 'camera', lambda: {c.camera_id: c.superseded for c in channels})
+    metrics.labeled_gauge('camera_frames_dropped', 'camera', lambda: {c.camera_id: c.source.dropped for c in channels})
+    metrics.labeled_gauge('stream_frames_dropped', 'camera', lambda: {c.camera_id: c.encoder.dropped for c in channels})
+    
+    print(f"Loading 6 models for {len(channels)} cameras...")
+    with open_models() as backend:
+        # One network group set on the VDevice, per-camera pipeline state on top of it
+        for channel in channels:
+            channel.pipeline = make_pipeline(backend)
+        scheduler = FairScheduler(channels).start()
+        
+        print(f"\n--- 6-Model Multi-Camera Inference Active ({'batched' if CAMERA_BATCH else 'interleaved'}) ---")
+        for channel in channels:
+            print(f"{channel.camera_id}: http://localhost:8000/{channel.camera_id}/stream.m3u8")
+        print(f"Metrics: http://localhost:8000/metrics (JSON: /metrics.json)\n")
+        
+        try:
+            while not scheduler.ended:
+                round_start = time.time()
+                frames = scheduler.next_round()
+                if not frames:
+                    continue
+                if CAMERA_BATCH:
+                    results = process_batch([(channel.pipeline, frame.rgb, frame.display)
+                                             for channel, (frame, _) in frames])
+                else:
+                    results = [channel.pipeline.process(frame.rgb, frame.display) for channel, (frame, _) in frames]
                 
-                # Push to Stream
-                try:
-                    ffmpeg_proc.stdin.write(vis_frame.tobytes())
-                except BrokenPipeError:
-                    break
+                for (channel, (frame, captured)), result in zip(frames, results):
+                    result.meta, result.release = capture_meta(captured, channel.camera_id), frame.release
+                    handle_result(result, channel.encoder, channel.clip_recorder, channel.camera_id, channel.location)
+                    metrics.observe('frame', time.time() - captured)
                 
-                elapsed = time.time() - start_time
-                print(f"FPS: {1.0/elapsed:.2f} | Vehicles: {len(vehicle_detections)} | Smoke: {'YES' if smoke_detected else 'NO'} | Faces: {len(faces)}", end='\r')
+                elapsed = time.time() - round_start
+                metrics.set_counter('uploads_dropped', uploader.dropped)
+                metrics.set_counter('screenshots_dropped', screenshot_writer.dropped)
+                status = ' | '.join(f"{c.camera_id}: {len(r.detections['vehicle_detection'])}v"
+                                    f"{' SMOKE' if r.smoke_detected else ''}" for (c, _), r in zip(frames, results))
+                print(f"Round: {1.0/elapsed:.2f}/s | {status}", end='\r')
         
         finally:
-            for network_group in network_groups.values():
-                network_group.deactivate()
+            model_manager.stop()
+            scheduler.stop()
+            for channel in channels:
+                channel.encoder.stop()
+                if channel.clip_recorder:
+                    channel.clip_recorder.stop()
 
 if __name__ == '__main__':
-    threading.Thread(target=lambda: ThreadedHTTPServer(('', 8000), HLSHandler).serve_forever(), daemon=True).start()
+    # Post-processing workers are forked before any thread, the camera or the Hailo device exists
+    pool = None
+    if POSTPROCESS_WORKERS > 0:
+        if cameras:
+            print("✗ POSTPROCESS_WORKERS is not supported with CAMERAS; post-processing in-process")
+        else:
+            pool = ParallelPipeline(MODELS, CONF_THRESH, IOU_THRESH).start()
+    if HLS_ORIGIN:
+        # Multi-camera: /<camera_id>/stream.m3u8 per camera, the first camera also at /stream.m3u8
+        streams = {camera_id: os.path.join(HLS_DIR, camera_id) for camera_id, _, _ in cameras}
+        streams[''] = os.path.join(HLS_DIR, cameras[0][0]) if cameras else HLS_DIR
+        # Detection overlays are pushed at ws://<pi>:8000/detections[?camera=ID]
+        origin = HLSOrigin(routes=METRICS_ROUTES, streams=streams, actions=MODEL_ACTIONS,
+                           feeds={'/detections': overlay_feed}).start()
+    else:
+        origin = None
+        threading.Thread(target=lambda: ThreadedHTTPServer(('', 8000), HLSHandler).serve_forever(), daemon=True).start()
+    uploader.start()
+    # Health samples per camera go to the backend through the uploader
+    telemetry = TelemetryReporter(uploader, [c for c, _, _ in cameras] or [CAMERA_ID]).start() if TELEMETRY else None
+    screenshot_writer.start()
+    if clip_recorder:
+        clip_recorder.start()
     try:
-        run_inference()
+        if cameras:
+            run_multi_camera()
+        else:
+            run_inference(pool)
     except KeyboardInterrupt:
         print("\nStopping...")
+    finally:
+        if clip_recorder:
+            clip_recorder.stop()
+        screenshot_writer.stop()
+        if telemetry:
+            telemetry.stop()
+        uploader.stop()
+        if pool:
+            pool.stop()
+        if origin:
+            origin.stop()
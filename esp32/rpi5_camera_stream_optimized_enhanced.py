@@ -6,10 +6,14 @@ import subprocess
 import os
 import shutil
 import threading
-import requests
 import json
 from datetime import datetime, timezone
 from picamera2 import Picamera2
+from detection_uploader import DetectionUploader, EVENTS_ENDPOINT
+from screenshot_writer import ScreenshotWriter
+from preprocess import letterbox
+from postprocess import OutputDecoder
+from nms import batched_nms
 from http.server import SimpleHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 from pathlib import Path
@@ -27,6 +31,13 @@ SMOKE_CLASSES = {'smoke_black', 'smoke_white'}
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:8000')
 CAMERA_ID = os.getenv('CAMERA_ID', 'rpi_camera_01')
 CAMERA_LOCATION = os.getenv('CAMERA_LOCATION', 'unknown')
+UPLOAD_SPOOL_PATH = os.getenv('UPLOAD_SPOOL_PATH', '/home/sevi/smoki_project/upload_spool.db')
+
+# Background uploader: detections are queued, batched and spooled to disk when offline
+uploader = DetectionUploader(BACKEND_URL, UPLOAD_SPOOL_PATH)
+
+# Background screenshot writer: encodes in RAM staging, flushes to SCREENSHOTS_DIR under a disk quota
+screenshot_writer = ScreenshotWriter(SCREENSHOTS_DIR)
 
 # Clean up and prepare directories
 if os.path.exists(HLS_DIR): shutil.rmtree(HLS_DIR)
@@ -53,95 +64,17 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     allow_reuse_address = True
 
 # ─── HELPERS ───────────────────────────────────────────────────────────────
-def letterbox(img, size=640):
-    h, w = img.shape[:2]
-    r = size / max(h, w)
-    new_w, new_h = int(w * r), int(h * r)
-    img = cv2.resize(img, (new_w, new_h))
-    pad_w, pad_h = size - new_w, size - new_h
-    top, left = pad_h // 2, pad_w // 2
-    img = cv2.copyMakeBorder(img, top, pad_h-top, left, pad_w-left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
-    return img, r, left, top
-
-def decode(outputs, strides=[8, 16, 32], reg_max=16, conf_thresh=0.25):
-    all_boxes, all_scores, all_classes = [], [], []
-    for feat, stride in zip(outputs, strides):
-        C, H, W = feat.shape
-        box_feat, cls_feat = feat[:4*reg_max], feat[4*reg_max:]
-        cls_scores = 1 / (1 + np.exp(-cls_feat))
-        max_scores = cls_scores.max(axis=0)
-        ys, xs = np.where(max_scores > conf_thresh)
-        for y, x in zip(ys, xs):
-            score = max_scores[y, x]
-            cls_id = cls_scores[:, y, x].argmax()
-            reg = box_feat[:, y, x].reshape(4, reg_max)
-            reg_exp = np.exp(reg)
-            reg = (reg_exp / reg_exp.sum(axis=1, keepdims=True) * np.arange(reg_max)).sum(axis=1)
-            cx, cy = (x + 0.5) * stride, (y + 0.5) * stride
-            all_boxes.append([cx-reg[0]*stride, cy-reg[1]*stride, cx+reg[2]*stride, cy+reg[3]*stride])
-            all_scores.append(float(score))
-            all_classes.append(int(cls_id))
-    return np.array(all_boxes), np.array(all_scores), np.array(all_classes)
-
-def nms(boxes, scores, thresh):
-    if len(boxes) == 0: return []
-    x1, y1, x2, y2 = boxes.T
-    areas = (x2-x1)*(y2-y1)
-    order = scores.argsort()[::-1]
-    keep = []
-    while order.size > 0:
-        i = order[0]; keep.append(i)
-        xx1, yy1 = np.maximum(x1[i], x1[order[1:]]), np.maximum(y1[i], y1[order[1:]])
-        xx2, yy2 = np.minimum(x2[i], x2[order[1:]]), np.minimum(y2[i], y2[order[1:]])
-        w, h = np.maximum(0, xx2-xx1), np.maximum(0, yy2-yy1)
-        ovr = (w*h)/(areas[i]+areas[order[1:]]-(w*h)+1e-6)
-        order = order[1:][ovr < thresh]
-    return keep
-
-def save_detection_screenshots(frame, detections, timestamp_str):
-    """Save full frame and cropped detections (vehicle + license plate)"""
-    detection_id = timestamp_str.replace(':', '-').replace('.', '-')
-    detection_dir = os.path.join(SCREENSHOTS_DIR, detection_id)
-    os.makedirs(detection_dir, exist_ok=True)
-    
-    # Save full frame
-    full_frame_path = os.path.join(detection_dir, 'full_frame.jpg')
-    cv2.imwrite(full_frame_path, frame)
-    
-    screenshots_info = {
-        'full_frame': full_frame_path,
-        'crops': []
-    }
-    
-    for idx, det in enumerate(detections):
-        x1, y1, x2, y2, class_name, confidence = det
-        
-        # Ensure coordinates are within bounds
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
-        
-        # Save vehicle/smoke detection crop
-        crop = frame[y1:y2, x1:x2]
-        crop_path = os.path.join(detection_dir, f'{idx:02d}_{class_name}_{confidence:.2f}.jpg')
-        cv2.imwrite(crop_path, crop)
-        
-        screenshots_info['crops'].append({
-            'path': crop_path,
-            'class': class_name,
-            'confidence': confidence,
-            'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
-        })
-    
-    return detection_dir, screenshots_info
-
-def send_smoke_detection(timestamp, confidence, smoke_type, bounding_box, inference_time_ms, screenshots_info=None):
-    """Send smoke detection metadata to backend with screenshot paths"""
+def send_smoke_event(timestamp, smoke_boxes, inference_time_ms, screenshots_info=None):
+    """Queue one frame event (all smoke boxes sharing the screenshot paths) for background upload"""
     try:
+        boxes = [{
+            "confidence": float(conf),
+            "smoke_type": class_name,
+            "bounding_box": {"x1": int(x1), "y1": int(y1), "x2": int(x2), "y2": int(y2)}
+        } for x1, y1, x2, y2, class_name, conf in smoke_boxes]
         payload = {
             "timestamp": timestamp,
-            "confidence": float(confidence),
-            "smoke_type": smoke_type,
-            "bounding_box": bounding_box,
+            "boxes": boxes,
             "camera_id": CAMERA_ID,
             "location": CAMERA_LOCATION,
             "metadata": {
@@ -155,17 +88,9 @@ def send_smoke_detection(timestamp, confidence, smoke_type, bounding_box, infere
         if screenshots_info:
             payload["screenshots"] = screenshots_info
         
-        response = requests.post(
-            f"{BACKEND_URL}/api/detections/smoke",
-            json=payload,
-            timeout=5
-        )
-        if response.status_code == 200:
-            print(f"✓ Smoke detection recorded: {smoke_type} ({confidence:.2f})")
-        else:
-            print(f"✗ Failed to record detection: {response.status_code}")
+        uploader.submit(payload, EVENTS_ENDPOINT)
     except Exception as e:
-        print(f"✗ Error sending detection: {e}")
+        print(f"✗ Error queueing detection: {e}")
 
 # ─── LOW-LATENCY FFmpeg ENCODER ────────────────────────────────────────
 def start_ffmpeg(w, h, fps=15):
@@ -194,7 +119,7 @@ def run_inference():
         hef = hp.HEF(HEF_PATH)
         network_group = target.configure(hef, hp.ConfigureParams.create_from_hef(hef, hp.HailoStreamInterface.PCIe))[0]
         input_w = network_group.get_input_vstream_infos()[0].shape[1]
-        output_v_infos = network_group.get_output_vstream_infos()
+        decoder = OutputDecoder(network_group.get_output_vstream_infos(), CONF_THRESH)
         in_params = hp.InputVStreamParams.make_from_network_group(network_group, hp.FormatType.UINT8)
         out_params = hp.OutputVStreamParams.make_from_network_group(network_group, hp.FormatType.UINT8)
         
@@ -217,15 +142,7 @@ def run_inference():
                 raw_outputs = vstreams.infer(input_data)
                 
                 # 4. Post-process
-                final_feats = []
-                sorted_names = sorted(raw_outputs.keys(), key=lambda n: raw_outputs[n].shape[1], reverse=True)
-                for name in sorted_names:
-                    v_info = [v for v in output_v_infos if v.name == name][0]
-                    zp, scale = v_info.quant_info.qp_zp, v_info.quant_info.qp_scale
-                    dequantized = (raw_outputs[name].astype(np.float32) - zp) * scale
-                    final_feats.append(np.squeeze(dequantized).transpose(2, 0, 1))
-                
-                boxes, scores, classes = decode(final_feats, conf_thresh=CONF_THRESH)
+                boxes, scores, classes = decoder(raw_outputs)
                 
                 # 5. Drawing and Detection Recording
                 vis_frame = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
@@ -238,8 +155,8 @@ def run_inference():
                 license_plates = []
                 
                 if len(boxes) > 0:
-                    keep = nms(boxes, scores, IOU_THRESH)
-                    for b, s, c in zip(boxes[keep], scores[keep], classes[keep]):
+                    keep, kept_scores = batched_nms(boxes, scores, classes, IOU_THRESH)
+                    for b, s, c in zip(boxes[keep], kept_scores, classes[keep]):
                         x1, y1, x2, y2 = map(int, (b - [pad_left, pad_top, pad_left, pad_top]) / ratio)
                         class_name = CLASS_NAMES[c]
                         color = (0, 0, 255) if 'smoke' in class_name else (0, 255, 0)
@@ -258,15 +175,13 @@ def run_inference():
                 
                 # Save screenshots when smoke is detected
                 if smoke_detected and len(all_detections) > 0:
-                    detection_dir, screenshots_info = save_detection_screenshots(vis_frame, all_detections, timestamp_str)
+                    detection_dir, screenshots_info = screenshot_writer.save(vis_frame, all_detections, timestamp_str)
                     
-                    # Send detection with screenshots
-                    for det in all_detections:
-                        x1, y1, x2, y2, class_name, conf = det
-                        if class_name in SMOKE_CLASSES:
-                            bounding_box = {"x1": x1, "y1": y1, "x2": x2, "y2": y2}
-                            send_smoke_detection(timestamp, conf, class_name, bounding_box, int(inference_time_ms), screenshots_info)
-                            print(f"📸 Screenshots saved to: {detection_dir}")
+                    # Send the frame's smoke boxes with the screenshots as one event
+                    smoke_boxes = [det for det in all_detections if det[4] in SMOKE_CLASSES]
+                    if smoke_boxes:
+                        send_smoke_event(timestamp, smoke_boxes, int(inference_time_ms), screenshots_info)
+                        print(f"📸 Screenshots queued for: {detection_dir}")
                 
                 # 6. Push to Stream
                 try:
@@ -281,7 +196,12 @@ def run_inference():
 if __name__ == '__main__':
     # Start HLS File Server
     threading.Thread(target=lambda: ThreadedHTTPServer(('', 8000), HLSHandler).serve_forever(), daemon=True).start()
+    uploader.start()
+    screenshot_writer.start()
     try:
         run_inference()
     except KeyboardInterrupt:
         print("\nStopping...")
+    finally:
+        screenshot_writer.stop()
+        uploader.stop()
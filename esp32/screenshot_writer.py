@@ -0,0 +1,192 @@
+"""
+Asynchronous screenshot writer - encodes and stores detection evidence off the inference loop
+
+Frames are encoded (JPEG/WebP) by a small thread pool into a RAM-backed
+staging directory, then a flusher thread moves each finished detection
+directory to persistent storage and evicts the oldest directories once the
+disk quota is exceeded.
+"""
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from metrics import metrics
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+SCREENSHOT_FORMAT      = os.getenv('SCREENSHOT_FORMAT', 'jpg')          # 'jpg' or 'webp'
+SCREENSHOT_QUALITY     = int(os.getenv('SCREENSHOT_QUALITY', '85'))
+SCREENSHOT_MAX_DIM     = int(os.getenv('SCREENSHOT_MAX_DIM', '0'))      # 0 = keep original size
+SCREENSHOT_QUOTA_MB    = int(os.getenv('SCREENSHOT_QUOTA_MB', '2048'))
+SCREENSHOT_STAGING_DIR = os.getenv('SCREENSHOT_STAGING_DIR', '/dev/shm/smoki_detections')
+SCREENSHOT_WORKERS     = int(os.getenv('SCREENSHOT_WORKERS', '2'))
+SCREENSHOT_QUEUE_SIZE  = int(os.getenv('SCREENSHOT_QUEUE_SIZE', '8'))
+
+# ─── HELPERS ───────────────────────────────────────────────────────────────
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _limit_size(img, max_dim):
+    h, w = img.shape[:2]
+    if max_dim <= 0 or max(h, w) <= max_dim:
+        return img
+    r = max_dim / max(h, w)
+    return cv2.resize(img, (max(1, int(w * r)), max(1, int(h * r))), interpolation=cv2.INTER_AREA)
+
+# ─── WRITER ────────────────────────────────────────────────────────────────
+class ScreenshotWriter:
+    """Thread-pool screenshot writer with RAM staging and an LRU disk quota"""
+
+    def __init__(self, output_dir, staging_dir=SCREENSHOT_STAGING_DIR, fmt=SCREENSHOT_FORMAT,
+                 quality=SCREENSHOT_QUALITY, max_dim=SCREENSHOT_MAX_DIM, quota_mb=SCREENSHOT_QUOTA_MB,
+                 workers=SCREENSHOT_WORKERS, queue_size=SCREENSHOT_QUEUE_SIZE):
+        self.output_dir = output_dir
+        self.staging_dir = staging_dir
+        self.ext = 'webp' if fmt.lower() == 'webp' else 'jpg'
+        quality_flag = cv2.IMWRITE_WEBP_QUALITY if self.ext == 'webp' else cv2.IMWRITE_JPEG_QUALITY
+        self.encode_params = [int(quality_flag), int(quality)]
+        self.max_dim = max_dim
+        self.quota_bytes = quota_mb * 1024 * 1024
+        self.workers = workers
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.staged = queue.Queue()
+        self.dropped = 0
+        self._threads = []
+
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(staging_dir, exist_ok=True)
+
+        # Existing detection directories, oldest first, for quota eviction
+        self._lru = OrderedDict()
+        self._used_bytes = 0
+        entries = [e for e in os.scandir(output_dir) if e.is_dir()]
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            size = _dir_size(entry.path)
+            self._lru[entry.path] = size
+            self._used_bytes += size
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._encode_worker, name=f'screenshot-writer-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._flush_worker, name='screenshot-flusher', daemon=True)
+        t.start()
+        self._threads.append(t)
+        return self
+
+    def stop(self, timeout=10):
+        """Finish queued jobs and flush staged directories"""
+        for _ in range(self.workers):
+            self.jobs.put(None)
+        for t in self._threads[:self.workers]:
+            t.join(timeout)
+        self.staged.put(None)
+        for t in self._threads[self.workers:]:
+            t.join(timeout)
+
+    def save(self, frame, detections, timestamp_str):
+        """Queue full frame and cropped detections for writing.
+
+        Returns (detection_dir, screenshots_info) immediately with the final
+        on-disk paths; files appear once the background flush completes.
+        """
+        detection_id = timestamp_str.replace(':', '-').replace('.', '-')
+        detection_dir = os.path.join(self.output_dir, detection_id)
+        h, w = frame.shape[:2]
+
+        screenshots_info = {
+            'full_frame': os.path.join(detection_dir, f'full_frame.{self.ext}'),
+            'crops': []
+        }
+        crops = []
+        for idx, det in enumerate(detections):
+            x1, y1, x2, y2, class_name, confidence = det
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            name = f'{idx:02d}_{class_name}_{confidence:.2f}.{self.ext}'
+            crops.append((name, (x1, y1, x2, y2)))
+            screenshots_info['crops'].append({
+                'path': os.path.join(detection_dir, name),
+                'class': class_name,
+                'confidence': confidence,
+                'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+            })
+
+        try:
+            # Copy so the caller is free to reuse or draw on its buffer
+            self.jobs.put_nowait((detection_id, frame.copy(), crops))
+        except queue.Full:
+            self.dropped += 1
+            print(f"✗ Screenshot queue full, dropped {detection_id} ({self.dropped} total)")
+        return detection_dir, screenshots_info
+
+    # ─── worker threads ─────────────────────────────────────────────────────
+    def _write(self, path, img):
+        ok, buf = cv2.imencode(f'.{self.ext}', _limit_size(img, self.max_dim), self.encode_params)
+        if ok:
+            with open(path, 'wb') as f:
+                f.write(buf)
+
+    def _encode_worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            detection_id, frame, crops = job
+            stage_dir = os.path.join(self.staging_dir, detection_id)
+            start = time.perf_counter()
+            try:
+                os.makedirs(stage_dir, exist_ok=True)
+                self._write(os.path.join(stage_dir, f'full_frame.{self.ext}'), frame)
+                for name, (x1, y1, x2, y2) in crops:
+                    crop = frame[y1:y2, x1:x2]
+                    if crop.size > 0:
+                        self._write(os.path.join(stage_dir, name), crop)
+                self.staged.put(detection_id)
+                metrics.observe('screenshot_encode', time.perf_counter() - start)
+            except Exception as e:
+                print(f"✗ Error writing screenshots {detection_id}: {e}")
+
+    def _flush_worker(self):
+        while True:
+            detection_id = self.staged.get()
+            if detection_id is None:
+                return
+            src = os.path.join(self.staging_dir, detection_id)
+            dst = os.path.join(self.output_dir, detection_id)
+            try:
+                size = _dir_size(src)
+                self._evict(size)
+                if os.path.isdir(dst):
+                    # Same detection id as an earlier event: shutil.move would nest src
+                    # inside dst, so merge file by file (newer files win) and re-measure
+                    for name in os.listdir(src):
+                        shutil.move(os.path.join(src, name), os.path.join(dst, name))
+                    shutil.rmtree(src, ignore_errors=True)
+                    self._used_bytes -= self._lru.pop(dst, 0)
+                    size = _dir_size(dst)
+                else:
+                    shutil.move(src, dst)
+                self._lru[dst] = size
+                self._used_bytes += size
+            except Exception as e:
+                print(f"✗ Error flushing screenshots {detection_id}: {e}")
+
+    def _evict(self, incoming_bytes):
+        while self._lru and self._used_bytes + incoming_bytes > self.quota_bytes:
+            path, size = self._lru.popitem(last=False)
+            shutil.rmtree(path, ignore_errors=True)
+            self._used_bytes -= size
+            print(f"🗑 Evicted {os.path.basename(path)} (disk quota)")
@@ -0,0 +1,129 @@
+"""
+Smoke cascade - run the smoke model on regions around exhaust pipes and vehicles
+
+Instead of one 640x640 pass over the whole letterboxed frame, expanded crops
+around detected exhaust pipes (or vehicles when no pipe is visible) are
+letterboxed individually and sent to the smoke model in one batched call, so
+small distant plumes are seen at a higher effective resolution. A full-frame
+pass still runs every SMOKE_FULL_FRAME_EVERY frames to catch smoke away from
+any detected vehicle.
+"""
+import os
+
+import numpy as np
+
+from nms import batched_nms
+from preprocess import letterbox
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+SMOKE_CASCADE          = os.getenv('SMOKE_CASCADE', 'false').lower() == 'true'
+SMOKE_ROI_EXPAND       = float(os.getenv('SMOKE_ROI_EXPAND', '3.0'))    # exhaust pipe box -> ROI size factor
+SMOKE_VEHICLE_EXPAND   = float(os.getenv('SMOKE_VEHICLE_EXPAND', '1.4'))
+SMOKE_ROI_MIN          = int(os.getenv('SMOKE_ROI_MIN', '160'))         # px, smallest ROI side
+SMOKE_MAX_ROIS         = int(os.getenv('SMOKE_MAX_ROIS', '4'))
+SMOKE_FULL_FRAME_EVERY = int(os.getenv('SMOKE_FULL_FRAME_EVERY', '15'))  # frames; 0 = never
+EXHAUST_CLASS          = 'exhaust_pipe'
+PLUME_LIFT             = 0.25   # shift ROIs up by this share of their height: plumes rise from the pipe
+
+# ─── ROI HELPERS ───────────────────────────────────────────────────────────
+def expand_box(box, factor, min_side, frame_w, frame_h, lift=0.0):
+    """Square-ish ROI around `box`, scaled by `factor`, clamped to the frame"""
+    x1, y1, x2, y2 = box
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    w = min(frame_w, max(min_side, (x2 - x1) * factor))
+    h = min(frame_h, max(min_side, (y2 - y1) * factor))
+    cy -= h * lift
+    nx1 = int(min(max(0, cx - w / 2), frame_w - w))
+    ny1 = int(min(max(0, cy - h / 2), frame_h - h))
+    return nx1, ny1, int(nx1 + w), int(ny1 + h)
+
+def merge_rois(rois):
+    """Union overlapping ROIs until none overlap, so no region is inferred twice"""
+    rois = list(rois)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rois[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rois
+
+# ─── CASCADE ───────────────────────────────────────────────────────────────
+class SmokeCascade:
+    """Pick smoke ROIs from vehicle detections and batch them into the smoke model"""
+
+    def __init__(self, decoder, class_names, input_size=640, iou_thresh=0.45,
+                 expand=SMOKE_ROI_EXPAND, vehicle_expand=SMOKE_VEHICLE_EXPAND, min_side=SMOKE_ROI_MIN,
+                 max_rois=SMOKE_MAX_ROIS, full_frame_every=SMOKE_FULL_FRAME_EVERY):
+        self.decoder = decoder
+        self.class_names = class_names
+        self.input_size = input_size
+        self.iou_thresh = iou_thresh
+        self.expand = expand
+        self.vehicle_expand = vehicle_expand
+        self.min_side = min_side
+        self.max_rois = max_rois
+        self.full_frame_every = full_frame_every
+        self.frame_count = 0
+        self.full_frame_runs = 0
+        self.roi_runs = 0
+
+    def select_rois(self, frame, vehicle_detections):
+        """Expanded ROIs around exhaust pipes, or around vehicles if no pipe was found"""
+        h, w = frame.shape[:2]
+        pipes = [d for d in vehicle_detections if d[4] == EXHAUST_CLASS]
+        if pipes:
+            rois = [expand_box(d[:4], self.expand, self.min_side, w, h, PLUME_LIFT) for d in pipes]
+        else:
+            rois = [expand_box(d[:4], self.vehicle_expand, self.min_side, w, h) for d in vehicle_detections]
+        rois = merge_rois(rois)
+        rois.sort(key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)
+        return rois[:self.max_rois]
+
+    def wants_full_frame(self):
+        """True on the periodic full-frame fallback pass; call once per frame"""
+        self.frame_count += 1
+        if self.full_frame_every and self.frame_count % self.full_frame_every == 1:
+            self.full_frame_runs += 1
+            return True
+        return False
+
+    def run(self, frame, rois, infer):
+        """Run the smoke model on `rois` in one batched call.
+
+        Returns [(x1, y1, x2, y2, class_name, conf)] in frame coordinates.
+        """
+        if not rois:
+            return []
+        self.roi_runs += 1
+        batch, transforms = [], []
+        for x1, y1, x2, y2 in rois:
+            img, ratio, pad_left, pad_top = letterbox(frame[y1:y2, x1:x2], self.input_size)
+            batch.append(img)
+            transforms.append((x1, y1, ratio, pad_left, pad_top))
+        results = self.decoder.decode_batch(infer(np.stack(batch).astype(np.uint8)))
+
+        # Map every ROI's boxes back to the frame, then suppress duplicates across ROIs
+        all_boxes, all_scores, all_classes = [], [], []
+        for (boxes, scores, classes), (ox, oy, ratio, pad_left, pad_top) in zip(results, transforms):
+            if len(boxes) == 0:
+                continue
+            all_boxes.append((boxes - [pad_left, pad_top, pad_left, pad_top]) / ratio + [ox, oy, ox, oy])
+            all_scores.append(scores)
+            all_classes.append(classes)
+        if not all_boxes:
+            return []
+        boxes, scores, classes = np.concatenate(all_boxes), np.concatenate(all_scores), np.concatenate(all_classes)
+        keep, kept_scores = batched_nms(boxes, scores, classes, self.iou_thresh)
+        return [tuple(map(int, b)) + (self.class_names[c], float(s))
+                for b, s, c in zip(boxes[keep], kept_scores, classes[keep])]
+
+    def stats(self):
+        return {'frames': self.frame_count, 'full_frame_runs': self.full_frame_runs, 'roi_runs': self.roi_runs}
@@ -0,0 +1,203 @@
+"""
+Stream encoder stage - feeds annotated frames to ffmpeg off the inference loop
+
+Frames go through a small bounded queue to a writer thread that writes the
+NumPy buffer straight into ffmpeg's stdin via the buffer protocol (no
+tobytes() copy). When ffmpeg falls behind the oldest queued frame is dropped
+instead of stalling inference, and a crashed ffmpeg is restarted with
+backoff. The H.264 encoder is pluggable: libx264, or the V4L2 hardware
+encoder on boards that have one (Pi 4; the Pi 5 has no H.264 block).
+Frames may carry metadata, handed to `on_frame` with the frame's
+presentation time once it has been written (overlay side-channel).
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from metrics import metrics
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+STREAM_ENCODER     = os.getenv('STREAM_ENCODER', 'auto')      # 'auto', 'libx264' or 'h264_v4l2m2m'
+STREAM_BITRATE     = os.getenv('CAMERA_BITRATE', '800k')
+STREAM_QUEUE_SIZE  = int(os.getenv('STREAM_QUEUE_SIZE', '2'))
+HW_ENCODER_DEVICE  = '/dev/video11'                           # bcm2835-codec H.264 encoder
+RESTART_BACKOFF    = (1.0, 30.0)                              # seconds, initial and max
+
+def hardware_encoder_available():
+    """True if ffmpeg has h264_v4l2m2m and the encoder device exists"""
+    if not os.path.exists(HW_ENCODER_DEVICE) or not shutil.which('ffmpeg'):
+        return False
+    try:
+        out = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return 'h264_v4l2m2m' in out.stdout
+
+def resolve_encoder(name=STREAM_ENCODER):
+    if name == 'auto':
+        return 'h264_v4l2m2m' if hardware_encoder_available() else 'libx264'
+    return name
+
+def encoder_args(encoder, fps, bitrate):
+    """ffmpeg video codec arguments for the chosen encoder"""
+    if encoder == 'libx264':
+        return ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-b:v', bitrate]
+    # Hardware encoders take yuv420p input and have no x264 presets
+    return ['-pix_fmt', 'yuv420p', '-c:v', encoder, '-b:v', bitrate]
+
+# ─── ENCODER ───────────────────────────────────────────────────────────────
+class StreamEncoder:
+    """Threaded ffmpeg HLS encoder with a drop-oldest frame queue"""
+
+    def __init__(self, hls_dir, width, height, fps=15, encoder=STREAM_ENCODER, bitrate=STREAM_BITRATE,
+                 queue_size=STREAM_QUEUE_SIZE, on_frame=None):
+        self.hls_dir = hls_dir
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.encoder = resolve_encoder(encoder)
+        self.bitrate = bitrate
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.restarts = 0
+        self.on_frame = on_frame
+        self.proc = None
+        self.spawn_frames = 0          # frames written to the current ffmpeg: pts = spawn_frames / fps
+        self.spawn_time = None         # wall time of its first frame
+        self._backoff = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def command(self):
+        fps = self.fps
+        return ['ffmpeg', '-y',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo',
+            '-pix_fmt', 'bgr24', '-s', f'{self.width}x{self.height}', '-r', str(fps),
+            '-i', '-'] + encoder_args(self.encoder, fps, self.bitrate) + [
+            '-g', str(fps * 2),
+            '-hls_time', '2',
+            '-hls_list_size', '4',
+            '-hls_segment_type', 'fmp4',
+            # Epoch-based numbering keeps segment names unique across ffmpeg restarts
+            '-hls_start_number_source', 'epoch',
+            # Program date-time lets players map overlay stream_time onto the video
+            '-hls_flags', 'delete_segments+append_list+independent_segments+discont_start+program_date_time',
+            '-f', 'hls', os.path.join(self.hls_dir, 'stream.m3u8')]
+
+    def start(self):
+        self._spawn()
+        print(f"✓ Stream encoder: {self.encoder}")
+        self._thread = threading.Thread(target=self._run, name='stream-encoder', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._drain()
+        if self.proc:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+
+    def submit(self, frame, release=None, prepare=None, meta=None):
+        """Queue a BGR frame for encoding; never blocks.
+
+        `release` is called once the frame's buffer is no longer needed
+        (after the write, or when the frame is dropped). `prepare` runs on the
+        writer thread right before the write and returns the frame to write
+        (privacy masking), so dropped frames skip it. `meta` goes to
+        `on_frame(meta, pts, stream_time)` once the frame is written.
+        """
+        item = (frame, release, prepare, meta)
+        while True:
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                # Drop the oldest frame: the stream should show the newest one
+                try:
+                    self._done(self.frames.get_nowait())
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    # ─── writer thread ──────────────────────────────────────────────────────
+    def _spawn(self):
+        self.proc = subprocess.Popen(self.command(), stdin=subprocess.PIPE)
+        self.spawn_frames = 0
+        self.spawn_time = None
+
+    def _done(self, item):
+        _, release, _, _ = item
+        if release:
+            release()
+
+    def _drain(self):
+        while True:
+            try:
+                self._done(self.frames.get_nowait())
+            except queue.Empty:
+                return
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                item = self.frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            frame, _, prepare, meta = item
+            if prepare:
+                start = time.perf_counter()
+                try:
+                    frame = prepare()
+                except Exception as e:
+                    # Never stream a frame whose faces may not be masked
+                    print(f"✗ Frame not streamed, prepare failed: {e}")
+                    self._done(item)
+                    continue
+                metrics.observe('privacy_mask', time.perf_counter() - start)
+            start = time.perf_counter()
+            try:
+                # memoryview of the array: ffmpeg reads straight from the frame buffer
+                self.proc.stdin.write(frame.data if frame.flags.c_contiguous else frame.copy().data)
+                self.written += 1
+                self._backoff = 0.0
+                # Constant-rate rawvideo input: the frame's pts follows from its index
+                if self.spawn_time is None:
+                    self.spawn_time = time.time()
+                pts = self.spawn_frames / self.fps
+                self.spawn_frames += 1
+                if meta is not None and self.on_frame:
+                    self._publish(meta, pts)
+            except (BrokenPipeError, OSError, ValueError) as e:
+                self._restart(e)
+            finally:
+                self._done(item)
+                metrics.observe('stream_write', time.perf_counter() - start)
+
+    def _publish(self, meta, pts):
+        try:
+            self.on_frame(meta, pts, self.spawn_time + pts)
+        except Exception as e:
+            print(f"✗ Frame metadata not published: {e}")
+
+    def _restart(self, error):
+        self._backoff = min(RESTART_BACKOFF[1], self._backoff * 2 if self._backoff else RESTART_BACKOFF[0])
+        print(f"✗ ffmpeg failed ({type(error).__name__}), restarting in {self._backoff:.0f}s")
+        if self.proc:
+            self.proc.kill()
+            self.proc.wait()
+        # Frames queued while ffmpeg is down are stale by the time it is back
+        self._stop.wait(self._backoff)
+        self._drain()
+        if not self._stop.is_set():
+            self._spawn()
+            self.restarts += 1
@@ -0,0 +1,100 @@
+"""
+Camera telemetry - periodic health samples pushed to the backend
+
+Every TELEMETRY_INTERVAL seconds the metrics registry is condensed into one
+small sample per camera (FPS, p95 latency per stage, SoC temperature and
+throttling flags, dropped frames, queue depths). Samples are buffered and
+handed to the detection uploader every TELEMETRY_FLUSH seconds, so they go
+out batched over the same pooled session and are spooled while offline. The
+backend derives each camera's health from when it last reported.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import metrics
+
+# ─── CONFIGURATION ─────────────────────────────────────────────────────────
+TELEMETRY          = os.getenv('TELEMETRY', 'true').lower() == 'true'
+TELEMETRY_INTERVAL = float(os.getenv('TELEMETRY_INTERVAL', '10'))    # s between samples
+TELEMETRY_FLUSH    = float(os.getenv('TELEMETRY_FLUSH', '30'))       # s between uploads
+TELEMETRY_ENDPOINT = '/api/camera/telemetry'
+THROTTLED_PATH     = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+
+def throttled_flags():
+    """Firmware throttling bits (as `vcgencmd get_throttled`), or None off the Pi"""
+    try:
+        with open(THROTTLED_PATH) as f:
+            return int(f.read().strip(), 16)
+    except (OSError, ValueError):
+        return None
+
+def telemetry_sample(summary, camera_id):
+    """One compact sample for `camera_id` from a `metrics.summary()`"""
+    gauges = summary['gauges']
+    labeled = summary['labeled_gauges']
+    # Per-camera values (multi-camera mode) win over the process-wide ones
+    mine = {name: values[camera_id] for name, values in labeled.items() if camera_id in values}
+    counters = dict(summary['counters'], **mine)
+    return {
+        'camera_id': camera_id,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'fps': summary['fps'],
+        'temperature': gauges.get('soc_temperature_celsius'),
+        'throttled': throttled_flags(),
+        'accelerator_busy': gauges.get('accelerator_busy_ratio'),
+        'frames': counters.get('camera_frames_processed', counters.get('frames')),
+        'dropped_frames': sum(v for name, v in counters.items() if 'dropped' in name and 'frames' in name),
+        'latency_ms': {stage: s['p95_ms'] for stage, s in summary['stages'].items()},
+        'queue_depths': {name: v for name, v in gauges.items()
+                         if v is not None and (name.endswith('_depth') or name.endswith('_in_flight'))},
+    }
+
+# ─── REPORTER ──────────────────────────────────────────────────────────────
+class TelemetryReporter:
+    """Samples the metrics registry on a background thread and queues batches on `uploader`"""
+
+    def __init__(self, uploader, camera_ids, interval=TELEMETRY_INTERVAL, flush=TELEMETRY_FLUSH):
+        self.uploader = uploader
+        self.camera_ids = list(camera_ids)
+        self.interval = interval
+        self.flush = flush
+        self.pending = []
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+        print(f"✓ Telemetry every {self.interval:g}s, uploaded every {self.flush:g}s")
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def sample(self):
+        summary = metrics.summary()
+        self.pending.extend(telemetry_sample(summary, camera_id) for camera_id in self.camera_ids)
+
+    def _submit(self):
+        for sample in self.pending:
+            if self.uploader.submit(sample, TELEMETRY_ENDPOINT):
+                self.sent += 1
+        self.pending = []
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"✗ Telemetry sample failed: {e}")
+            if time.monotonic() >= next_flush:
+                self._submit()
+                next_flush = time.monotonic() + self.flush
+        # Last samples go out (or to the spool) with the uploader's shutdown
+        self._submit()
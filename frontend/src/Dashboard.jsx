@@ -748,28 +748,39 @@ function Dashboard() {
       const API_URL = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000';
       const token = localStorage.getItem('token');
       
-      // Fetch all data with a very large limit
-      fetch(`${API_URL}/api/sensors/data?limit=999999`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
-      })
-      .then(response => {
-        if (response.status === 401) {
-          localStorage.clear();
-          navigate('/');
-          return;
-        }
-        return response.json();
-      })
-      .then(result => {
-        if (!result.success || !result.data || result.data.length === 0) {
+      // Fetch all data page by page, following next_cursor until the last page
+      const fetchAllRecords = async () => {
+        const allRecords = [];
+        let cursor = null;
+        do {
+          const params = new URLSearchParams({ limit: '1000' });
+          if (cursor) params.set('cursor', cursor);
+          const response = await fetch(`${API_URL}/api/sensors/data?${params}`, {
+            headers: {
+              'Authorization': `Bearer ${token}`
+            }
+          });
+          if (response.status === 401) {
+            localStorage.clear();
+            navigate('/');
+            return null;
+          }
+          const result = await response.json();
+          if (!result.success) break;
+          allRecords.push(...result.data);
+          cursor = result.next_cursor;
+        } while (cursor);
+        return allRecords;
+      };
+
+      fetchAllRecords()
+      .then(allRecords => {
+        if (!allRecords) return;
+        if (allRecords.length === 0) {
           showToast('error', 'No records to download');
           return;
         }
 
-        const allRecords = result.data;
-
         // Define CSV headers
         const headers = [
           'Timestamp',
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { AlertCircle, Wifi, WifiOff, Play, Pause } from 'lucide-react';
 import '../styles/CameraViewer.css';
+import useDetectionOverlay from '../hooks/useDetectionOverlay';
 
 function CameraViewer() {
   const [isStreaming, setIsStreaming] = useState(false);
@@ -9,12 +10,19 @@ function CameraViewer() {
   const [detections, setDetections] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const videoRef = useRef(null);
+  const canvasRef = useRef(null);
+  const hlsRef = useRef(null);
   const detectionIntervalRef = useRef(null);
 
   const API_URL = import.meta.env.VITE_API_URL || 'https://smoki-backend-rpi.onrender.com';
   const RPI_IP = import.meta.env.VITE_RPI_IP || '192.168.100.198';
+  const CAMERA_ID = import.meta.env.VITE_CAMERA_ID || 'rpi_camera_01';
   const token = localStorage.getItem('token');
 
+  const { startOverlays, stopOverlays } = useDetectionOverlay(
+    videoRef, canvasRef, hlsRef, `ws://${RPI_IP}:8000/detections`
+  );
+
   // Check camera health on mount
   useEffect(() => {
     checkCameraHealth();
@@ -37,14 +45,16 @@ function CameraViewer() {
 
   const checkCameraHealth = async () => {
     try {
-      const response = await fetch(`${API_URL}/api/camera/health`);
+      const response = await fetch(`${API_URL}/api/camera/health?camera_id=${encodeURIComponent(CAMERA_ID)}`);
 
-      if (response.ok) {
+      // Health comes from the camera's last telemetry report; stale cameras may still stream
+      const health = response.ok ? await response.json() : null;
+      if (health && ['healthy', 'throttling', 'stale'].includes(health.status)) {
         setIsHealthy(true);
-        setError(null);
+        setError(health.status === 'throttling' ? 'Camera is throttling (temperature or power)' : null);
       } else {
         setIsHealthy(false);
-        setError('Camera service unavailable');
+        setError(health ? `Camera ${health.status}` : 'Camera service unavailable');
       }
     } catch (err) {
       setIsHealthy(false);
@@ -99,6 +109,7 @@ function CameraViewer() {
         
         hls.loadSource(hlsUrl);
         hls.attachMedia(video);
+        hlsRef.current = hls;
         
         hls.on(window.Hls.Events.MANIFEST_PARSED, () => {
           console.log('HLS manifest parsed, starting playback');
@@ -140,6 +151,8 @@ function CameraViewer() {
         });
       }
 
+      startOverlays();
+
     } catch (err) {
       console.error('Stream error:', err);
       setError('Failed to start stream: ' + err.message);
@@ -149,7 +162,12 @@ function CameraViewer() {
 
   const stopStream = () => {
     setIsStreaming(false);
-    
+    stopOverlays();
+
+    if (hlsRef.current) {
+      hlsRef.current.destroy();
+      hlsRef.current = null;
+    }
     if (videoRef.current) {
       videoRef.current.pause();
       videoRef.current.src = '';
@@ -219,13 +237,16 @@ function CameraViewer() {
         <>
           <div className="camera-stream-container">
             {isStreaming ? (
-              <video
-                ref={videoRef}
-                className="camera-stream"
-                controls
-                muted
-                playsInline
-              />
+              <>
+                <video
+                  ref={videoRef}
+                  className="camera-stream"
+                  controls
+                  muted
+                  playsInline
+                />
+                <canvas ref={canvasRef} className="camera-overlay" />
+              </>
             ) : (
               <div className="camera-placeholder">
                 <div className="placeholder-icon">📹</div>
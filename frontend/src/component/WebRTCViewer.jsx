@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { AlertCircle, Wifi, WifiOff, Play, Pause, Zap } from 'lucide-react';
 import '../styles/CameraViewer.css';
+import useDetectionOverlay from '../hooks/useDetectionOverlay';
 
 function WebRTCViewer() {
   const [isStreaming, setIsStreaming] = useState(false);
@@ -9,11 +10,17 @@ function WebRTCViewer() {
   const [detections, setDetections] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const videoRef = useRef(null);
+  const canvasRef = useRef(null);
+  const hlsRef = useRef(null);
   const detectionIntervalRef = useRef(null);
 
   const API_URL = import.meta.env.VITE_API_URL || 'https://smoki-backend-rpi.onrender.com';
   const RPI_IP = import.meta.env.VITE_RPI_IP || '192.168.100.198';
+  const CAMERA_ID = import.meta.env.VITE_CAMERA_ID || 'rpi_camera_01';
   const token = localStorage.getItem('token');
+  const { startOverlays, stopOverlays } = useDetectionOverlay(
+    videoRef, canvasRef, hlsRef, `ws://${RPI_IP}:8000/detections`
+  );
 
   useEffect(() => {
     checkCameraHealth();
@@ -42,13 +49,15 @@ function WebRTCViewer() {
 
   const checkCameraHealth = async () => {
     try {
-      const response = await fetch(`${API_URL}/api/camera/health`);
-      if (response.ok) {
+      const response = await fetch(`${API_URL}/api/camera/health?camera_id=${encodeURIComponent(CAMERA_ID)}`);
+      // Health comes from the camera's last telemetry report; stale cameras may still stream
+      const health = response.ok ? await response.json() : null;
+      if (health && ['healthy', 'throttling', 'stale'].includes(health.status)) {
         setIsHealthy(true);
-        setError(null);
+        setError(health.status === 'throttling' ? 'Camera is throttling (temperature or power)' : null);
       } else {
         setIsHealthy(false);
-        setError('Camera service unavailable');
+        setError(health ? `Camera ${health.status}` : 'Camera service unavailable');
       }
     } catch (err) {
       setIsHealthy(false);
@@ -103,6 +112,7 @@ function WebRTCViewer() {
         
         hls.loadSource(hlsUrl);
         hls.attachMedia(video);
+        hlsRef.current = hls;
         
         hls.on(window.Hls.Events.MANIFEST_PARSED, () => {
           console.log('HLS manifest parsed, starting playback');
@@ -144,6 +154,8 @@ function WebRTCViewer() {
         });
       }
 
+      startOverlays();
+
     } catch (err) {
       console.error('Stream error:', err);
       setError('Failed to start stream: ' + err.message);
@@ -153,7 +165,12 @@ function WebRTCViewer() {
 
   const stopStream = () => {
     setIsStreaming(false);
-    
+    stopOverlays();
+
+    if (hlsRef.current) {
+      hlsRef.current.destroy();
+      hlsRef.current = null;
+    }
     if (videoRef.current) {
       videoRef.current.pause();
       videoRef.current.src = '';
@@ -223,13 +240,16 @@ function WebRTCViewer() {
         <>
           <div className="camera-stream-container">
             {isStreaming ? (
-              <video
-                ref={videoRef}
-                className="camera-stream"
-                controls
-                muted
-                playsInline
-              />
+              <>
+                <video
+                  ref={videoRef}
+                  className="camera-stream"
+                  controls
+                  muted
+                  playsInline
+                />
+                <canvas ref={canvasRef} className="camera-overlay" />
+              </>
             ) : (
               <div className="camera-placeholder">
                 <div className="placeholder-icon">📹</div>
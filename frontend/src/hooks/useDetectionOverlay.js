@@ -0,0 +1,108 @@
+import { useEffect, useRef } from 'react';
+
+// Overlay messages kept for matching against the playback position (~10 s at 15 fps)
+const OVERLAY_BUFFER = 150;
+const OVERLAY_COLORS = {
+  vehicle_detection: '#22c55e',
+  smoke_detection: '#ef4444',
+  license_plate_detection: '#eab308'
+};
+
+// Wall-clock time of the frame on screen, from the playlist's EXT-X-PROGRAM-DATE-TIME
+const playbackTime = (video, hls) => {
+  const playingDate = hls?.playingDate;
+  if (playingDate) return playingDate.getTime() / 1000;
+  if (video.getStartDate) {
+    const start = video.getStartDate().getTime();
+    if (!isNaN(start)) return start / 1000 + video.currentTime;
+  }
+  return null;
+};
+
+// Detection boxes arrive as metadata over a WebSocket and are drawn on a canvas
+// in sync with the video, so the stream itself stays free of burned-in boxes
+function useDetectionOverlay(videoRef, canvasRef, hlsRef, feedUrl) {
+  const socketRef = useRef(null);
+  const overlaysRef = useRef([]);
+  const frameRef = useRef(null);
+
+  const draw = () => {
+    frameRef.current = requestAnimationFrame(draw);
+    const video = videoRef.current;
+    const canvas = canvasRef.current;
+    if (!video || !canvas) return;
+
+    const width = canvas.clientWidth;
+    const height = canvas.clientHeight;
+    if (canvas.width !== width || canvas.height !== height) {
+      canvas.width = width;
+      canvas.height = height;
+    }
+    const ctx = canvas.getContext('2d');
+    ctx.clearRect(0, 0, width, height);
+
+    // Latest message at or before the frame being shown
+    const buffer = overlaysRef.current;
+    const now = playbackTime(video, hlsRef.current);
+    if (now === null || !buffer.length) return;
+    let overlay = null;
+    for (let i = buffer.length - 1; i >= 0; i--) {
+      if (buffer[i].stream_time <= now) {
+        overlay = buffer[i];
+        break;
+      }
+    }
+    if (!overlay || now - overlay.stream_time > 1) return;
+
+    // Map frame coordinates onto the letterboxed (object-fit: contain) video
+    const scale = Math.min(width / overlay.width, height / overlay.height);
+    const offsetX = (width - overlay.width * scale) / 2;
+    const offsetY = (height - overlay.height * scale) / 2;
+    ctx.lineWidth = 2;
+    ctx.font = '12px sans-serif';
+    overlay.detections.forEach(({ model, class: className, confidence, box, text }) => {
+      const [x1, y1, x2, y2] = box;
+      const x = offsetX + x1 * scale;
+      const y = offsetY + y1 * scale;
+      const color = OVERLAY_COLORS[model] || '#3b82f6';
+      ctx.strokeStyle = color;
+      ctx.strokeRect(x, y, (x2 - x1) * scale, (y2 - y1) * scale);
+      const label = `${text || className} ${(confidence * 100).toFixed(0)}%`;
+      ctx.fillStyle = color;
+      ctx.fillRect(x, y - 16, ctx.measureText(label).width + 6, 16);
+      ctx.fillStyle = '#000';
+      ctx.fillText(label, x + 3, y - 4);
+    });
+  };
+
+  const stopOverlays = () => {
+    if (socketRef.current) {
+      socketRef.current.close();
+      socketRef.current = null;
+    }
+    if (frameRef.current) {
+      cancelAnimationFrame(frameRef.current);
+      frameRef.current = null;
+    }
+    overlaysRef.current = [];
+  };
+
+  const startOverlays = () => {
+    stopOverlays();
+    const socket = new WebSocket(feedUrl);
+    socket.onmessage = (event) => {
+      const buffer = overlaysRef.current;
+      buffer.push(JSON.parse(event.data));
+      if (buffer.length > OVERLAY_BUFFER) buffer.shift();
+    };
+    socket.onerror = (err) => console.error('Overlay feed error:', err);
+    socketRef.current = socket;
+    frameRef.current = requestAnimationFrame(draw);
+  };
+
+  useEffect(() => stopOverlays, []);
+
+  return { startOverlays, stopOverlays };
+}
+
+export default useDetectionOverlay;
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Check: query plans of postgre/database.py against a seeded database
+
+Creates the tables in a scratch schema (DB_* settings, as the backend), seeds
+them with realistic row counts, then calls each read function of database.py.
+Every SELECT it runs is also sent through EXPLAIN (FORMAT JSON). A check fails
+when the plan sequentially scans a large table or its total cost is over the
+check's budget, so an index that no longer matches a query fails here
+instead of in production. The schema is dropped afterwards unless --keep.
+
+  DB_HOST=localhost DB_NAME=smoki_test python3 check_query_plans.py
+  python3 check_query_plans.py --scale 0.2 --keep
+"""
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+
+import database as db
+
+# Rows per table at --scale 1 (a few months of one site)
+BASE_ROWS = {
+    'sensor_data': 200000,
+    'vehicles': 5000,
+    'vehicle_detections': 200000,
+    'detection_events': 20000,
+    'detection_objects': 500000,
+    'violations': 50000,
+    'notifications': 50000,
+    'images': 20000,
+    'image_metadata': 100000,
+    'camera_telemetry': 100000,
+}
+CAMERAS = 20
+DEFAULT_BUDGET = 1000.0
+
+CAMERA = "'cam_' || lpad((g %% {cameras})::text, 2, '0')".format(cameras=CAMERAS)
+SEED_SQL = [
+    f"""INSERT INTO sensor_data (timestamp, temperature, humidity, pressure, pm25, pm10)
+        SELECT NOW() - g * INTERVAL '5 seconds', 20 + random() * 10, 50 + random() * 20, 1000 + random() * 20,
+               random() * 50, random() * 80
+        FROM generate_series(1, %(sensor_data)s) g""",
+    f"""INSERT INTO vehicles (license_plate, vehicle_type, last_detected, total_violations, status)
+        SELECT 'PLT' || g, (ARRAY['passenger', 'puv', 'service', 'two_wheeler'])[1 + g %% 4],
+               NOW() - random() * INTERVAL '90 days', (random() * 20)::int,
+               CASE WHEN g %% 10 = 0 THEN 'inactive' ELSE 'active' END
+        FROM generate_series(1, %(vehicles)s) g""",
+    f"""INSERT INTO detection_events (timestamp, camera_id, location, box_count, context)
+        SELECT NOW() - g * INTERVAL '1 minute', {CAMERA}, 'Main_Entrance', 2, '{{"all_detections": []}}'::jsonb
+        FROM generate_series(1, %(detection_events)s) g""",
+    f"""INSERT INTO vehicle_detections (vehicle_id, timestamp, location, confidence, smoke_detected,
+                                        emission_level, metadata, event_id)
+        SELECT 1 + g %% %(vehicles)s, NOW() - g * INTERVAL '30 seconds', 'Main_Entrance', random(), g %% 10 = 0,
+               CASE WHEN g %% 10 = 0 THEN 'smoke_black' ELSE 'normal' END,
+               jsonb_build_object('camera_id', {CAMERA}, 'smoke_type', 'smoke_black'),
+               CASE WHEN g %% 10 = 0 THEN 1 + g %% %(detection_events)s END
+        FROM generate_series(1, %(vehicle_detections)s) g""",
+    f"""INSERT INTO detection_objects (event_id, camera_id, timestamp, model, class_name, confidence, x1, y1, x2, y2)
+        SELECT 1 + g %% %(detection_events)s, {CAMERA}, NOW() - g * INTERVAL '10 seconds',
+               (ARRAY['vehicle_detection', 'smoke_detection', 'license_plate_detection'])[1 + g %% 3],
+               (ARRAY['passenger', 'puv', 'service', 'two_wheeler', 'exhaust_pipe', 'smoke_black',
+                      'smoke_white'])[1 + g %% 7],
+               random(), 10, 20, 110, 220
+        FROM generate_series(1, %(detection_objects)s) g""",
+    f"""INSERT INTO violations (vehicle_id, detection_id, violation_type, severity, timestamp, description)
+        SELECT 1 + g %% %(vehicles)s, 1 + g %% %(vehicle_detections)s, 'smoke_emission',
+               (ARRAY['low', 'medium', 'high'])[1 + g %% 3], NOW() - g * INTERVAL '2 minutes', 'seeded'
+        FROM generate_series(1, %(violations)s) g""",
+    f"""INSERT INTO notifications (violation_id, title, message, notification_type, is_read, timestamp)
+        SELECT 1 + g %% %(violations)s, 'Violation', 'seeded', 'violation', g %% 20 <> 0,
+               NOW() - g * INTERVAL '2 minutes'
+        FROM generate_series(1, %(notifications)s) g""",
+    f"""INSERT INTO images (vehicle_detection_id, violation_id, image_data, image_format, file_size, width, height,
+                            timestamp)
+        SELECT 1 + g %% %(vehicle_detections)s, CASE WHEN g %% 5 = 0 THEN 1 + g %% %(violations)s END,
+               '\\x00'::bytea, 'jpeg', 1, 640, 480, NOW() - g * INTERVAL '5 minutes'
+        FROM generate_series(1, %(images)s) g""",
+    f"""INSERT INTO image_metadata (image_id, camera_id, camera_location, processing_time_ms, quality_score,
+                                    created_at)
+        SELECT 1 + g %% %(images)s, {CAMERA}, 'Main_Entrance', 50, random(), NOW() - g * INTERVAL '30 seconds'
+        FROM generate_series(1, %(image_metadata)s) g""",
+    f"""INSERT INTO camera_telemetry (camera_id, timestamp, fps, temperature, throttled, frames, dropped_frames,
+                                      latency_ms, queue_depths)
+        SELECT {CAMERA}, NOW() - (g / {CAMERAS}) * INTERVAL '10 seconds', 15, 60 + random() * 20, 0, g, 0,
+               '{{"decode": 2.0}}'::jsonb, '{{"upload_queue_depth": 0}}'::jsonb
+        FROM generate_series(1, %(camera_telemetry)s) g""",
+]
+
+def checks(now):
+    """(name, call, budget, tables that may be scanned sequentially)"""
+    # Cursor a week back: tens of thousands of rows deep in every paged table at --scale 1
+    deep_page = db.encode_cursor(now - timedelta(days=7), 10 ** 9)
+    return [
+        ('get_latest_sensor_data', lambda: db.get_latest_sensor_data(50), DEFAULT_BUDGET, ()),
+        ('get_latest_sensor_data (deep page)', lambda: db.get_latest_sensor_data(50, after=deep_page),
+         DEFAULT_BUDGET, ()),
+        ('get_sensor_data_by_timerange', lambda: db.get_sensor_data_by_timerange(now - timedelta(hours=1), now),
+         DEFAULT_BUDGET, ()),
+        ('get_top_violators', lambda: db.get_top_violators(5), DEFAULT_BUDGET, ()),
+        # Full listing: every vehicle is returned, a sequential scan is the right plan
+        ('get_vehicle_ranking', db.get_vehicle_ranking, 5000.0, ('vehicles',)),
+        ('get_recent_violations', lambda: db.get_recent_violations(50), DEFAULT_BUDGET, ()),
+        ('get_recent_violations (deep page)', lambda: db.get_recent_violations(50, after=deep_page),
+         DEFAULT_BUDGET, ()),
+        ('get_unread_notifications', lambda: db.get_unread_notifications(50), DEFAULT_BUDGET, ()),
+        ('get_unread_notifications (deep page)', lambda: db.get_unread_notifications(50, after=deep_page),
+         DEFAULT_BUDGET, ()),
+        ('get_image', lambda: db.get_image(100), DEFAULT_BUDGET, ()),
+        ('get_images_by_detection', lambda: db.get_images_by_detection(100), DEFAULT_BUDGET, ()),
+        ('get_images_by_violation', lambda: db.get_images_by_violation(100), DEFAULT_BUDGET, ()),
+        ('get_image_metadata', lambda: db.get_image_metadata(100), DEFAULT_BUDGET, ()),
+        ('get_metadata_by_camera', lambda: db.get_metadata_by_camera('cam_03', 50), DEFAULT_BUDGET, ()),
+        ('get_smoke_detections', lambda: db.get_smoke_detections(50, 24), DEFAULT_BUDGET, ()),
+        ('get_detection_objects (camera)', lambda: db.get_detection_objects(camera_id='cam_03', limit=100),
+         DEFAULT_BUDGET, ()),
+        ('get_detection_objects (class, confidence)',
+         lambda: db.get_detection_objects(class_name='puv', min_confidence=0.8, limit=100), DEFAULT_BUDGET, ()),
+        ('get_detection_objects (deep page)', lambda: db.get_detection_objects(limit=100, after=deep_page),
+         DEFAULT_BUDGET, ()),
+        ('get_camera_telemetry (camera)', lambda: db.get_camera_telemetry('cam_03', 24, 500), DEFAULT_BUDGET, ()),
+        ('get_camera_telemetry (fleet)', lambda: db.get_camera_telemetry(None, 24, 500), DEFAULT_BUDGET, ()),
+        # One row per camera at startup: walks the whole (camera_id, timestamp) index once
+        ('get_latest_camera_telemetry', db.get_latest_camera_telemetry, 20000.0, ()),
+    ]
+
+# ─── PLAN RECORDING ────────────────────────────────────────────────────────
+class PlanRecorder:
+    """Stands in for psycopg.connect; every SELECT is EXPLAINed before it runs"""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self.plans = []
+        self.errors = []
+
+    def __call__(self, *args, **kwargs):
+        return RecordingConnection(self._connect(*args, **kwargs), self)
+
+class RecordingConnection:
+    def __init__(self, conn, recorder):
+        self.conn = conn
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self.conn.cursor(*args, **kwargs), self.recorder)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+class RecordingCursor:
+    def __init__(self, cursor, recorder):
+        self.cursor = cursor
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.cursor.__exit__(*exc)
+
+    def execute(self, query, params=None):
+        if query.lstrip().upper().startswith('SELECT'):
+            try:
+                self.cursor.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+                self.recorder.plans.append(self.cursor.fetchone()[0][0]['Plan'])
+            except psycopg.Error as e:
+                self.recorder.errors.append(str(e).strip())
+                raise
+        return self.cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+# ─── MAIN ──────────────────────────────────────────────────────────────────
+def seed(scale):
+    rows = {table: max(1, int(n * scale)) for table, n in BASE_ROWS.items()}
+    with psycopg.connect(db.get_connection_string()) as conn:
+        for sql in SEED_SQL:
+            conn.execute(sql, rows)
+        for table in rows:
+            conn.execute(f"ANALYZE {table}")
+    return rows
+
+def run_check(name, call, budget, seq_ok):
+    """Failure messages for one check (empty when it passes)"""
+    recorder = PlanRecorder(psycopg.connect)
+    psycopg.connect = recorder
+    try:
+        call()
+    finally:
+        psycopg.connect = recorder._connect
+    if recorder.errors:
+        return [f"query failed: {e}" for e in recorder.errors], None
+    if not recorder.plans:
+        return ["no SELECT was run"], None
+    failures, summary = [], []
+    for plan in recorder.plans:
+        nodes = list(plan_nodes(plan))
+        seq = sorted({n['Relation Name'] for n in nodes if n['Node Type'] == 'Seq Scan'} - set(seq_ok))
+        if seq:
+            failures.append(f"sequential scan on {', '.join(seq)}")
+        if plan['Total Cost'] > budget:
+            failures.append(f"cost {plan['Total Cost']:.0f} over budget {budget:.0f}")
+        indexes = sorted({n['Index Name'] for n in nodes if 'Index Name' in n})
+        summary.append(f"cost {plan['Total Cost']:.0f}" + (f" via {', '.join(indexes)}" if indexes else ''))
+    return failures, '; '.join(summary)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply the seeded row counts")
+    parser.add_argument('--schema', default='plan_check', help="scratch schema (dropped and recreated)")
+    parser.add_argument('--keep', action='store_true', help="keep the seeded schema")
+    args = parser.parse_args()
+
+    with psycopg.connect(db.get_connection_string(), autocommit=True) as conn:
+        conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        conn.execute(f"CREATE SCHEMA {args.schema}")
+    # Every connection database.py opens from here on works in the scratch schema
+    os.environ['PGOPTIONS'] = f"-c search_path={args.schema}"
+    failed = []
+    try:
+        db.create_tables()
+        rows = seed(args.scale)
+        print(f"✓ Seeded {sum(rows.values())} rows into schema {args.schema}")
+        for name, call, budget, seq_ok in checks(datetime.now(timezone.utc)):
+            failures, summary = run_check(name, call, budget, seq_ok)
+            if failures:
+                failed.append(name)
+                print(f"✗ {name}: {'; '.join(failures)}" + (f" ({summary})" if summary else ''))
+            else:
+                print(f"✓ {name}: {summary}")
+    finally:
+        if not args.keep:
+            del os.environ['PGOPTIONS']
+            with psycopg.connect(db.get_connection_string(), autocommit=True) as conn:
+                conn.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+    if failed:
+        print(f"✗ {len(failed)} query plan check(s) failed")
+        raise SystemExit(1)
+    print("✓ Every query uses its indexes within budget")
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 import psycopg
+from psycopg.types.json import Jsonb
 from datetime import datetime
+import base64
 import os
 from dotenv import load_dotenv
 
@@ -98,6 +100,43 @@ def create_tables():
                     );
                 """)
                 
+                # Create detection_events table: context shared by all smoke boxes of one frame
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS detection_events (
+                        id BIGSERIAL PRIMARY KEY,
+                        timestamp TIMESTAMPTZ NOT NULL,
+                        camera_id VARCHAR(100),
+                        location VARCHAR(255),
+                        box_count INT,
+                        context JSONB,
+                        created_at TIMESTAMPTZ DEFAULT NOW()
+                    );
+                """)
+                
+                # Smoke boxes of a grouped event reference it instead of copying its context
+                cursor.execute("""
+                    ALTER TABLE vehicle_detections
+                    ADD COLUMN IF NOT EXISTS event_id BIGINT REFERENCES detection_events(id) ON DELETE CASCADE;
+                """)
+                
+                # Create detection_objects table: one row per model detection, for filtered queries
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS detection_objects (
+                        id BIGSERIAL PRIMARY KEY,
+                        event_id BIGINT REFERENCES detection_events(id) ON DELETE CASCADE,
+                        detection_id INT REFERENCES vehicle_detections(id) ON DELETE CASCADE,
+                        camera_id VARCHAR(100),
+                        timestamp TIMESTAMPTZ NOT NULL,
+                        model VARCHAR(50) NOT NULL,
+                        class_name VARCHAR(50) NOT NULL,
+                        confidence REAL NOT NULL,
+                        x1 INT,
+                        y1 INT,
+                        x2 INT,
+                        y2 INT
+                    );
+                """)
+                
                 # Create violations table
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS violations (
@@ -168,10 +207,32 @@ def create_tables():
                     );
                 """)
                 
+                # Create camera_telemetry table (periodic health samples pushed by each camera)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS camera_telemetry (
+                        id BIGSERIAL PRIMARY KEY,
+                        camera_id VARCHAR(100) NOT NULL,
+                        timestamp TIMESTAMPTZ NOT NULL,
+                        fps REAL,
+                        temperature REAL,
+                        throttled INT,
+                        accelerator_busy REAL,
+                        frames BIGINT,
+                        dropped_frames BIGINT,
+                        latency_ms JSONB,
+                        queue_depths JSONB
+                    );
+                """)
+                
                 # Create indexes for faster queries
+                # get_latest_sensor_data(): keyset pages on (timestamp, id), newest first
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_sensor_timestamp 
-                    ON sensor_data(timestamp);
+                    CREATE INDEX IF NOT EXISTS idx_sensor_timestamp_id 
+                    ON sensor_data(timestamp DESC, id DESC);
+                """)
+                
+                cursor.execute("""
+                    DROP INDEX IF EXISTS idx_sensor_timestamp;
                 """)
                 
                 cursor.execute("""
@@ -194,14 +255,63 @@ def create_tables():
                     ON vehicle_detections(vehicle_id);
                 """)
                 
+                # Partial index matching get_smoke_detections(): smoke rows only, newest first
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_vehicle_detections_smoke_timestamp 
+                    ON vehicle_detections(timestamp DESC) WHERE smoke_detected = TRUE;
+                """)
+                
+                # Containment (@>) queries on detection metadata
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_vehicle_detections_metadata_gin 
+                    ON vehicle_detections USING GIN (metadata jsonb_path_ops);
+                """)
+                
+                # get_top_violators(): active vehicles in ranking order
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_vehicles_active_ranking 
+                    ON vehicles(total_violations DESC, last_detected DESC) WHERE status = 'active';
+                """)
+                
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_vehicle_detections_event_id 
+                    ON vehicle_detections(event_id);
+                """)
+                
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_detection_events_timestamp 
+                    ON detection_events(timestamp);
+                """)
+                
+                # Keyset pagination walks (timestamp, id) newest first, per camera or per class
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_detection_objects_camera_timestamp 
+                    ON detection_objects(camera_id, timestamp DESC, id DESC);
+                """)
+                
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_detection_objects_class_timestamp 
+                    ON detection_objects(class_name, timestamp DESC, id DESC);
+                """)
+                
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_detection_objects_timestamp 
+                    ON detection_objects(timestamp DESC, id DESC);
+                """)
+                
                 cursor.execute("""
                     CREATE INDEX IF NOT EXISTS idx_violations_vehicle_id 
                     ON violations(vehicle_id);
                 """)
                 
+                # get_recent_violations(): keyset pages on (timestamp, id), newest first
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_violations_timestamp 
-                    ON violations(timestamp);
+                    CREATE INDEX IF NOT EXISTS idx_violations_timestamp_id 
+                    ON violations(timestamp DESC, id DESC);
+                """)
+                
+                cursor.execute("""
+                    DROP INDEX IF EXISTS idx_violations_timestamp;
                 """)
                 
                 cursor.execute("""
@@ -209,6 +319,16 @@ def create_tables():
                     ON notifications(timestamp);
                 """)
                 
+                # get_unread_notifications(): unread rows only, keyset pages on (timestamp, id)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_notifications_unread_timestamp_id 
+                    ON notifications(timestamp DESC, id DESC) WHERE is_read = FALSE;
+                """)
+                
+                cursor.execute("""
+                    DROP INDEX IF EXISTS idx_notifications_unread_timestamp;
+                """)
+                
                 cursor.execute("""
                     CREATE INDEX IF NOT EXISTS idx_images_vehicle_detection_id 
                     ON images(vehicle_detection_id);
@@ -229,9 +349,24 @@ def create_tables():
                     ON image_metadata(image_id);
                 """)
                 
+                # get_metadata_by_camera(): one camera, newest first (replaces the camera_id-only index)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_image_metadata_camera_created 
+                    ON image_metadata(camera_id, created_at DESC);
+                """)
+                
+                cursor.execute("""
+                    DROP INDEX IF EXISTS idx_image_metadata_camera_id;
+                """)
+                
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_image_metadata_camera_id 
-                    ON image_metadata(camera_id);
+                    CREATE INDEX IF NOT EXISTS idx_camera_telemetry_camera_timestamp 
+                    ON camera_telemetry(camera_id, timestamp DESC);
+                """)
+                
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_camera_telemetry_timestamp 
+                    ON camera_telemetry(timestamp DESC);
                 """)
                 
                 conn.commit()
@@ -240,6 +375,30 @@ def create_tables():
             print(f"Error creating tables: {e}")
             conn.rollback()
 
+# ============ PAGINATION FUNCTIONS ============
+
+def encode_cursor(timestamp, row_id):
+    """Opaque pagination cursor for the (timestamp, id) of the last row of a page"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor):
+    """(timestamp, id) from encode_cursor(); raises ValueError for a malformed cursor"""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_page(rows, limit):
+    """(rows, next_cursor) from a query that fetched limit + 1 rows ordered by (timestamp, id) DESC.
+    
+    The one extra row tells whether there is a next page; next_cursor is None on the last page.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+    return rows, None
+
 # ============ SENSOR DATA FUNCTIONS ============
 
 def insert_sensor_data(temperature=None, humidity=None, pressure=None, vocs=None, 
@@ -264,28 +423,34 @@ def insert_sensor_data(temperature=None, humidity=None, pressure=None, vocs=None
             conn.rollback()
             return None
 
-def get_latest_sensor_data(limit=10):
-    """Get latest sensor readings"""
+def get_latest_sensor_data(limit=10, after=None):
+    """Get latest sensor readings, newest first.
+    
+    `after` is the `next_cursor` of the previous page. Returns (rows, next_cursor),
+    next_cursor being None on the last page.
+    """
+    keyset, params = ("WHERE (timestamp, id) < (%s, %s)", decode_cursor(after)) if after else ("", ())
     with psycopg.connect(get_connection_string()) as conn:
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT id, timestamp, temperature, humidity, pressure, vocs, 
                            nitrogen_dioxide, carbon_monoxide, pm25, pm10
                     FROM sensor_data
-                    ORDER BY timestamp DESC
+                    {keyset}
+                    ORDER BY timestamp DESC, id DESC
                     LIMIT %s;
-                """, (limit,))
+                """, (*params, limit + 1))
                 
                 columns = ['id', 'timestamp', 'temperature', 'humidity', 'pressure', 'vocs', 
                            'nitrogen_dioxide', 'carbon_monoxide', 'pm25', 'pm10']
                 results = []
                 for row in cursor.fetchall():
                     results.append(dict(zip(columns, row)))
-                return results
+                return keyset_page(results, limit)
         except Exception as e:
             print(f"Error fetching sensor data: {e}")
-            return []
+            return [], None
 
 def get_sensor_data_by_timerange(start_time, end_time):
     """Get sensor data within a time range"""
@@ -488,29 +653,35 @@ def create_violation(vehicle_id, detection_id, violation_type, severity, descrip
             conn.rollback()
             return None
 
-def get_recent_violations(limit=10):
-    """Get recent violations"""
+def get_recent_violations(limit=10, after=None):
+    """Get recent violations, newest first.
+    
+    `after` is the `next_cursor` of the previous page. Returns (rows, next_cursor),
+    next_cursor being None on the last page.
+    """
+    keyset, params = ("WHERE (v.timestamp, v.id) < (%s, %s)", decode_cursor(after)) if after else ("", ())
     with psycopg.connect(get_connection_string()) as conn:
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT v.id, v.vehicle_id, v.violation_type, v.severity,
                            v.timestamp, v.description, veh.license_plate
                     FROM violations v
                     JOIN vehicles veh ON v.vehicle_id = veh.id
-                    ORDER BY v.timestamp DESC
+                    {keyset}
+                    ORDER BY v.timestamp DESC, v.id DESC
                     LIMIT %s;
-                """, (limit,))
+                """, (*params, limit + 1))
                 
                 columns = ['id', 'vehicle_id', 'violation_type', 'severity', 
                            'timestamp', 'description', 'license_plate']
                 results = []
                 for row in cursor.fetchall():
                     results.append(dict(zip(columns, row)))
-                return results
+                return keyset_page(results, limit)
         except Exception as e:
             print(f"Error fetching violations: {e}")
-            return []
+            return [], None
 
 # ============ NOTIFICATION FUNCTIONS ============
 
@@ -534,31 +705,36 @@ def create_notification(violation_id, title, message, notification_type="violati
             conn.rollback()
             return None
 
-def get_unread_notifications(limit=10):
-    """Get unread notifications"""
+def get_unread_notifications(limit=10, after=None):
+    """Get unread notifications, newest first.
+    
+    `after` is the `next_cursor` of the previous page. Returns (rows, next_cursor),
+    next_cursor being None on the last page.
+    """
+    keyset, params = ("AND (n.timestamp, n.id) < (%s, %s)", decode_cursor(after)) if after else ("", ())
     with psycopg.connect(get_connection_string()) as conn:
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
+                cursor.execute(f"""
                     SELECT n.id, n.title, n.message, n.notification_type,
                            n.timestamp, v.severity, veh.license_plate
                     FROM notifications n
                     LEFT JOIN violations v ON n.violation_id = v.id
                     LEFT JOIN vehicles veh ON v.vehicle_id = veh.id
-                    WHERE n.is_read = FALSE
-                    ORDER BY n.timestamp DESC
+                    WHERE n.is_read = FALSE {keyset}
+                    ORDER BY n.timestamp DESC, n.id DESC
                     LIMIT %s;
-                """, (limit,))
+                """, (*params, limit + 1))
                 
                 columns = ['id', 'title', 'message', 'notification_type', 
                            'timestamp', 'severity', 'license_plate']
                 results = []
                 for row in cursor.fetchall():
                     results.append(dict(zip(columns, row)))
-                return results
+                return keyset_page(results, limit)
         except Exception as e:
             print(f"Error fetching notifications: {e}")
-            return []
+            return [], None
 
 def mark_notification_read(notification_id):
     """Mark notification as read"""
@@ -853,6 +1029,45 @@ def get_metadata_by_camera(camera_id, limit=50):
             print(f"Error fetching metadata by camera: {e}")
             return []
 
+def build_event_context(camera_id="rpi_camera", metadata=None, detections=None, screenshots=None,
+                        license_plate=None):
+    """Build the JSONB context of a frame: all model detections, screenshots and plate"""
+    detection_metadata = {
+        "camera_id": camera_id,
+        "detection_source": "rpi_camera",
+        "all_detections": []
+    }
+    
+    # Add all model detections to metadata
+    if detections:
+        for det in detections:
+            detection_metadata["all_detections"].append({
+                "model": det.get("model_name") if isinstance(det, dict) else det.model_name,
+                "class": det.get("class_name") if isinstance(det, dict) else det.class_name,
+                "confidence": det.get("confidence") if isinstance(det, dict) else det.confidence,
+                "bounding_box": det.get("bounding_box") if isinstance(det, dict) else det.bounding_box
+            })
+    
+    # Add screenshots info
+    if screenshots:
+        detection_metadata["screenshots"] = screenshots
+    
+    # Add license plate
+    if license_plate:
+        detection_metadata["license_plate"] = license_plate
+    
+    # Merge with additional metadata
+    if metadata:
+        detection_metadata.update(metadata)
+    
+    return detection_metadata
+
+def build_smoke_detection_metadata(smoke_type, bounding_box=None, camera_id="rpi_camera",
+                                   metadata=None, detections=None, screenshots=None, license_plate=None):
+    """Build the JSONB metadata stored with a smoke detection"""
+    context = build_event_context(camera_id, metadata, detections, screenshots, license_plate)
+    return {"smoke_type": smoke_type, "bounding_box": bounding_box, **context}
+
 def insert_smoke_detection(timestamp, confidence, smoke_type, bounding_box=None, 
                           camera_id="rpi_camera", location="unknown", metadata=None,
                           detections=None, screenshots=None, license_plate=None):
@@ -860,45 +1075,20 @@ def insert_smoke_detection(timestamp, confidence, smoke_type, bounding_box=None,
     with psycopg.connect(get_connection_string()) as conn:
         try:
             with conn.cursor() as cursor:
-                # Prepare comprehensive metadata JSON
-                detection_metadata = {
-                    "smoke_type": smoke_type,
-                    "bounding_box": bounding_box,
-                    "camera_id": camera_id,
-                    "detection_source": "rpi_camera",
-                    "all_detections": []
-                }
-                
-                # Add all model detections to metadata
-                if detections:
-                    for det in detections:
-                        detection_metadata["all_detections"].append({
-                            "model": det.get("model_name") if isinstance(det, dict) else det.model_name,
-                            "class": det.get("class_name") if isinstance(det, dict) else det.class_name,
-                            "confidence": det.get("confidence") if isinstance(det, dict) else det.confidence,
-                            "bounding_box": det.get("bounding_box") if isinstance(det, dict) else det.bounding_box
-                        })
-                
-                # Add screenshots info
-                if screenshots:
-                    detection_metadata["screenshots"] = screenshots
-                
-                # Add license plate
-                if license_plate:
-                    detection_metadata["license_plate"] = license_plate
-                
-                # Merge with additional metadata
-                if metadata:
-                    detection_metadata.update(metadata)
+                detection_metadata = build_smoke_detection_metadata(
+                    smoke_type, bounding_box, camera_id, metadata, detections, screenshots, license_plate
+                )
                 
                 cursor.execute("""
                     INSERT INTO vehicle_detections 
                     (timestamp, location, confidence, smoke_detected, emission_level, metadata)
                     VALUES (%s, %s, %s, %s, %s, %s)
                     RETURNING id, timestamp;
-                """, (timestamp, location, confidence, True, smoke_type, detection_metadata))
+                """, (timestamp, location, confidence, True, smoke_type, Jsonb(detection_metadata)))
                 
                 result = cursor.fetchone()
+                insert_detection_objects(cursor, detection_object_rows(detections, camera_id, timestamp,
+                                                                       detection_id=result[0]))
                 conn.commit()
                 
                 if result:
@@ -914,18 +1104,115 @@ def insert_smoke_detection(timestamp, confidence, smoke_type, bounding_box=None,
             print(f"Error inserting smoke detection: {e}")
             return None
 
+def insert_smoke_detections(records):
+    """Insert a batch of smoke detections in one transaction.
+    
+    Each record is a dict with the same keys as insert_smoke_detection() arguments.
+    """
+    with psycopg.connect(get_connection_string()) as conn:
+        try:
+            with conn.cursor() as cursor:
+                results = []
+                object_rows = []
+                frames = set()
+                for rec in records:
+                    detection_metadata = build_smoke_detection_metadata(
+                        rec["smoke_type"], rec.get("bounding_box"), rec.get("camera_id", "rpi_camera"),
+                        rec.get("metadata"), rec.get("detections"), rec.get("screenshots"),
+                        rec.get("license_plate")
+                    )
+                    cursor.execute("""
+                        INSERT INTO vehicle_detections 
+                        (timestamp, location, confidence, smoke_detected, emission_level, metadata)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        RETURNING id, timestamp;
+                    """, (rec["timestamp"], rec.get("location", "unknown"), rec["confidence"], True,
+                          rec["smoke_type"], Jsonb(detection_metadata)))
+                    row = cursor.fetchone()
+                    # Per-box records of one frame carry the same detections; store them once
+                    frame = (rec.get("camera_id", "rpi_camera"), rec["timestamp"])
+                    if frame not in frames:
+                        frames.add(frame)
+                        object_rows += detection_object_rows(rec.get("detections"), frame[0], frame[1],
+                                                             detection_id=row[0])
+                    results.append({
+                        "id": row[0],
+                        "timestamp": row[1],
+                        "confidence": rec["confidence"],
+                        "smoke_type": rec["smoke_type"],
+                        "detections_count": len(rec.get("detections") or [])
+                    })
+                insert_detection_objects(cursor, object_rows)
+                conn.commit()
+                return results
+        except Exception as e:
+            print(f"Error inserting smoke detection batch: {e}")
+            conn.rollback()
+            return None
+
+def insert_detection_events(events):
+    """Insert a batch of frame events in one transaction.
+    
+    Each event is a dict with timestamp, camera_id, location, boxes (dicts with
+    confidence, smoke_type, bounding_box, metadata) and the shared metadata,
+    detections, screenshots and license_plate. The shared context is stored
+    once per event; each box is a vehicle_detections row referencing it.
+    """
+    with psycopg.connect(get_connection_string()) as conn:
+        try:
+            with conn.cursor() as cursor:
+                results = []
+                object_rows = []
+                for event in events:
+                    camera_id = event.get("camera_id", "rpi_camera")
+                    location = event.get("location", "unknown")
+                    boxes = event["boxes"]
+                    context = build_event_context(camera_id, event.get("metadata"), event.get("detections"),
+                                                  event.get("screenshots"), event.get("license_plate"))
+                    cursor.execute("""
+                        INSERT INTO detection_events (timestamp, camera_id, location, box_count, context)
+                        VALUES (%s, %s, %s, %s, %s)
+                        RETURNING id;
+                    """, (event["timestamp"], camera_id, location, len(boxes), Jsonb(context)))
+                    event_id = cursor.fetchone()[0]
+                    cursor.executemany("""
+                        INSERT INTO vehicle_detections 
+                        (timestamp, location, confidence, smoke_detected, emission_level, metadata, event_id)
+                        VALUES (%s, %s, %s, TRUE, %s, %s, %s);
+                    """, [(event["timestamp"], location, box["confidence"], box["smoke_type"],
+                           Jsonb({"smoke_type": box["smoke_type"], "bounding_box": box.get("bounding_box"),
+                                  "event_id": event_id, **(box.get("metadata") or {})}),
+                           event_id)
+                          for box in boxes])
+                    object_rows += detection_object_rows(event.get("detections"), camera_id, event["timestamp"],
+                                                         event_id=event_id)
+                    results.append({
+                        "event_id": event_id,
+                        "timestamp": event["timestamp"],
+                        "boxes": len(boxes),
+                        "detections_count": len(event.get("detections") or [])
+                    })
+                insert_detection_objects(cursor, object_rows)
+                conn.commit()
+                return results
+        except Exception as e:
+            print(f"Error inserting detection events: {e}")
+            conn.rollback()
+            return None
 
 def get_smoke_detections(limit=50, hours=24):
-    """Get recent smoke detections"""
+    """Get recent smoke detections (boxes of grouped events get their event's context merged in)"""
     with psycopg.connect(get_connection_string()) as conn:
         try:
             with conn.cursor() as cursor:
                 cursor.execute("""
-                    SELECT id, timestamp, location, confidence, metadata
-                    FROM vehicle_detections
-                    WHERE smoke_detected = TRUE 
-                    AND timestamp > NOW() - INTERVAL '%s hours'
-                    ORDER BY timestamp DESC
+                    SELECT vd.id, vd.timestamp, vd.location, vd.confidence,
+                           COALESCE(e.context, '{}'::jsonb) || vd.metadata
+                    FROM vehicle_detections vd
+                    LEFT JOIN detection_events e ON e.id = vd.event_id
+                    WHERE vd.smoke_detected = TRUE 
+                    AND vd.timestamp > NOW() - make_interval(hours => %s::int)
+                    ORDER BY vd.timestamp DESC
                     LIMIT %s;
                 """, (hours, limit))
                 
@@ -937,3 +1224,133 @@ def get_smoke_detections(limit=50, hours=24):
         except Exception as e:
             print(f"Error fetching smoke detections: {e}")
             return []
+
+# ============ DETECTION OBJECT FUNCTIONS ============
+
+DETECTION_OBJECT_COLUMNS = ['id', 'event_id', 'detection_id', 'camera_id', 'timestamp', 'model', 'class_name',
+                            'confidence', 'x1', 'y1', 'x2', 'y2']
+
+def detection_object_rows(detections, camera_id, timestamp, event_id=None, detection_id=None):
+    """detection_objects rows for a frame's model detections (dicts or Detection models)"""
+    rows = []
+    for det in detections or []:
+        get = det.get if isinstance(det, dict) else lambda key: getattr(det, key)
+        box = get("bounding_box") or {}
+        rows.append((event_id, detection_id, camera_id, timestamp, get("model_name"), get("class_name"),
+                     get("confidence"), box.get("x1"), box.get("y1"), box.get("x2"), box.get("y2")))
+    return rows
+
+def insert_detection_objects(cursor, rows):
+    """Bulk insert detection_objects rows inside the caller's transaction"""
+    if rows:
+        cursor.executemany("""
+            INSERT INTO detection_objects
+            (event_id, detection_id, camera_id, timestamp, model, class_name, confidence, x1, y1, x2, y2)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+        """, rows)
+
+def get_detection_objects(camera_id=None, class_name=None, model=None, min_confidence=None,
+                          max_confidence=None, start=None, end=None, limit=100, after=None):
+    """Get detection objects matching the filters, newest first.
+    
+    `after` is the `next_cursor` of the previous page; pages continue below its
+    (timestamp, id) through the composite indexes, so deep pages cost the same as the first.
+    Returns (rows, next_cursor), next_cursor being None on the last page.
+    """
+    conditions, params = [], []
+    for clause, value in (("camera_id = %s", camera_id), ("class_name = %s", class_name),
+                          ("model = %s", model), ("confidence >= %s", min_confidence),
+                          ("confidence <= %s", max_confidence), ("timestamp >= %s", start),
+                          ("timestamp < %s", end)):
+        if value is not None:
+            conditions.append(clause)
+            params.append(value)
+    if after:
+        conditions.append("(timestamp, id) < (%s, %s)")
+        params.extend(decode_cursor(after))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    with psycopg.connect(get_connection_string()) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT {', '.join(DETECTION_OBJECT_COLUMNS)}
+                    FROM detection_objects
+                    {where}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s;
+                """, (*params, limit + 1))
+                
+                rows = [dict(zip(DETECTION_OBJECT_COLUMNS, row)) for row in cursor.fetchall()]
+                return keyset_page(rows, limit)
+        except Exception as e:
+            print(f"Error fetching detection objects: {e}")
+            return [], None
+
+# ============ CAMERA TELEMETRY FUNCTIONS ============
+
+TELEMETRY_COLUMNS = ['camera_id', 'timestamp', 'fps', 'temperature', 'throttled', 'accelerator_busy',
+                     'frames', 'dropped_frames', 'latency_ms', 'queue_depths']
+
+def insert_camera_telemetry(samples):
+    """Insert a batch of camera telemetry samples in one transaction.
+    
+    Each sample is a dict keyed by TELEMETRY_COLUMNS; missing values are stored as NULL.
+    """
+    with psycopg.connect(get_connection_string()) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.executemany("""
+                    INSERT INTO camera_telemetry
+                    (camera_id, timestamp, fps, temperature, throttled, accelerator_busy,
+                     frames, dropped_frames, latency_ms, queue_depths)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+                """, [(s["camera_id"], s["timestamp"], s.get("fps"), s.get("temperature"), s.get("throttled"),
+                       s.get("accelerator_busy"), s.get("frames"), s.get("dropped_frames"),
+                       Jsonb(s.get("latency_ms") or {}), Jsonb(s.get("queue_depths") or {}))
+                      for s in samples])
+                conn.commit()
+                return len(samples)
+        except Exception as e:
+            print(f"Error inserting camera telemetry: {e}")
+            conn.rollback()
+            return None
+
+def get_camera_telemetry(camera_id=None, hours=24, limit=500):
+    """Get recent telemetry samples, newest first (all cameras unless camera_id is given)"""
+    camera_filter = "camera_id = %s AND" if camera_id else ""
+    params = (camera_id, hours, limit) if camera_id else (hours, limit)
+    with psycopg.connect(get_connection_string()) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT camera_id, timestamp, fps, temperature, throttled, accelerator_busy,
+                           frames, dropped_frames, latency_ms, queue_depths
+                    FROM camera_telemetry
+                    WHERE {camera_filter} timestamp > NOW() - make_interval(hours => %s::int)
+                    ORDER BY timestamp DESC
+                    LIMIT %s;
+                """, params)
+                
+                return [dict(zip(TELEMETRY_COLUMNS, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error fetching camera telemetry: {e}")
+            return []
+
+def get_latest_camera_telemetry():
+    """Get the newest telemetry sample of every camera"""
+    with psycopg.connect(get_connection_string()) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT DISTINCT ON (camera_id)
+                           camera_id, timestamp, fps, temperature, throttled, accelerator_busy,
+                           frames, dropped_frames, latency_ms, queue_depths
+                    FROM camera_telemetry
+                    ORDER BY camera_id, timestamp DESC;
+                """)
+                
+                return [dict(zip(TELEMETRY_COLUMNS, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error fetching latest camera telemetry: {e}")
+            return []